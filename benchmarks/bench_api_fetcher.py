@@ -0,0 +1,125 @@
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import hashlib
+import argparse
+import tempfile
+import threading
+import urllib.request
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'streamlit'))
+
+from api_fetcher import refresh_game_logs, game_log_frame, game_seasons, ResponseCache
+from game_logs import game_log_folders, list_game_log_files
+
+# Function to build a fake gameLog payload for one player and season
+def fake_game_log(player_id, season, n_games=82):
+    start = int(str(season)[:4])
+    return {'gameLog': [{
+        'gameId': int(f'{start}02{i:04d}'), 'gameDate': f'{start}-{10 + i // 31 % 3}-{1 + i % 28:02d}',
+        'homeRoadFlag': 'H' if i % 2 else 'R', 'goals': (player_id + i) % 3 // 2, 'assists': (player_id + i) % 4 // 3,
+        'points': 0, 'plusMinus': (player_id + i) % 5 - 2, 'powerPlayGoals': 0, 'powerPlayPoints': 0,
+        'gameWinningGoals': 0, 'otGoals': 0, 'shots': (player_id + i) % 6, 'shifts': 15 + i % 10,
+        'opponentAbbrev': 'TOR', 'pim': 0, 'toi': f'{12 + i % 8}:{i % 60:02d}',
+    } for i in range(n_games)]}
+
+# Function to start a stand-in for the NHL API, with fixed latency and ETags, on a background thread
+def start_stand_in(latency):
+    from aiohttp import web
+
+    async def game_log(request):
+        await asyncio.sleep(latency)
+        body = json.dumps(fake_game_log(int(request.match_info['player_id']), request.match_info['season'])).encode()
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.Response(body=body, content_type='application/json', headers={'ETag': etag})
+
+    app = web.Application()
+    app.router.add_get('/v1/player/{player_id}/game-log/{season}/{game_type}', game_log)
+    ready = threading.Event()
+    state = {}
+
+    def serve():
+        loop = asyncio.new_event_loop()
+        runner = web.AppRunner(app)
+        loop.run_until_complete(runner.setup())
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        loop.run_until_complete(site.start())
+        state['port'] = site._server.sockets[0].getsockname()[1]
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=serve, daemon=True).start()
+    ready.wait()
+    return f"http://127.0.0.1:{state['port']}/v1"
+
+# Function to fetch and write every player one request at a time, the way the api notebooks did
+def refresh_sequential(players, seasons, base_url):
+    for filepath, player_id, group in players:
+        payloads = []
+        for season in seasons:
+            with urllib.request.urlopen(f'{base_url}/player/{player_id}/game-log/{season}/2') as response:
+                payloads.append(json.loads(response.read()))
+        game_log_frame(payloads, group).to_csv(filepath, index=False)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Time the async game-log refresh against sequential fetching')
+    parser.add_argument('--players', type=int, default=300)
+    parser.add_argument('--seasons', nargs='+', default=['20232024', '20242025'])
+    parser.add_argument('--latency', type=float, default=0.02, help='stand-in server delay per request, seconds')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--rate', type=float, default=0, help='requests per second, 0 for no limit')
+    args = parser.parse_args()
+
+    base_url = start_stand_in(args.latency)
+    work_folder = tempfile.mkdtemp()
+    source_files = list_game_log_files()[:args.players]
+    players = [player_id for _, player_id, _ in source_files]
+    try:
+        # Each pass gets its own copy of the real tracked players' files, so nothing under
+        # files/ is touched and no pass finds the files another one already wrote
+        def fresh_copy(label):
+            folders = {}
+            for source, group in game_log_folders.items():
+                target = os.path.join(work_folder, label, os.path.basename(source))
+                os.makedirs(target)
+                folders[target] = group
+            for filepath, _, _ in source_files:
+                target = os.path.join(work_folder, label, os.path.basename(os.path.dirname(filepath)),
+                                      os.path.basename(filepath))
+                shutil.copy(filepath, target)
+            return folders
+
+        tracked = list_game_log_files(fresh_copy('sequential'))
+        requests = len(tracked) * len(args.seasons)
+        start = time.perf_counter()
+        refresh_sequential(tracked, args.seasons, base_url)
+        sequential = time.perf_counter() - start
+        print(f"sequential: {requests:,} requests in {sequential:.2f}s")
+
+        folders = fresh_copy('async')
+        cache = ResponseCache(os.path.join(work_folder, 'http'))
+        for label in ['async, cold cache', 'async, warm cache (304s)']:
+            start = time.perf_counter()
+            results = refresh_game_logs(players, args.seasons, folders, base_url=base_url,
+                                        concurrency=args.concurrency, rate=args.rate, cache=cache)
+            elapsed = time.perf_counter() - start
+            counts = ', '.join(f'{status} {n}' for status, n in results['status'].value_counts().items())
+            print(f"{label}: {requests:,} requests in {elapsed:.2f}s ({sequential / elapsed:.1f}x) - {counts}")
+            if label.startswith('async, cold'):
+                # Every file was rewritten: the fetched seasons replaced, the other seasons kept
+                assert (results['status'] == 'written').all(), 'the cold pass should write every file'
+                sources = {player_id: filepath for filepath, player_id, _ in source_files}
+                for filepath, player_id, _ in list_game_log_files(folders):
+                    written = game_seasons(pd.read_csv(filepath)['gameDate']).isin(args.seasons)
+                    before = game_seasons(pd.read_csv(sources[player_id])['gameDate']).isin(args.seasons)
+                    n_fetched = sum(len(fake_game_log(player_id, season)['gameLog']) for season in args.seasons)
+                    assert written.sum() == n_fetched and (~written).sum() == (~before).sum(), filepath
+    finally:
+        shutil.rmtree(work_folder)
@@ -0,0 +1,63 @@
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'streamlit'))
+
+from game_simulator import load_feature_loadings
+from lineup_solver import optimal_lineup, best_lineups, lineup_frontier
+
+master_copies_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'files', 'master_copies')
+
+def time_solver(forwards, defense, loadings, repeats=5):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        lineup, remaining_cap = optimal_lineup(forwards, defense, loadings)
+        timings.append(time.perf_counter() - start)
+    return min(timings), lineup, remaining_cap
+
+def time_call(func, *args, repeats=5):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Time the cap-constrained lineup solver on the master pools')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--top', type=int, default=100)
+    args = parser.parse_args()
+
+    loadings = load_feature_loadings(os.path.join(master_copies_folder, 'feature_loadings.csv'))
+    forwards = pd.read_csv(os.path.join(master_copies_folder, 'forwards_rec_two.csv'))
+    defense = pd.read_csv(os.path.join(master_copies_folder, 'defense_rec_two.csv'))
+
+    elapsed, lineup, remaining_cap = time_solver(forwards, defense, loadings)
+    print(f"{len(forwards)} F / {len(defense)} D, fantasy salaries: {elapsed * 1000:.1f} ms")
+    print(lineup[['name', 'position', 'salary', 'score']].to_string(index=False))
+    print(f"Remaining cap: ${remaining_cap:,}")
+
+    elapsed, lineups = time_call(best_lineups, forwards, defense, loadings, args.top)
+    print(f"Top {len(lineups)} lineups: {elapsed * 1000:.1f} ms "
+          f"(scores {lineups['score'].iloc[0]:.3f} .. {lineups['score'].iloc[-1]:.3f})")
+    elapsed, frontier = time_call(lineup_frontier, forwards, defense, loadings)
+    print(f"Salary frontier: {len(frontier)} lineups in {elapsed * 1000:.1f} ms")
+    print(frontier[['salary', 'score']].to_string(index=False))
+
+    # Every player on a different salary is the worst case for dominance pruning
+    rng = np.random.default_rng(args.seed)
+    forwards['salary'] = rng.integers(750, 13000, len(forwards)) * 1000
+    defense['salary'] = rng.integers(750, 13000, len(defense)) * 1000
+    elapsed, lineup, remaining_cap = time_solver(forwards, defense, loadings)
+    print(f"{len(forwards)} F / {len(defense)} D, random salaries: {elapsed * 1000:.1f} ms")
+    elapsed, lineups = time_call(best_lineups, forwards, defense, loadings, args.top)
+    print(f"Top {len(lineups)} lineups, random salaries: {elapsed * 1000:.1f} ms")
+    elapsed, frontier = time_call(lineup_frontier, forwards, defense, loadings)
+    print(f"Salary frontier, random salaries: {len(frontier)} lineups in {elapsed * 1000:.1f} ms")
@@ -0,0 +1,48 @@
+import os
+import sys
+import time
+import argparse
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'streamlit'))
+
+from game_simulator import load_feature_loadings, simulate_game_frames
+from monte_carlo import simulate_game_monte_carlo
+
+master_copies_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'files', 'master_copies')
+
+# A 3F/2D team whose players all have game logs
+default_forwards = ['A.J. Greer', 'Aaron Downey', 'Aaron Gagnon']
+default_defense = ['Aaron Ekblad', 'Aaron Johnson']
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Time the Monte Carlo matchup and check it against the deterministic score')
+    parser.add_argument('--forwards', nargs='+', default=default_forwards)
+    parser.add_argument('--defense', nargs='+', default=default_defense)
+    parser.add_argument('--games', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='largest allowed gap between the means, in per-game standard deviations')
+    args = parser.parse_args()
+
+    loadings = load_feature_loadings(os.path.join(master_copies_folder, 'feature_loadings.csv'))
+    forwards = pd.read_csv(os.path.join(master_copies_folder, 'forwards_rec_two.csv'))
+    defense = pd.read_csv(os.path.join(master_copies_folder, 'defense_rec_two.csv'))
+    team = pd.concat([forwards[forwards['name'].isin(args.forwards)], defense[defense['name'].isin(args.defense)]],
+                     ignore_index=True)
+
+    _, _, player_scores, _, _, _ = simulate_game_frames(team, team, loadings)
+    deterministic = sum(player_scores.values()) / 1000
+
+    start = time.perf_counter()
+    results = simulate_game_monte_carlo(team, team, loadings, n_games=args.games, seed=args.seed)
+    elapsed = time.perf_counter() - start
+    mean, std = results['summary'].loc['User', ['mean', 'std']]
+    print(f"{len(team)} players, {args.games:,} games in {elapsed:.2f}s")
+    print(f"deterministic score {deterministic:.3f}, bootstrap mean {mean:.3f} (std {std:.3f})")
+
+    # Real games replace the season averages, so the means should agree up to game-to-game noise;
+    # a unit mismatch between the logs and the master tables shows up as a gap of many stds
+    gap = abs(mean - deterministic) / std
+    assert gap <= args.tolerance, f"bootstrap mean is {gap:.1f} stds from the deterministic score"
@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+import argparse
+
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'streamlit'))
+
+from recommender import preprocess_data, find_closest_forwards
+from recommender_index import RecommenderIndex
+from season_pipeline import season_files, read_season_totals, combine_totals, skater_master_tables
+
+# Function to turn one season file into per-game player-season rows
+def load_season(filepath):
+    totals = read_season_totals(filepath, 'skaters')
+    forwards, defense = skater_master_tables(combine_totals([totals]))
+    df = pd.concat([forwards, defense], ignore_index=True)
+    df['name'] = df['name'] + ' ' + str(int(totals['season'].iloc[0]))  # one row per player-season
+    df['salary'] = 950000
+    return df
+
+def best_of(func, repeats=20):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Recommender query latency as the pool grows season by season')
+    parser.add_argument('--steps', type=int, nargs='+', default=[1, 4, 8, 12, 17])
+    args = parser.parse_args()
+
+    seasons = [load_season(filepath) for filepath in season_files('skaters').values()]
+    teams = ['TOR', 'MTL', 'BOS', 'EDM', 'COL', 'NYR']
+
+    print(f"{'seasons':>8} {'players':>8} {'refit+scan':>12} {'fit once':>10} {'kd query':>10} {'filtered':>10}")
+    for step in args.steps:
+        pool = pd.concat(seasons[:step], ignore_index=True)
+        target = pool.loc[pool['goals'].idxmax(), 'name']
+
+        def legacy():
+            pca_df, _ = preprocess_data(pool)
+            find_closest_forwards(target, pca_df)
+
+        legacy_time = best_of(legacy, 3)
+        fit_time = best_of(lambda: RecommenderIndex.fit(pool), 3)
+        index = RecommenderIndex.fit(pool)
+        query_time = best_of(lambda: index.query(target, n=5))
+        filtered_time = best_of(lambda: index.query(target, n=5, teams=teams, max_salary=1000000, position='F'))
+        print(f"{step:>8} {len(pool):>8} {legacy_time * 1000:>10.1f}ms {fit_time * 1000:>8.1f}ms "
+              f"{query_time * 1000:>8.3f}ms {filtered_time * 1000:>8.3f}ms")
@@ -0,0 +1,112 @@
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'streamlit'))
+
+from game_simulator import (performance_metrics, loadings_vector, team_matrix, score_matrix,
+                            compute_player_scores, compute_individual_contributions, create_results_table)
+
+# Function to build a random team table with the simulator's metric columns
+def random_players(n_players, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.gamma(2.0, 0.5, size=(n_players, len(performance_metrics))), columns=performance_metrics)
+    df.insert(0, 'name', [f'Player {i}' for i in range(n_players)])
+    return df
+
+# Function to build a random loadings dict shaped like load_feature_loadings' output
+def random_loadings(seed=0):
+    rng = np.random.default_rng(seed)
+    return dict(zip(performance_metrics, rng.normal(0.2, 0.1, len(performance_metrics))))
+
+# The original row-by-row implementations, kept here as the baseline
+def legacy_player_scores(team_df, loadings):
+    player_scores = {}
+    for index, player in team_df.iterrows():
+        score = 0
+        for metric, weight in loadings.items():
+            if metric in player:
+                score += player[metric] * weight
+        player_scores[player['name']] = score
+    return player_scores
+
+def legacy_contributions(team_df, loadings, metrics):
+    contributions = {metric: {} for metric in metrics}
+    for index, player in team_df.iterrows():
+        for metric in metrics:
+            if metric in player:
+                contributions[metric][player['name']] = player[metric] * loadings[metric]
+    return contributions
+
+def legacy_results_table(user_player_scores, ai_player_scores, user_contributions, ai_contributions):
+    results_df = pd.DataFrame(columns=['Team', 'Score'] + performance_metrics)
+    for name in user_player_scores.keys():
+        results_df.at[name, 'Team'] = 'User'
+        results_df.at[name, 'Score'] = user_player_scores[name]
+        for metric in performance_metrics:
+            results_df.at[name, metric] = user_contributions[metric].get(name, 0)
+    for name in ai_player_scores.keys():
+        results_df.at[name, 'Team'] = 'AI'
+        results_df.at[name, 'Score'] = ai_player_scores[name]
+        for metric in performance_metrics:
+            results_df.at[name, metric] = ai_contributions[metric].get(name, 0)
+    return results_df
+
+def best_of(func, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+def bench_scoring(n_players, repeats=3):
+    team_df = random_players(n_players)
+    loadings = random_loadings()
+
+    def legacy():
+        return (legacy_player_scores(team_df, loadings),
+                legacy_contributions(team_df, loadings, performance_metrics))
+
+    def batch():
+        return score_matrix(team_matrix(team_df), loadings_vector(loadings))
+
+    legacy_time, (legacy_scores, _) = best_of(legacy, 1)
+    batch_time, (scores, _) = best_of(batch, repeats)
+
+    # Both paths must agree before the timing means anything
+    assert np.allclose(np.fromiter(legacy_scores.values(), dtype=float), scores)
+    return legacy_time, batch_time
+
+def bench_results_table(n_players):
+    user_df = random_players(n_players, seed=1)
+    ai_df = random_players(n_players, seed=2)
+    ai_df['name'] = 'AI ' + ai_df['name']
+    loadings = random_loadings()
+    args = (compute_player_scores(user_df, loadings), compute_player_scores(ai_df, loadings),
+            compute_individual_contributions(user_df, loadings, performance_metrics),
+            compute_individual_contributions(ai_df, loadings, performance_metrics))
+
+    legacy_time, legacy_table = best_of(lambda: legacy_results_table(*args), 1)
+    batch_time, table = best_of(lambda: create_results_table(*args), 3)
+    assert np.allclose(legacy_table['Score'].astype(float), table['Score'].astype(float))
+    return legacy_time, batch_time
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Row-by-row vs batch scoring in game_simulator')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--table-size', type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'players':>10} {'row-by-row (s)':>15} {'batch (s)':>12} {'speedup':>10}")
+    for n in args.sizes:
+        legacy_time, batch_time = bench_scoring(n)
+        print(f"{n:>10} {legacy_time:>15.4f} {batch_time:>12.6f} {legacy_time / batch_time:>9.0f}x")
+
+    legacy_time, batch_time = bench_results_table(args.table_size)
+    print(f"create_results_table, {args.table_size} players per team: "
+          f"{legacy_time:.4f}s -> {batch_time:.4f}s ({legacy_time / batch_time:.0f}x)")
@@ -0,0 +1,51 @@
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'streamlit'))
+
+from game_simulator import load_feature_loadings
+from monte_carlo import load_player_ids
+from tournament import run_tournament
+
+master_copies_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'files', 'master_copies')
+
+# Function to draw random 3F/2D entries from the master pools
+def random_entries(forwards, defense, n_teams, seed=0):
+    rng = np.random.default_rng(seed)
+    return {f'Entry {i + 1}': pd.concat([forwards.iloc[rng.choice(len(forwards), 3, replace=False)],
+                                         defense.iloc[rng.choice(len(defense), 2, replace=False)]])
+            for i in range(n_teams)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Time a full round robin between random entries')
+    parser.add_argument('--teams', type=int, default=1000)
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    loadings = load_feature_loadings(os.path.join(master_copies_folder, 'feature_loadings.csv'))
+    forwards = pd.read_csv(os.path.join(master_copies_folder, 'forwards_rec_two.csv'))
+    defense = pd.read_csv(os.path.join(master_copies_folder, 'defense_rec_two.csv'))
+    teams = random_entries(forwards, defense, args.teams, args.seed)
+    pairings = args.teams * (args.teams - 1) // 2
+
+    start = time.perf_counter()
+    results = run_tournament(teams, loadings)
+    elapsed = time.perf_counter() - start
+    print(f"{args.teams:,} teams, {pairings:,} pairings, season averages: {elapsed:.3f}s")
+    print(results['standings'].head(10).to_string(index=False))
+
+    player_ids = load_player_ids()
+    start = time.perf_counter()
+    results = run_tournament(teams, loadings, monte_carlo=True, n_games=args.games, seed=args.seed,
+                             n_workers=args.workers, player_ids=player_ids)
+    elapsed = time.perf_counter() - start
+    print(f"{args.teams:,} teams, {pairings:,} pairings x {args.games:,} games, game logs "
+          f"({args.workers} workers): {elapsed:.3f}s")
+    print(results['standings'].head(10).round(2).to_string(index=False))
@@ -0,0 +1,191 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import contextlib
+import subprocess
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'streamlit'))
+
+from synthetic_league import synthetic_league
+from recommender import preprocess_data, find_closest_forwards
+from ai_team_generator import generate_ai_team
+from game_simulator import (performance_metrics, generate_feature_loadings, load_feature_loadings,
+                            simulate_game, compute_player_scores, compute_individual_contributions,
+                            create_results_table)
+
+default_sizes = [1000, 10000, 100000, 1000000]
+
+# Function to run something with its debug prints thrown away
+def quietly(func, *args, **kwargs):
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return func(*args, **kwargs)
+
+def case_recommender(forwards, defense, workdir):
+    target = forwards['name'].iloc[0]
+
+    def run():
+        pca_df, _ = preprocess_data(forwards)
+        find_closest_forwards(target, pca_df)
+    return run
+
+def case_feature_loadings(forwards, defense, workdir):
+    players = pd.concat([forwards, defense], ignore_index=True)
+    filepath = os.path.join(workdir, 'feature_loadings.csv')
+    return lambda: generate_feature_loadings(players, performance_metrics, filepath)
+
+def case_ai_team_greedy(forwards, defense, workdir):
+    players = pd.concat([forwards, defense], ignore_index=True)
+    initial_player = forwards.iloc[0]
+    return lambda: quietly(generate_ai_team, players, defense.copy(), forwards.copy(), initial_player)
+
+def case_ai_team_optimal(forwards, defense, workdir):
+    players = pd.concat([forwards, defense], ignore_index=True)
+    loadings = load_feature_loadings(_loadings_file(players, workdir))
+    initial_player = forwards.iloc[0]
+    return lambda: quietly(generate_ai_team, players, defense, forwards, initial_player, loadings)
+
+def case_simulate_game(forwards, defense, workdir):
+    # Both "teams" are the whole pool, so the curve shows how scoring scales with rows
+    user_filepath = os.path.join(workdir, 'user_team.csv')
+    ai_filepath = os.path.join(workdir, 'ai_team.csv')
+    forwards.to_csv(user_filepath, index=False)
+    defense.to_csv(ai_filepath, index=False)
+    loadings_filepath = _loadings_file(pd.concat([forwards, defense], ignore_index=True), workdir)
+    return lambda: quietly(simulate_game, user_filepath, ai_filepath, loadings_filepath)
+
+def case_results_table(forwards, defense, workdir):
+    loadings = load_feature_loadings(_loadings_file(pd.concat([forwards, defense], ignore_index=True), workdir))
+    args = (compute_player_scores(forwards, loadings), compute_player_scores(defense, loadings),
+            compute_individual_contributions(forwards, loadings, performance_metrics),
+            compute_individual_contributions(defense, loadings, performance_metrics))
+    return lambda: create_results_table(*args)
+
+def _loadings_file(players, workdir):
+    filepath = os.path.join(workdir, 'feature_loadings.csv')
+    if not os.path.exists(filepath):
+        generate_feature_loadings(players, performance_metrics, filepath)
+    return filepath
+
+# name -> (setup function, largest league size it is run at by default)
+cases = {
+    'recommender': (case_recommender, 1000000),
+    'feature_loadings': (case_feature_loadings, 1000000),
+    'ai_team_greedy': (case_ai_team_greedy, 1000000),
+    'ai_team_optimal': (case_ai_team_optimal, 1000000),
+    'simulate_game': (case_simulate_game, 100000),
+    'create_results_table': (case_results_table, 1000000),
+}
+
+def time_case(run, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': commit or None,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+    }
+
+def run_suite(sizes=default_sizes, selected=None, seed=0, repeats=5, max_rows=None):
+    '''
+    This function times every selected case at every league size.
+
+    Inputs:
+        sizes: league sizes (forwards + defense) to generate
+        selected: case names to run, None for all
+        seed: seed for the synthetic league, so runs are comparable
+        repeats: timed runs per case at the smallest size; fewer at larger sizes
+        max_rows: override each case's default size limit
+    Outputs:
+        results: list of dicts with case, rows, best, median and every timing in seconds
+    '''
+    results = []
+    for size in sizes:
+        forwards, defense = synthetic_league(size, seed)
+        size_repeats = max(1, repeats if size <= 10000 else repeats // 2 if size <= 100000 else 1)
+        with tempfile.TemporaryDirectory() as workdir:
+            for name, (setup, limit) in cases.items():
+                if selected and name not in selected:
+                    continue
+                if size > (max_rows or limit):
+                    continue
+                run = setup(forwards, defense, workdir)
+                run()  # warm-up, not timed
+                timings = time_case(run, size_repeats)
+                results.append({'case': name, 'rows': size, 'best': min(timings),
+                                'median': float(np.median(timings)), 'timings': timings})
+                print(f"{name:<22} {size:>9,} rows  best {min(timings):>9.4f}s  "
+                      f"median {np.median(timings):>9.4f}s  ({size_repeats} runs)", flush=True)
+    return results
+
+def compare(results, baseline, tolerance):
+    '''
+    This function flags cases that got slower than the baseline run.
+
+    Inputs:
+        results: list from run_suite
+        baseline: results list loaded from an earlier run's json
+        tolerance: allowed ratio of new best time to baseline best time
+    Outputs:
+        regressions: list of (case, rows, baseline best, new best)
+    '''
+    previous = {(r['case'], r['rows']): r['best'] for r in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get((result['case'], result['rows']))
+        if before is not None and result['best'] > before * tolerance:
+            regressions.append((result['case'], result['rows'], before, result['best']))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the app code paths on seeded synthetic leagues')
+    parser.add_argument('--sizes', type=int, nargs='+', default=default_sizes)
+    parser.add_argument('--cases', nargs='+', choices=list(cases), default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--max-rows', type=int, default=None)
+    parser.add_argument('--output', default=None, help='json file to write the results to')
+    parser.add_argument('--compare', default=None, help='json file from an earlier run to check against')
+    parser.add_argument('--tolerance', type=float, default=1.25)
+    args = parser.parse_args()
+
+    results = run_suite(args.sizes, args.cases, args.seed, args.repeats, args.max_rows)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment(), 'seed': args.seed, 'results': results}, f, indent=2)
+        print(f"Wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f)['results'], args.tolerance)
+        for case, rows, before, after in regressions:
+            print(f"REGRESSION {case} at {rows:,} rows: {before:.4f}s -> {after:.4f}s ({after / before:.2f}x)")
+        if regressions:
+            sys.exit(1)
+        print(f"No case slower than {args.tolerance:.2f}x its baseline")
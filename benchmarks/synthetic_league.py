@@ -0,0 +1,112 @@
+import os
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# Column order of files/master_copies/forwards_rec_two.csv, index columns dropped
+rec_columns = [
+    'name', 'd_zone_shift_starts', 'giveaways', 'goals', 'high_danger_goals', 'high_danger_shots',
+    'hits', 'low_danger_goals', 'low_danger_shots', 'medium_danger_goals', 'medium_danger_shots',
+    'missed_shots', 'o_zone_shift_starts', 'penalty_minutes', 'points', 'rebound_goals', 'rebounds',
+    'shifts', 'shot_attempts', 'shots_on_goal', 'takeaways', 'faceoffs_lost', 'faceoffs_won',
+    'games_played', 'icetime', 'on_ice_corsi_percentage', 'on_ice_fenwick_percentage',
+    'penalties_drawn', 'shots_blocked_by_player', 'assists', 'position_encoded', 'position', 'salary',
+]
+
+# Per-game (mean, std) of each rate column in forwards_rec_two.csv
+column_moments = {
+    'd_zone_shift_starts': (1.87, 0.99),
+    'giveaways': (0.31, 0.22),
+    'goals': (0.13, 0.11),
+    'high_danger_goals': (0.042, 0.043),
+    'high_danger_shots': (0.15, 0.12),
+    'hits': (1.2, 0.76),
+    'low_danger_goals': (0.039, 0.051),
+    'low_danger_shots': (1.27, 0.68),
+    'medium_danger_goals': (0.05, 0.05),
+    'medium_danger_shots': (0.45, 0.27),
+    'missed_shots': (0.52, 0.30),
+    'o_zone_shift_starts': (2.24, 1.09),
+    'penalty_minutes': (0.46, 0.50),
+    'rebound_goals': (0.023, 0.026),
+    'rebounds': (0.11, 0.096),
+    'shifts': (16.6, 4.0),
+    'shot_attempts': (2.38, 1.22),
+    'shots_on_goal': (1.35, 0.70),
+    'takeaways': (0.32, 0.21),
+    'faceoffs_lost': (1.63, 2.11),
+    'faceoffs_won': (1.53, 2.20),
+    'icetime': (736.0, 212.0),
+    'penalties_drawn': (0.19, 0.14),
+    'shots_blocked_by_player': (0.40, 0.23),
+    'assists': (0.18, 0.15),
+}
+
+# Salary tiers and how often each shows up in forwards_rec_two.csv + defense_rec_two.csv (2,920 players)
+salary_tiers = [950000, 2000000, 4000000, 6000000, 8000000, 10000000, 12000000]
+salary_weights = [0.6462, 0.0411, 0.1257, 0.1243, 0.0538, 0.0065, 0.0024]
+
+# Shape of the shared usage factor (mean 1, coefficient of variation 0.2)
+usage_shape = 25.0
+
+teams = ['ANA', 'BOS', 'BUF', 'CAR', 'CBJ', 'CGY', 'CHI', 'COL', 'DAL', 'DET', 'EDM', 'FLA',
+         'LAK', 'MIN', 'MTL', 'NJD', 'NSH', 'NYI', 'NYR', 'OTT', 'PHI', 'PIT', 'SEA', 'SJS',
+         'STL', 'TBL', 'TOR', 'UTA', 'VAN', 'VGK', 'WPG', 'WSH']
+
+def synthetic_players(n_players, seed=0, position='F', with_team=True):
+    '''
+    This function generates a seeded table of fake players in the forwards_rec_two.csv layout.
+
+    Every rate column is drawn from a gamma matching the real column's mean and spread,
+    scaled by a shared per-player "usage" factor so the columns are (loosely) correlated
+    rather than independent noise. The same seed always gives the same table.
+
+    Inputs:
+        n_players: number of rows
+        seed: random seed
+        position: 'F' or 'D'
+        with_team: add a team column, which the app's final tables and the recommender need
+    Outputs:
+        df: dataframe with the rec_columns (plus team)
+    '''
+    rng = np.random.default_rng(seed)
+    usage = rng.gamma(usage_shape, 1 / usage_shape, n_players)
+
+    columns = {'name': [f'Synthetic {position} {i}' for i in range(n_players)]}
+    for column, (mean, std) in column_moments.items():
+        # Shrink each column's own spread so usage * column keeps the real std
+        variance = max((std ** 2 + mean ** 2) / (1 + 1 / usage_shape) - mean ** 2, (0.05 * mean) ** 2)
+        shape = mean ** 2 / variance
+        columns[column] = usage * rng.gamma(shape, mean / shape, n_players)
+    columns['points'] = columns['goals'] + columns['assists']
+    columns['games_played'] = np.minimum(rng.geometric(1 / 245, n_players), 1285)
+    columns['on_ice_corsi_percentage'] = rng.beta(0.3, 5.3, n_players)
+    columns['on_ice_fenwick_percentage'] = np.clip(
+        columns['on_ice_corsi_percentage'] + rng.normal(0, 0.005, n_players), 0, 1)
+    columns['position_encoded'] = np.full(n_players, 1 if position == 'F' else 0)
+    columns['position'] = np.full(n_players, position)
+    columns['salary'] = rng.choice(salary_tiers, n_players, p=salary_weights)
+
+    df = pd.DataFrame(columns)[rec_columns]
+    if with_team:
+        df['team'] = rng.choice(teams, n_players)
+    return df
+
+def synthetic_league(n_players, seed=0, defense_share=1 / 3):
+    # Forwards and defense in the real 2:1 ratio, with distinct seeds so they differ
+    n_defense = int(n_players * defense_share)
+    return (synthetic_players(n_players - n_defense, seed, 'F'),
+            synthetic_players(n_defense, seed + 1, 'D'))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Write a seeded synthetic league in the master-copy layout')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output-folder', default='.')
+    args = parser.parse_args()
+
+    forwards, defense = synthetic_league(args.rows, args.seed)
+    forwards.to_csv(os.path.join(args.output_folder, f'synthetic_forwards_{args.rows}.csv'), index=False)
+    defense.to_csv(os.path.join(args.output_folder, f'synthetic_defense_{args.rows}.csv'), index=False)
+    print(f"Wrote {len(forwards):,} forwards and {len(defense):,} defense (seed {args.seed})")
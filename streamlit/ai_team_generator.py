@@ -1,8 +1,8 @@
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics.pairwise import cosine_similarity
 import random
-from sklearn.metrics.pairwise import euclidean_distances
+from lineup_solver import optimal_lineup
+from instrumentation import timed
+from player_registry import PlayerRegistry
 
 # Define the performance metrics
 performance_metrics = [
@@ -14,6 +14,9 @@ performance_metrics = [
 
 # Function to preprocess data
 def preprocess_data(df):
+    # sklearn is imported on first use so the app can start without it
+    from sklearn.preprocessing import StandardScaler
+
     scaler = StandardScaler()
     scaled_df = pd.DataFrame(scaler.fit_transform(df[performance_metrics]), columns=performance_metrics)
     scaled_df['name'] = df['name'].values
@@ -24,6 +27,8 @@ def preprocess_data(df):
 
 # Function to recommend the next skater based on cosine similarity
 def recommend_next_player_skater(selected_player, players_pool, remaining_cap, performance_metrics, reserve=0):
+    from sklearn.metrics.pairwise import euclidean_distances
+
     # Filter candidates by salary
     pos_candidates = players_pool[players_pool['salary'] <= (remaining_cap - reserve)].copy()
     
@@ -53,14 +58,22 @@ def recommend_next_player_skater(selected_player, players_pool, remaining_cap, p
     return best_candidate, remaining_cap
 
 # Function to generate AI team
-def generate_ai_team(all_players_data, defense_rec, forwards_rec, initial_player):
+@timed('ai team generation')
+def generate_ai_team(all_players_data, defense_rec, forwards_rec, initial_player, loadings=None):
     
      # If initial_player is a dict, convert it to a full Series by looking it up
     if not isinstance(initial_player, pd.Series):
-        initial_player = all_players_data[all_players_data['name'] == initial_player['name']].iloc[0]
+        if isinstance(all_players_data, PlayerRegistry):
+            initial_player = all_players_data.get(initial_player['name'])
+        else:
+            initial_player = all_players_data[all_players_data['name'] == initial_player['name']].iloc[0]
         
     selected_player = initial_player
 
+    # With the simulator's loadings, solve for the best lineup around the initial player
+    if loadings is not None:
+        return generate_optimal_ai_team(defense_rec, forwards_rec, selected_player, loadings)
+
    # Remove the initial player from candidate pools to avoid duplication.
     forwards_rec = forwards_rec[forwards_rec['name'] != selected_player['name']]
     defense_rec = defense_rec[defense_rec['name'] != selected_player['name']]
@@ -113,4 +126,17 @@ def generate_ai_team(all_players_data, defense_rec, forwards_rec, initial_player
         return ai_team, remaining_cap
     else:
         print("Failed to meet the team composition requirements.")
-        return [], remaining_cap
\ No newline at end of file
+        return [], remaining_cap
+
+# Function to generate the AI team with the exact cap-constrained solver
+def generate_optimal_ai_team(defense_rec, forwards_rec, initial_player, loadings, salary_cap=30000000):
+    lineup, remaining_cap = optimal_lineup(forwards_rec, defense_rec, loadings,
+                                           fixed=initial_player.to_frame().T, cap=salary_cap)
+    if lineup is None:
+        print("No 3F/2D lineup fits under the salary cap.")
+        return [], salary_cap - initial_player['salary']
+
+    ai_team = [player for _, player in lineup.drop(columns=['score']).iterrows()]
+    for player in ai_team:
+        print(f"AI added {player['name']} ({player['position']}) - ${player['salary']:,}")
+    return ai_team, remaining_cap
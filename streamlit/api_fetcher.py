@@ -0,0 +1,334 @@
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+from datetime import date
+
+import pandas as pd
+
+from data_store import project_root, cache_folder, write_atomic
+from game_logs import game_log_folders, list_game_log_files
+
+# Both can point at a local stand-in server; the cap sheet has no default source
+api_base_url = os.environ.get('NHL_API_BASE_URL', 'https://api-web.nhle.com/v1')
+cap_url = os.environ.get('NHL_CAP_URL')
+cap_filepath = os.path.join(project_root, 'files', 'salary', 'cap_all.csv')
+http_cache_folder = os.path.join(cache_folder, 'http')
+
+# Regular season, as in the api notebooks
+game_type = 2
+
+# Columns kept from each gameLog entry, in the order the api notebooks wrote them
+game_log_columns = {
+    'F': ['gameDate', 'homeRoadFlag', 'goals', 'assists', 'points', 'plusMinus', 'powerPlayGoals',
+          'powerPlayPoints', 'gameWinningGoals', 'otGoals', 'shots', 'shifts', 'opponentAbbrev', 'pim', 'toi'],
+    'G': ['gameId', 'homeRoadFlag', 'gameDate'],
+}
+game_log_columns['D'] = game_log_columns['F']
+
+# Worth another try: rate limited or a server-side hiccup
+retry_statuses = {429, 500, 502, 503, 504}
+
+def _aiohttp():
+    # Only the refresh command needs aiohttp, so the app does not pay for importing it
+    try:
+        import aiohttp
+    except ImportError as error:
+        raise ImportError('Refreshing from the NHL API needs aiohttp: pip install aiohttp') from error
+    return aiohttp
+
+def current_season(today=None):
+    # NHL seasons start in the fall: October 2024 through June 2025 is "20242025"
+    today = today or date.today()
+    start = today.year if today.month >= 9 else today.year - 1
+    return f'{start}{start + 1}'
+
+def game_seasons(game_dates):
+    # Season string of each game date, as in current_season
+    dates = pd.to_datetime(pd.Series(game_dates), errors='coerce')
+    start = (dates.dt.year - (dates.dt.month < 9)).astype('Int64')
+    return (start.astype(str) + (start + 1).astype(str)).where(dates.notna())
+
+def read_existing_log(filepath):
+    '''
+    This function reads a player's current game-log csv as text, so rows that are written
+    back come out exactly as they went in.
+
+    Inputs:
+        filepath: player_<id>.csv
+    Outputs:
+        df: dataframe of strings, or None when the file is missing or empty
+    '''
+    if not os.path.exists(filepath):
+        return None
+    try:
+        df = pd.read_csv(filepath, dtype=str, keep_default_na=False)
+    except pd.errors.EmptyDataError:
+        return None
+    return None if df.empty else df
+
+class RateLimiter:
+    '''
+    Spaces requests at least 1 / rate seconds apart across every task sharing it.
+    '''
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_time = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class ResponseCache:
+    '''
+    On-disk copies of earlier responses with their ETag / Last-Modified headers, so a
+    repeat request can be made conditional and a 304 answered from disk.
+    '''
+
+    def __init__(self, folder=http_cache_folder):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    def _paths(self, url):
+        key = hashlib.sha1(url.encode()).hexdigest()
+        return os.path.join(self.folder, key + '.json'), os.path.join(self.folder, key + '.body')
+
+    def get(self, url):
+        # (validators dict, body bytes) from the last 200, or (None, None)
+        meta_path, body_path = self._paths(url)
+        if not (os.path.exists(meta_path) and os.path.exists(body_path)):
+            return None, None
+        with open(meta_path) as f:
+            meta = json.load(f)
+        with open(body_path, 'rb') as f:
+            return meta, f.read()
+
+    def put(self, url, headers, body):
+        meta = {'url': url, 'etag': headers.get('ETag'), 'last_modified': headers.get('Last-Modified')}
+        if meta['etag'] is None and meta['last_modified'] is None:
+            return  # nothing to revalidate with
+        meta_path, body_path = self._paths(url)
+
+        def write_body(tmp_path):
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+
+        def write_meta(tmp_path):
+            with open(tmp_path, 'w') as f:
+                json.dump(meta, f)
+        write_atomic(write_body, body_path)
+        write_atomic(write_meta, meta_path)
+
+async def fetch(session, url, cache, limiter, semaphore, retries=3, backoff=0.5):
+    '''
+    This function GETs one url, conditionally when a cached copy exists, retrying
+    rate-limit and server errors with exponential backoff.
+
+    Inputs:
+        session: aiohttp.ClientSession shared by every request
+        url: address to fetch
+        cache: ResponseCache
+        limiter: RateLimiter shared by every request
+        semaphore: asyncio.Semaphore bounding the requests in flight
+        retries: further attempts after the first one fails
+        backoff: seconds before the first retry, doubled after each one
+    Outputs:
+        status: 'fetched' (new body), 'not_modified' (cached body), 'missing' (404)
+        body: response bytes, None when missing
+    '''
+    aiohttp = _aiohttp()
+    meta, cached_body = cache.get(url)
+    headers = {}
+    if meta is not None:
+        if meta['etag']:
+            headers['If-None-Match'] = meta['etag']
+        if meta['last_modified']:
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    for attempt in range(retries + 1):
+        wait = backoff * 2 ** attempt * (1 + random.random() / 4)
+        try:
+            await limiter.wait()
+            async with semaphore:
+                async with session.get(url, headers=headers) as response:
+                    if response.status == 304 and cached_body is not None:
+                        return 'not_modified', cached_body
+                    if response.status == 404:
+                        return 'missing', None
+                    if response.status in retry_statuses and attempt < retries:
+                        retry_after = response.headers.get('Retry-After', '')
+                        wait = float(retry_after) if retry_after.isdigit() else wait
+                    else:
+                        response.raise_for_status()
+                        body = await response.read()
+                        cache.put(url, response.headers, body)
+                        return 'fetched', body
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt == retries:
+                raise
+        await asyncio.sleep(wait)
+
+def game_log_frame(payloads, group):
+    '''
+    This function flattens game-log responses into the player_<id>.csv layout.
+
+    Inputs:
+        payloads: list of decoded game-log responses, one per season
+        group: 'F', 'D' or 'G', picks the columns kept
+    Outputs:
+        df: one row per game, newest first
+    '''
+    games = [game for payload in payloads for game in payload.get('gameLog', [])]
+    df = pd.DataFrame(games).reindex(columns=game_log_columns[group])
+    return df.sort_values('gameDate', ascending=False, kind='stable').reset_index(drop=True)
+
+def _write_if_changed(filepath, text):
+    # Leaves the file (and its mtime, which the game-log cache watches) alone when nothing changed
+    if os.path.exists(filepath):
+        with open(filepath, encoding='utf-8') as f:
+            if f.read() == text:
+                return False
+
+    def write(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+    write_atomic(write, filepath)
+    return True
+
+async def _refresh_player(session, player, seasons, base_url, cache, limiter, semaphore, retries):
+    filepath, player_id, group = player
+    existing = read_existing_log(filepath)
+    if seasons is None:
+        # Refresh the seasons the file already holds; a new file starts at the current season
+        seasons = (sorted(game_seasons(existing['gameDate']).dropna().unique())
+                   if existing is not None and 'gameDate' in existing.columns else [])
+        seasons = seasons or [current_season()]
+    urls = [f'{base_url}/player/{player_id}/game-log/{season}/{game_type}' for season in seasons]
+    try:
+        responses = await asyncio.gather(*[fetch(session, url, cache, limiter, semaphore, retries) for url in urls])
+    except Exception as error:
+        return {'playerId': player_id, 'status': 'failed', 'error': repr(error)}
+
+    if all(status == 'not_modified' for status, _ in responses):
+        return {'playerId': player_id, 'status': 'not_modified'}
+    payloads = [json.loads(body) for status, body in responses if body is not None]
+    df = game_log_frame(payloads, group)
+    # A season with no games (retired, injured, not yet started) never wipes out an older log
+    if df.empty:
+        return {'playerId': player_id, 'status': 'no_games'}
+    if existing is not None and 'gameDate' in existing.columns:
+        # Games from seasons that were not fetched stay in the file
+        kept = existing[~game_seasons(existing['gameDate']).isin(seasons).to_numpy()]
+        if not kept.empty:
+            df = pd.concat([df, kept.reindex(columns=df.columns)], ignore_index=True)
+            df = df.sort_values('gameDate', ascending=False, kind='stable')
+    written = _write_if_changed(filepath, df.to_csv(index=False))
+    return {'playerId': player_id, 'status': 'written' if written else 'unchanged'}
+
+async def refresh_game_logs_async(players, seasons, base_url=api_base_url, concurrency=8, rate=20.0,
+                                  retries=3, cache=None, timeout=30):
+    '''
+    This function refreshes the game-log csv of every tracked player over one pooled
+    session, with at most concurrency requests in flight and at most rate per second.
+
+    Inputs:
+        players: list of (filepath, playerId, group) from list_game_log_files
+        seasons: list of season strings such as '20242025'; None refreshes the seasons each
+                 file already holds. Games of seasons not fetched are kept either way
+        base_url: NHL API root
+        concurrency: requests in flight at once, also the connection pool size
+        rate: requests started per second, 0 for no limit
+        retries: further attempts per request
+        cache: ResponseCache, the default folder when None
+        timeout: seconds allowed per request
+    Outputs:
+        results: dataframe with one row per player: playerId, status (written, unchanged,
+                 not_modified, no_games or failed) and error
+    '''
+    aiohttp = _aiohttp()
+    cache = cache or ResponseCache()
+    limiter = RateLimiter(rate)
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        results = await asyncio.gather(*[_refresh_player(session, player, seasons, base_url, cache, limiter,
+                                                         semaphore, retries) for player in players])
+    return pd.DataFrame(results, columns=['playerId', 'status', 'error'])
+
+async def refresh_cap_async(url, filepath=cap_filepath, retries=3, cache=None, timeout=60):
+    '''
+    This function refreshes the salary cap sheet from a csv url.
+
+    Inputs:
+        url: where the cap sheet is published, in the cap_all.csv layout
+        filepath: local copy to update
+        retries: further attempts
+        cache: ResponseCache, the default folder when None
+        timeout: seconds allowed for the request
+    Outputs:
+        status: 'written', 'unchanged', 'not_modified' or 'missing'
+    '''
+    aiohttp = _aiohttp()
+    cache = cache or ResponseCache()
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        status, body = await fetch(session, url, cache, RateLimiter(0), asyncio.Semaphore(1), retries)
+    if status != 'fetched':
+        return status
+    return 'written' if _write_if_changed(filepath, body.decode('utf-8')) else 'unchanged'
+
+def refresh_game_logs(player_ids=None, seasons=None, folders=game_log_folders, **kwargs):
+    '''
+    This function is the blocking entry point: it picks the tracked players and runs
+    refresh_game_logs_async on a fresh event loop.
+
+    Inputs:
+        player_ids: only refresh these playerIds, every player with a log file when None
+        seasons: seasons to fetch, the ones already in each player's file when None
+        folders: game-log folders, whose player_<id>.csv files define the tracked players
+        kwargs: passed to refresh_game_logs_async
+    Outputs:
+        results: dataframe from refresh_game_logs_async
+    '''
+    players = list_game_log_files(folders)
+    if player_ids is not None:
+        wanted = set(int(player_id) for player_id in player_ids)
+        players = [player for player in players if player[1] in wanted]
+    return asyncio.run(refresh_game_logs_async(players, seasons, **kwargs))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Refresh the NHL API game logs and the cap sheet')
+    parser.add_argument('--base-url', default=api_base_url)
+    parser.add_argument('--seasons', nargs='+', default=None,
+                        help="e.g. 20232024 20242025; the seasons already in each player's file by default")
+    parser.add_argument('--players', nargs='+', type=int, default=None, help='playerIds; every tracked player by default')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=20.0, help='requests per second, 0 for no limit')
+    parser.add_argument('--retries', type=int, default=3)
+    parser.add_argument('--cap-url', default=cap_url, help='csv url for cap_all.csv; skipped when not set')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = refresh_game_logs(args.players, args.seasons, base_url=args.base_url, concurrency=args.concurrency,
+                                rate=args.rate, retries=args.retries)
+    elapsed = time.perf_counter() - start
+    print(results['status'].value_counts().to_string())
+    failed = results[results['status'] == 'failed']
+    if not failed.empty:
+        print(failed.to_string(index=False))
+    print(f"{len(results):,} players in {elapsed:.2f}s")
+
+    if args.cap_url:
+        print(f"Cap sheet: {asyncio.run(refresh_cap_async(args.cap_url, retries=args.retries))}")
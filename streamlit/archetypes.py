@@ -0,0 +1,333 @@
+import os
+import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from data_store import cache_folder
+from season_pipeline import season_partials
+from recommender import features
+from instrumentation import timed
+
+archetypes_folder = os.path.join(cache_folder, 'archetypes')
+methods = ['kmeans', 'birch']
+# CF-tree radius in the projected space; about 800 subclusters over every season, so the
+# agglomerative step never sees more than that many points
+birch_threshold = 2.0
+
+def player_seasons(min_games=10, situation='all'):
+    '''
+    This function builds one row of per-game rates per player and season from every
+    skater season file, in the recommender's feature layout.
+
+    Inputs:
+        min_games: fewest games a season needs to be kept
+        situation: situation split to use
+    Outputs:
+        seasons: dataframe with playerId, season, name, team, position ('F'/'D'),
+                 games_played and the recommender features
+    '''
+    partials, _ = season_partials('skaters', situations=(situation,))
+    seasons = pd.concat(partials.values(), ignore_index=True)
+    seasons = seasons[(seasons['situation'] == situation) & (seasons['games_played'] >= max(min_games, 1))]
+    seasons = seasons.assign(assists=seasons['primary_assists'] + seasons['secondary_assists'],
+                             position=np.where(seasons['position'].astype(str) == 'D', 'D', 'F'))
+    # Totals (and the games-weighted percentages) over games played give per-game rates and real percentages
+    games = seasons['games_played'].to_numpy(dtype=np.float64)
+    rates = seasons[features].to_numpy(dtype=np.float64) / games[:, None]
+    keys = seasons[['playerId', 'season', 'name', 'team', 'position', 'games_played']].reset_index(drop=True)
+    keys['team'] = keys['team'].astype(str)
+    return pd.concat([keys, pd.DataFrame(rates, columns=features)], axis=1)
+
+def project(seasons, n_components=10):
+    '''
+    This function fits the same scaler + PCA as recommender.preprocess_data over every
+    player-season.
+
+    Inputs:
+        seasons: dataframe from player_seasons
+        n_components: PCA components to keep
+    Outputs:
+        scaler, pca: the fitted StandardScaler and PCA
+        projected: float array of shape (n_rows, n_components)
+    '''
+    from sklearn.decomposition import PCA
+    from sklearn.preprocessing import StandardScaler
+
+    scaler = StandardScaler()
+    pca = PCA(n_components=n_components)
+    projected = pca.fit_transform(scaler.fit_transform(seasons[features]))
+    return scaler, pca, np.ascontiguousarray(projected)
+
+def fit_clusters(X, k, method='kmeans', seed=0, batch_size=1024):
+    '''
+    This function clusters the projected rows into k archetypes.
+
+    'kmeans' is MiniBatchKMeans. 'birch' is the memory-bounded hierarchical option: rows
+    are streamed batch by batch into a CF-tree, and only the tree's subclusters (not every
+    row) go through the final agglomerative step.
+
+    Inputs:
+        X: projected rows
+        k: number of archetypes
+        method: 'kmeans' or 'birch'
+        seed: random state for MiniBatchKMeans
+        batch_size: rows per mini-batch / per CF-tree update
+    Outputs:
+        labels: int array of each row's archetype
+        centroids: float array of shape (k, n_components), the mean of each archetype's rows
+    '''
+    if method == 'kmeans':
+        from sklearn.cluster import MiniBatchKMeans
+        labels = MiniBatchKMeans(n_clusters=k, batch_size=batch_size, n_init=3, random_state=seed).fit_predict(X)
+    elif method == 'birch':
+        from sklearn.cluster import Birch
+        birch = Birch(n_clusters=None, threshold=birch_threshold)
+        for start in range(0, len(X), batch_size):
+            birch.partial_fit(X[start:start + batch_size])
+        # One global step over the subclusters once every batch is in
+        birch.set_params(n_clusters=k)
+        birch.partial_fit()
+        labels = birch.predict(X)
+    else:
+        raise ValueError(f"Unknown clustering method {method!r}, expected one of {methods}")
+
+    # Labels are renumbered by archetype size so archetype 0 is always the largest
+    _, labels, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+    order = np.argsort(-sizes, kind='stable')
+    labels = np.argsort(order)[labels]
+    centroids = np.zeros((len(order), X.shape[1]))
+    np.add.at(centroids, labels, X)
+    centroids /= np.bincount(labels)[:, None]
+    return labels, centroids
+
+def _sweep_one(args):
+    X, k, method, seed, sample_size = args
+    from sklearn.metrics import silhouette_score
+    labels, centroids = fit_clusters(X, k, method, seed)
+    inertia = float(((X - centroids[labels]) ** 2).sum())
+    silhouette = float(silhouette_score(X, labels, sample_size=min(sample_size, len(X)), random_state=seed))
+    return {'k': k, 'inertia': inertia, 'silhouette': silhouette, 'archetypes': len(centroids)}
+
+@timed('archetype k sweep')
+def k_sweep(X, ks=range(2, 16), method='kmeans', seed=0, n_workers=None, sample_size=5000):
+    '''
+    This function fits every k at once across processes, for the elbow plot.
+
+    Inputs:
+        X: projected rows
+        ks: numbers of archetypes to try
+        method: 'kmeans' or 'birch'
+        seed: random state
+        n_workers: processes to use, one per CPU when None; 1 runs in-process
+        sample_size: rows the silhouette score is estimated on
+    Outputs:
+        sweep: dataframe with k, inertia, silhouette and archetypes found, one row per k
+    '''
+    ks = list(ks)
+    tasks = [(X, k, method, seed, sample_size) for k in ks]
+    n_workers = min(n_workers or os.cpu_count() or 1, len(ks))
+    if n_workers == 1:
+        results = [_sweep_one(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            results = list(executor.map(_sweep_one, tasks))
+    return pd.DataFrame(results)
+
+def elbow_k(sweep):
+    # The k farthest below the straight line from the first to the last point of the inertia curve
+    k = sweep['k'].to_numpy(dtype=float)
+    inertia = sweep['inertia'].to_numpy(dtype=float)
+    k = (k - k[0]) / max(k[-1] - k[0], 1)
+    inertia = (inertia - inertia[-1]) / max(inertia[0] - inertia[-1], 1e-12)
+    return int(sweep['k'].iloc[np.argmax((1 - k) - inertia)])
+
+class ArchetypeModel:
+    '''
+    Player archetypes over every skater season: the scaler + PCA the seasons were projected
+    with, each archetype's centroid, and the archetype of every player-season.
+
+    Build it with build_archetypes(), which reuses the copy saved under files/cache while
+    the season data and options are unchanged.
+    '''
+
+    def __init__(self, scaler, pca, centroids, assignments, sweep, method, key):
+        self.scaler = scaler
+        self.pca = pca
+        self.centroids = centroids
+        self.assignments = assignments.reset_index(drop=True)
+        self.sweep = sweep
+        self.method = method
+        self.key = key
+        # A player's archetype is the one of their latest season
+        latest = self.assignments.sort_values('season', kind='stable').drop_duplicates('playerId', keep='last')
+        self.archetype_by_id = dict(zip(latest['playerId'], latest['archetype']))
+        self.archetype_by_name = dict(zip(latest['name'], latest['archetype']))
+
+    def assign(self, player_data):
+        '''
+        This function puts each player of a table in the archetype with the nearest centroid.
+
+        Inputs:
+            player_data: dataframe with the recommender features as per-game rates, laid
+                         out like player_seasons (one season per row, real percentages)
+        Outputs:
+            labels: int array, one archetype per row
+        '''
+        X = self.pca.transform(self.scaler.transform(player_data[features]))
+        distances = ((X[:, None, :] - self.centroids[None, :, :]) ** 2).sum(axis=2)
+        return distances.argmin(axis=1)
+
+    def archetype_of(self, player):
+        # Archetype of a playerId or name from their latest season, None when unknown
+        if isinstance(player, (int, np.integer)):
+            return self.archetype_by_id.get(int(player))
+        return self.archetype_by_name.get(player)
+
+    def same_archetype(self, player, season=None):
+        '''
+        This function lists the player-seasons in the same archetype as a player.
+
+        Inputs:
+            player: playerId or name
+            season: only return that season's rows, or None for every season
+        Outputs:
+            players: assignments rows in the player's archetype, without the player
+        '''
+        archetype = self.archetype_of(player)
+        if archetype is None:
+            raise KeyError(f"{player} has no archetype.")
+        rows = self.assignments[self.assignments['archetype'] == archetype]
+        if season is not None:
+            rows = rows[rows['season'] == season]
+        column = 'playerId' if isinstance(player, (int, np.integer)) else 'name'
+        return rows[rows[column] != player]
+
+    def prefilter(self, player_data, player_name):
+        '''
+        This function is the recommender's candidate prefilter: it keeps the rows of a
+        player table that share the target's archetype.
+
+        Players are looked up in the fitted assignments (their latest season) by playerId
+        when the table has one, by name otherwise. The app's tables are career aggregates
+        on other scales, so they are not pushed through assign.
+
+        Inputs:
+            player_data: dataframe with name, and playerId / player_id when available
+            player_name: target player
+        Outputs:
+            mask: boolean array over player_data's rows, False for players without an
+                  archetype; all True when the target has none
+        '''
+        labels = pd.Series(player_data['name'].map(self.archetype_by_name).to_numpy(), dtype='float64')
+        for column in ['playerId', 'player_id']:
+            if column in player_data.columns:
+                by_id = pd.to_numeric(player_data[column], errors='coerce').map(self.archetype_by_id)
+                labels = pd.Series(by_id.to_numpy(), dtype='float64').fillna(labels)
+                break
+        # The target's row in the table is used first, so its playerId wins over its name
+        rows = np.flatnonzero(player_data['name'].to_numpy() == player_name)
+        archetype = labels.iloc[rows[0]] if len(rows) else np.nan
+        if np.isnan(archetype):
+            archetype = self.archetype_of(player_name)
+        if archetype is None:
+            return np.ones(len(player_data), dtype=bool)
+        return (labels == archetype).to_numpy()
+
+    def save(self, filepath):
+        import joblib
+        joblib.dump((self.scaler, self.pca, self.centroids, self.assignments, self.sweep, self.method, self.key),
+                    filepath)
+
+    @classmethod
+    def load(cls, filepath):
+        import joblib
+        return cls(*joblib.load(filepath))
+
+def _inputs_key(seasons, options):
+    sha1 = hashlib.sha1(repr(sorted(options.items())).encode())
+    sha1.update(pd.util.hash_pandas_object(seasons, index=False).to_numpy().tobytes())
+    return sha1.hexdigest()
+
+@timed('archetypes')
+def build_archetypes(method='kmeans', k=None, ks=range(2, 16), min_games=10, n_components=10, seed=0,
+                     n_workers=None, folder=archetypes_folder, refit=False):
+    '''
+    This function returns the archetype model for every skater season, fitting and saving
+    it only when the season data or the options changed since the saved copy.
+
+    Inputs:
+        method: 'kmeans' (MiniBatchKMeans) or 'birch' (memory-bounded hierarchical)
+        k: number of archetypes, picked from the k sweep's elbow when None
+        ks: numbers of archetypes tried in the sweep
+        min_games: fewest games a season needs to be clustered
+        n_components: PCA components, as in recommender.preprocess_data
+        seed: random state
+        n_workers: processes for the k sweep, one per CPU when None
+        folder: where the fitted model is kept
+        refit: fit again even if the saved copy is current
+    Outputs:
+        model: ArchetypeModel
+    '''
+    seasons = player_seasons(min_games)
+    key = _inputs_key(seasons, {'method': method, 'k': k, 'ks': list(ks), 'n_components': n_components,
+                                'seed': seed})
+    filepath = os.path.join(folder, f'archetypes_{method}.joblib')
+    if not refit and os.path.exists(filepath):
+        model = ArchetypeModel.load(filepath)
+        if model.key == key:
+            return model
+
+    scaler, pca, X = project(seasons, n_components)
+    sweep = k_sweep(X, ks, method, seed, n_workers)
+    labels, centroids = fit_clusters(X, k or elbow_k(sweep), method, seed)
+    assignments = seasons[['playerId', 'season', 'name', 'team', 'position', 'games_played']].assign(archetype=labels)
+    model = ArchetypeModel(scaler, pca, centroids, assignments, sweep, method, key)
+
+    os.makedirs(folder, exist_ok=True)
+    tmp_path = f'{filepath}.{os.getpid()}.tmp'
+    model.save(tmp_path)
+    os.replace(tmp_path, filepath)
+    return model
+
+def archetype_summary(model):
+    # Size, position mix and best-known members of each archetype, for a quick read
+    assignments = model.assignments
+    grouped = assignments.groupby('archetype')
+    return pd.DataFrame({
+        'player_seasons': grouped.size(),
+        'forwards': grouped['position'].apply(lambda positions: (positions == 'F').mean()),
+        'examples': grouped.apply(lambda rows: ', '.join(rows.nlargest(3, 'games_played')['name']),
+                                  include_groups=False),
+    })
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Cluster every skater season into player archetypes')
+    parser.add_argument('--method', choices=methods, default='kmeans')
+    parser.add_argument('--k', type=int, default=None, help='archetypes; picked from the elbow when not set')
+    parser.add_argument('--k-min', type=int, default=2)
+    parser.add_argument('--k-max', type=int, default=15)
+    parser.add_argument('--min-games', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--refit', action='store_true')
+    parser.add_argument('--player', default=None, help='list the players sharing this player\'s archetype')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    model = build_archetypes(args.method, args.k, range(args.k_min, args.k_max + 1), args.min_games,
+                             n_workers=args.workers, refit=args.refit)
+    elapsed = time.perf_counter() - start
+
+    print(model.sweep.round(3).to_string(index=False))
+    print(f"\n{len(model.centroids)} archetypes over {len(model.assignments):,} player-seasons ({elapsed:.2f}s)")
+    print(archetype_summary(model).round(2).to_string())
+    if args.player:
+        similar = model.same_archetype(args.player)
+        print(f"\n{similar['name'].nunique():,} players share {args.player}'s archetype, e.g.:")
+        latest = similar.sort_values(['season', 'games_played'], ascending=False).drop_duplicates('playerId')
+        print(latest.head(10)[['name', 'season', 'team', 'position']].to_string(index=False))
@@ -0,0 +1,365 @@
+import os
+import json
+import hashlib
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from game_simulator import loadings_vector
+from lineup_solver import team_composition
+from monte_carlo import log_metric_map, logged_positions
+from game_logs import game_log_folders, load_game_logs
+from season_pipeline import season_partials
+from data_store import project_root, cache_folder, content_hash, write_atomic, read_snapshot, write_snapshot, snapshot_extension
+from instrumentation import timed
+
+loadings_filepath = os.path.join(project_root, 'files', 'master_copies', 'feature_loadings.csv')
+backtest_cache_folder = os.path.join(cache_folder, 'backtest')
+
+# MoneyPuck's old-style codes and the API's pre-2014 Coyotes, mapped to one spelling
+team_fixes = {'L.A': 'LAK', 'N.J': 'NJD', 'S.J': 'SJS', 'T.B': 'TBL', 'PHX': 'ARI'}
+
+# Columns a player's form is averaged over, in log_metric_map order
+form_columns = [f'prior_{metric}' for metric in log_metric_map]
+# One side of one game: the date, home or road, and who they played
+side_key = ['gameDate', 'homeRoadFlag', 'opp']
+
+def nhl_season(dates):
+    # NHL seasons start in the fall and are named for their first year, as in the MoneyPuck tables
+    return np.where(dates.dt.month >= 9, dates.dt.year, dates.dt.year - 1).astype('int16')
+
+def prior_form(game_logs, min_prior_games=5):
+    '''
+    This function averages each player's logged metrics over the games they played
+    before each game, so a game is only ever scored on what was known going into it.
+
+    Inputs:
+        game_logs: table from load_game_logs, sorted by playerId and gameDate
+        min_prior_games: games a player needs behind them before their form counts
+    Outputs:
+        form: game_logs with n_prior and one prior_<metric> column per logged metric,
+              NaN where the player has fewer than min_prior_games earlier games
+    '''
+    # toi_seconds stays in seconds, the unit of icetime in the master tables the simulator scores
+    metrics = game_logs.reindex(columns=list(log_metric_map)).fillna(0).astype(float)
+    players = game_logs['playerId']
+    n_prior = players.groupby(players).cumcount().to_numpy()
+    prior_sums = metrics.groupby(players.to_numpy()).cumsum().to_numpy() - metrics.to_numpy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = prior_sums / n_prior[:, None]
+    means[n_prior < min_prior_games] = np.nan
+    form = game_logs.assign(n_prior=n_prior)
+    return form.assign(**dict(zip(form_columns, means.T)))
+
+def backtest_rows(min_prior_games=5, game_logs=None, partials=None):
+    '''
+    This function lines up every skater game for the backtest: the season, the player's
+    team that season and their form going into the game.
+
+    The game logs do not say which team a player was on, so it comes from the MoneyPuck
+    season totals; players missing there keep a blank team and are left out later.
+
+    Inputs:
+        min_prior_games: passed to prior_form
+        game_logs: table from load_game_logs, loaded when None
+        partials: dict of season -> totals from season_partials('skaters'), loaded when None
+    Outputs:
+        rows: dataframe with one row per skater game
+    '''
+    if game_logs is None:
+        game_logs = load_game_logs(game_log_folders)
+    if partials is None:
+        partials, _ = season_partials('skaters')
+    skaters = game_logs[game_logs['group'] != 'G'].reset_index(drop=True)
+    rows = prior_form(skaters, min_prior_games)
+    rows = rows.assign(season=nhl_season(rows['gameDate']),
+                       opp=rows['opponentAbbrev'].astype(str).replace(team_fixes),
+                       group=rows['group'].astype(str), homeRoadFlag=rows['homeRoadFlag'].astype(str))
+
+    totals = pd.concat(partials.values(), ignore_index=True)[['playerId', 'season', 'team']]
+    totals = totals.assign(team=totals['team'].astype(str).replace(team_fixes), season=totals['season'].astype('int16'))
+    totals = totals.drop_duplicates(['playerId', 'season'])
+    rows = rows.merge(totals, on=['playerId', 'season'], how='left')
+    return rows[['season'] + side_key + ['team', 'playerId', 'group', 'gameWinningGoals', 'n_prior'] + form_columns]
+
+def season_games(rows, weights, composition=team_composition, min_skaters=3):
+    '''
+    This function turns one season of skater games into scored head-to-head games.
+
+    Each side of a game is the team most of its logged players were on. The side dresses
+    its top composition[pos] players of each position by their average ice time going into
+    the game, and they are scored on that same form; nothing from the graded game is used.
+    Logs only cover the tracked players, so a side may be short: its strength is the mean
+    player score scaled up to a full lineup. The winner is the side whose player logged the
+    game-winning goal; games where no logged player scored it are left out.
+
+    Inputs:
+        rows: one season from backtest_rows
+        weights: loadings of the logged metrics, in log_metric_map order
+        composition: dict of position group -> players dressed, e.g. {'F': 3, 'D': 2}
+        min_skaters: fewest scored players a side needs for its game to count
+    Outputs:
+        games: dataframe with one row per game: gameDate, home, road, their strengths and
+               players scored, and home_win
+    '''
+    rows = rows.dropna(subset=['team'])
+    counts = rows.groupby(side_key + ['team']).size().rename('players').reset_index()
+    sides = counts.sort_values('players', kind='stable').drop_duplicates(side_key, keep='last')
+    sides = sides.drop(columns='players').rename(columns={'team': 'side_team'})
+    rows = rows.merge(sides, on=side_key)
+    rows = rows[rows['team'] == rows['side_team']]
+    gwg = rows.groupby(side_key)['gameWinningGoals'].sum().rename('gwg')
+
+    # The night's lineup: most ice time before the game first within each side and position
+    dressed = rows.dropna(subset=form_columns).sort_values('prior_toi_seconds', ascending=False, kind='stable')
+    slot = dressed.groupby(side_key + ['group']).cumcount().to_numpy()
+    limit = dressed['group'].map(composition).fillna(0).to_numpy()
+    dressed = dressed[slot < limit]
+    dressed = dressed.assign(score=dressed[form_columns].to_numpy() @ weights)
+    lineup_size = sum(composition.values())
+    strength = dressed.groupby(side_key + ['side_team'])['score'].agg(['mean', 'size'])
+    strength = strength.assign(strength=strength['mean'] * lineup_size).rename(columns={'size': 'skaters'})
+    strength = strength.drop(columns='mean').join(gwg, on=side_key).reset_index()
+
+    home = strength[strength['homeRoadFlag'] == 'H'].drop(columns='homeRoadFlag')
+    road = strength[strength['homeRoadFlag'] == 'R'].drop(columns='homeRoadFlag')
+    games = home.merge(road, left_on=['gameDate', 'side_team', 'opp'], right_on=['gameDate', 'opp', 'side_team'],
+                       suffixes=('_home', '_road'))
+    games = games[(games['skaters_home'] >= min_skaters) & (games['skaters_road'] >= min_skaters)]
+    decided = (games['gwg_home'] > 0) != (games['gwg_road'] > 0)
+    games = games[decided]
+    return pd.DataFrame({
+        'gameDate': games['gameDate'].to_numpy(),
+        'home': games['side_team_home'].to_numpy(),
+        'road': games['side_team_road'].to_numpy(),
+        'strength_home': games['strength_home'].to_numpy(),
+        'strength_road': games['strength_road'].to_numpy(),
+        'skaters_home': games['skaters_home'].to_numpy(),
+        'skaters_road': games['skaters_road'].to_numpy(),
+        'home_win': (games['gwg_home'] > 0).to_numpy(),
+    }).sort_values(['gameDate', 'home'], kind='stable').reset_index(drop=True)
+
+def _season_task(task):
+    return season_games(*task)
+
+def _rows_hash(rows, options):
+    # What one season's results depend on besides the loadings
+    sha1 = hashlib.sha1(pd.util.hash_pandas_object(rows, index=False).to_numpy().tobytes())
+    sha1.update(repr(options).encode())
+    return sha1.hexdigest()[:16]
+
+def _read_manifest(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def _write_manifest(manifest, path):
+    def write(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=1)
+    write_atomic(write, path)
+
+@timed('backtest')
+def run_backtest(loadings, loadings_version, rows=None, composition=team_composition, min_skaters=3,
+                 min_prior_games=5, n_workers=None, folder=backtest_cache_folder, use_cache=True):
+    '''
+    This function scores every historical game the logs can rebuild, one season per task.
+
+    Results are kept per loadings version and season. A rerun only recomputes the seasons
+    whose game logs changed, and a new loadings file starts a fresh folder.
+
+    Inputs:
+        loadings: dict from load_feature_loadings
+        loadings_version: name for this set of loadings, e.g. the loadings file's content hash
+        rows: table from backtest_rows, built when None
+        composition: dict of position group -> players dressed
+        min_skaters: fewest scored players a side needs for its game to count
+        min_prior_games: games a player needs behind them before their form counts
+        n_workers: processes to spread the seasons over, all cores when None
+        folder: where the per-season results are kept
+        use_cache: read and write the per-season results
+    Outputs:
+        games: dataframe from season_games for every season, with a season column
+        recomputed: list of the seasons that were not cached
+    '''
+    if rows is None:
+        rows = backtest_rows(min_prior_games)
+    weights = loadings_vector(loadings)[logged_positions]
+    options = (sorted(composition.items()), min_skaters, min_prior_games)
+    version_folder = os.path.join(folder, str(loadings_version)[:12])
+    manifest_path = os.path.join(version_folder, 'manifest.json')
+    manifest = _read_manifest(manifest_path) if use_cache else {}
+
+    seasons = sorted(rows['season'].unique().tolist())
+    by_season = dict(list(rows.groupby('season', sort=True)))
+    keys = {season: _rows_hash(by_season[season], options) for season in seasons}
+    results = {}
+    for season in seasons:
+        path = os.path.join(version_folder, f'season_{season}{snapshot_extension}')
+        if manifest.get(str(season)) == keys[season] and os.path.exists(path):
+            results[season] = read_snapshot(path)
+    recomputed = [season for season in seasons if season not in results]
+
+    tasks = [(by_season[season], weights, composition, min_skaters) for season in recomputed]
+    n_workers = min(n_workers or os.cpu_count() or 1, max(len(tasks), 1))
+    if n_workers == 1:
+        computed = [_season_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            computed = list(executor.map(_season_task, tasks))
+
+    if use_cache and recomputed:
+        os.makedirs(version_folder, exist_ok=True)
+    for season, games in zip(recomputed, computed):
+        results[season] = games
+        if use_cache:
+            write_snapshot(games, os.path.join(version_folder, f'season_{season}{snapshot_extension}'))
+            manifest[str(season)] = keys[season]
+    if use_cache and recomputed:
+        _write_manifest(manifest, manifest_path)
+
+    games = pd.concat([results[season].assign(season=season) for season in seasons], ignore_index=True)
+    return games, recomputed
+
+def fit_win_curve(diff, home_win, iterations=25):
+    '''
+    This function fits P(home win) = 1 / (1 + exp(-(a + b * diff))) by Newton's method,
+    turning a strength gap into a probability; a is the home edge.
+
+    Inputs:
+        diff: numpy array of home minus road strength
+        home_win: numpy bool array of outcomes
+        iterations: Newton steps
+    Outputs:
+        coefficients: numpy array [a, b]
+    '''
+    X = np.column_stack([np.ones(len(diff)), diff])
+    y = home_win.astype(float)
+    coefficients = np.zeros(2)
+    for _ in range(iterations):
+        p = 1 / (1 + np.exp(-X @ coefficients))
+        hessian = X.T @ (X * (p * (1 - p))[:, None]) + 1e-9 * np.eye(2)
+        coefficients -= np.linalg.solve(hessian, X.T @ (p - y))
+    return coefficients
+
+def date_folds(dates, n_folds=5):
+    '''
+    This function cuts the games into contiguous blocks of dates with about the same
+    number of games in each; no date is split across two blocks.
+
+    Inputs:
+        dates: numpy datetime array of game dates
+        n_folds: number of blocks
+    Outputs:
+        folds: numpy int array with the block of each game, 0 for the earliest
+    '''
+    unique_dates, counts = np.unique(dates, return_counts=True)
+    # Each date goes to the block its first game falls in when the games are laid out in date order
+    first_game = np.cumsum(counts) - counts
+    block = np.minimum(first_game * n_folds // max(len(dates), 1), n_folds - 1)
+    return block[np.searchsorted(unique_dates, dates)]
+
+def backtest_metrics(games, n_bins=10, n_folds=5, min_train_games=200):
+    '''
+    This function reports how well the strength gap picked the winners.
+
+    The games are cut into date blocks, and each block is graded on a win curve fitted on
+    every earlier game, so no game is graded on a curve that saw its own or later results.
+    Blocks with fewer than min_train_games earlier games are left out. When no block has
+    enough games behind it, every game is graded in-sample and a warning is raised.
+
+    Inputs:
+        games: dataframe from run_backtest
+        n_bins: probability bins in the calibration table
+        n_folds: date blocks, see date_folds
+        min_train_games: fewest earlier games a block's win curve is fitted on
+    Outputs:
+        summary: dict with games, graded, in_sample, accuracy, home_win_rate, brier,
+                 baseline_brier and log_loss over the graded games
+        calibration: dataframe with one row per bin: games, mean predicted and observed home wins
+        by_season: dataframe with games, accuracy and brier per season
+    '''
+    diff = (games['strength_home'] - games['strength_road']).to_numpy()
+    # Strengths are sums of loadings-weighted stats; scale the gap so the fit is well conditioned
+    diff = diff / (diff.std() or 1.0)
+    home_win = games['home_win'].to_numpy()
+    seasons = games['season'].to_numpy()
+    folds = date_folds(games['gameDate'].to_numpy(), n_folds)
+
+    p = np.full(len(games), np.nan)
+    # What a model blind to the strengths would say: the home win rate of the same training games
+    base_rate = np.full(len(games), np.nan)
+    for fold in range(1, n_folds):
+        train = folds < fold
+        if train.sum() < min_train_games:
+            continue
+        a, b = fit_win_curve(diff[train], home_win[train])
+        held_out = folds == fold
+        p[held_out] = 1 / (1 + np.exp(-(a + b * diff[held_out])))
+        base_rate[held_out] = home_win[train].mean()
+    graded = ~np.isnan(p)
+    in_sample = not graded.any()
+    if in_sample:
+        warnings.warn(f'no date block has {min_train_games} earlier games to fit on; grading in-sample')
+        a, b = fit_win_curve(diff, home_win)
+        p = 1 / (1 + np.exp(-(a + b * diff)))
+        base_rate = np.full(len(games), home_win.mean())
+        graded = np.ones(len(games), dtype=bool)
+
+    diff, home_win, seasons, p, base_rate = diff[graded], home_win[graded], seasons[graded], p[graded], base_rate[graded]
+    y = home_win.astype(float)
+    correct = (diff > 0) == home_win
+    p_clipped = np.clip(p, 1e-6, 1 - 1e-6)
+    summary = {
+        'games': len(games),
+        'graded': len(y),
+        'in_sample': in_sample,
+        'accuracy': correct[diff != 0].mean(),
+        'home_win_rate': y.mean(),
+        'brier': np.mean((p - y) ** 2),
+        'baseline_brier': np.mean((base_rate - y) ** 2),
+        'log_loss': -np.mean(y * np.log(p_clipped) + (1 - y) * np.log(1 - p_clipped)),
+    }
+
+    bins = np.minimum((p * n_bins).astype(int), n_bins - 1)
+    frame = pd.DataFrame({'bin': bins, 'predicted': p, 'observed': y})
+    calibration = frame.groupby('bin').agg(games=('observed', 'size'), predicted=('predicted', 'mean'),
+                                           observed=('observed', 'mean'))
+    calibration.index = [f'{b / n_bins:.1f}-{(b + 1) / n_bins:.1f}' for b in calibration.index]
+
+    frame = pd.DataFrame({'season': seasons, 'correct': correct, 'error': (p - y) ** 2})
+    by_season = frame.groupby('season').agg(games=('correct', 'size'), accuracy=('correct', 'mean'),
+                                            brier=('error', 'mean'))
+    return summary, calibration, by_season
+
+if __name__ == "__main__":
+    import time
+    import argparse
+    from game_simulator import load_feature_loadings
+
+    parser = argparse.ArgumentParser(description='Backtest the loadings on historical games rebuilt from the game logs')
+    parser.add_argument('--loadings', default=loadings_filepath)
+    parser.add_argument('--min-skaters', type=int, default=3, help='scored players each side needs')
+    parser.add_argument('--min-prior-games', type=int, default=5, help='games behind a player before they count')
+    parser.add_argument('--folds', type=int, default=5, help='date blocks the win curve is graded on')
+    parser.add_argument('--min-train-games', type=int, default=200, help='fewest earlier games a block is fitted on')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--no-cache', action='store_true')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    games, recomputed = run_backtest(load_feature_loadings(args.loadings), content_hash(args.loadings),
+                                     min_skaters=args.min_skaters, min_prior_games=args.min_prior_games,
+                                     n_workers=args.workers, use_cache=not args.no_cache)
+    elapsed = time.perf_counter() - start
+    summary, calibration, by_season = backtest_metrics(games, n_folds=args.folds, min_train_games=args.min_train_games)
+
+    print(by_season.round(3).to_string())
+    print('\nCalibration (home win probability):')
+    print(calibration.round(3).to_string())
+    print(f"\n{summary['games']:,} games, {summary['graded']:,} graded {'in' if summary['in_sample'] else 'out of'} sample: accuracy {summary['accuracy']:.3f}, home wins {summary['home_win_rate']:.3f}, "
+          f"Brier {summary['brier']:.4f} (baseline {summary['baseline_brier']:.4f}), log loss {summary['log_loss']:.4f}")
+    print(f"{len(recomputed)} seasons recomputed in {elapsed:.2f}s")
@@ -0,0 +1,168 @@
+import os
+import json
+import hashlib
+import threading
+
+import pandas as pd
+
+from instrumentation import timed, count
+from table_schema import apply_schema, schema_hash
+
+try:
+    import pyarrow  # noqa: F401
+    snapshot_format = 'parquet'
+except ImportError:
+    snapshot_format = 'pickle'
+
+snapshot_extension = '.parquet' if snapshot_format == 'parquet' else '.pkl'
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+cache_folder = os.path.join(project_root, 'files', 'cache')
+
+# Tables already loaded in this process, keyed by (path, read options)
+_tables = {}
+_lock = threading.Lock()
+
+def file_signature(filepath):
+    '''
+    This function returns a cheap fingerprint of a file: size and modification time.
+
+    Inputs:
+        filepath: file to fingerprint
+    Outputs:
+        signature: [size in bytes, mtime in nanoseconds]
+    '''
+    stat = os.stat(filepath)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def content_hash(filepath, block_size=1 << 20):
+    '''
+    This function hashes a file's bytes, so a touched but unchanged file is not rebuilt.
+
+    Inputs:
+        filepath: file to hash
+        block_size: bytes read per step
+    Outputs:
+        digest: sha1 hex digest
+    '''
+    sha1 = hashlib.sha1()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+def _snapshot_paths(filepath, options, folder):
+    key = hashlib.sha1(f'{os.path.abspath(filepath)}|{options}'.encode()).hexdigest()[:12]
+    stem = f"{os.path.splitext(os.path.basename(filepath))[0]}_{key}"
+    return os.path.join(folder, stem + snapshot_extension), os.path.join(folder, stem + '.json')
+
+def write_atomic(write, path):
+    # Write to a temp file first so readers never see a half-written file
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+def _write_manifest(manifest, path):
+    def write(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+    write_atomic(write, path)
+
+def read_snapshot(path):
+    return pd.read_parquet(path) if snapshot_format == 'parquet' else pd.read_pickle(path)
+
+def write_snapshot(df, path):
+    if snapshot_format == 'parquet':
+        write_atomic(lambda tmp: df.to_parquet(tmp), path)
+    else:
+        write_atomic(lambda tmp: df.to_pickle(tmp), path)
+
+def _load_or_build(filepath, options, read_csv_kwargs, folder, schema=None):
+    snapshot_path, manifest_path = _snapshot_paths(filepath, options, folder)
+    signature = file_signature(filepath)
+
+    manifest = None
+    if os.path.exists(manifest_path) and os.path.exists(snapshot_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    if manifest is not None and manifest['format'] == snapshot_format:
+        if manifest['signature'] == signature:
+            return read_snapshot(snapshot_path)
+        # Touched but not edited: keep the snapshot and just remember the new mtime
+        digest = content_hash(filepath)
+        if manifest['hash'] == digest:
+            manifest['signature'] = signature
+            _write_manifest(manifest, manifest_path)
+            return read_snapshot(snapshot_path)
+    else:
+        digest = content_hash(filepath)
+
+    df = pd.read_csv(filepath, **read_csv_kwargs)
+    report = None
+    if schema is not None:
+        df, report = apply_schema(df, schema)
+    os.makedirs(folder, exist_ok=True)
+    write_snapshot(df, snapshot_path)
+    manifest = {'source': os.path.abspath(filepath), 'signature': signature, 'hash': digest,
+                'format': snapshot_format, 'schema': report}
+    _write_manifest(manifest, manifest_path)
+    return df
+
+@timed('data load')
+def load_table(filepath, folder=cache_folder, schema=None, **read_csv_kwargs):
+    '''
+    This function loads a csv through a process-wide cache backed by an on-disk snapshot.
+
+    The first call in a process reads the snapshot (Parquet when pyarrow is installed,
+    pickle otherwise), building it from the csv if the csv changed since the snapshot was
+    written. Later calls only stat the csv and hand back the same dataframe, so treat the
+    result as read-only and .copy() before editing it.
+
+    Inputs:
+        filepath: csv to load
+        folder: where snapshots and their manifests are kept
+        schema: key of table_schema.schemas; the table is checked, stripped of junk
+                columns and downcast before the snapshot is written
+        read_csv_kwargs: passed to pd.read_csv when the snapshot is (re)built
+    Outputs:
+        df: the table
+    '''
+    # The schema's definition is part of the key, so editing it rebuilds the snapshot
+    options = repr(sorted(read_csv_kwargs.items())) + (f'|{schema}:{schema_hash(schema)}' if schema else '')
+    key = (os.path.abspath(filepath), options)
+    signature = file_signature(filepath)
+
+    cached = _tables.get(key)
+    if cached is not None and cached[0] == signature:
+        count('data load cache hits')
+        return cached[1]
+
+    with _lock:
+        cached = _tables.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        df = _load_or_build(filepath, options, read_csv_kwargs, folder, schema)
+        _tables[key] = (signature, df)
+        return df
+
+def loaded_memory():
+    '''
+    This function reports what the tables held by this process cost in memory.
+
+    Outputs:
+        table: dataframe with path, rows, columns and MB per loaded table
+    '''
+    with _lock:
+        items = list(_tables.items())
+    return pd.DataFrame({
+        'path': [path for (path, _), _ in items],
+        'rows': [len(df) for _, (_, df) in items],
+        'columns': [df.shape[1] for _, (_, df) in items],
+        'mb': [df.memory_usage(deep=True).sum() / 1e6 for _, (_, df) in items],
+    })
+
+def clear_cache():
+    # Drop the in-process copies; snapshots on disk are kept
+    with _lock:
+        _tables.clear()
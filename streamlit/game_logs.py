@@ -0,0 +1,216 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from data_store import project_root, cache_folder, snapshot_extension, read_snapshot, write_snapshot, write_atomic
+
+# Folder -> position group for the per-player NHL API game logs
+game_log_folders = {
+    os.path.join(project_root, 'files', 'nhlapiforwards'): 'F',
+    os.path.join(project_root, 'files', 'nhlapidefence'): 'D',
+    os.path.join(project_root, 'files', 'nhlapigoalies'): 'G',
+}
+game_logs_cache_folder = os.path.join(cache_folder, 'game_logs')
+
+player_file_pattern = re.compile(r'^player_(\d+)\.csv$')
+
+count_columns = ['goals', 'assists', 'points', 'plusMinus', 'powerPlayGoals', 'powerPlayPoints',
+                 'gameWinningGoals', 'otGoals', 'shots', 'shifts', 'pim']
+
+# Tables already loaded in this process, keyed by folder set
+_tables = {}
+_lock = threading.Lock()
+
+def toi_to_seconds(toi):
+    '''
+    This function converts "mm:ss" time-on-ice strings to seconds.
+
+    Inputs:
+        toi: series of "mm:ss" strings
+    Outputs:
+        seconds: int32 series, 0 where the value is missing or could not be parsed
+    '''
+    parts = toi.astype(str).str.split(':', n=1, expand=True).reindex(columns=[0, 1])
+    minutes = pd.to_numeric(parts[0], errors='coerce')
+    seconds = pd.to_numeric(parts[1], errors='coerce')
+    return (minutes * 60 + seconds).fillna(0).astype('int32')
+
+def list_game_log_files(folders=game_log_folders):
+    '''
+    This function lists every player_<id>.csv in the game-log folders.
+
+    Inputs:
+        folders: dict of folder -> position group
+    Outputs:
+        files: list of (filepath, playerId, group)
+    '''
+    files = []
+    for folder, group in folders.items():
+        for filename in sorted(os.listdir(folder)):
+            match = player_file_pattern.match(filename)
+            if match:
+                files.append((os.path.join(folder, filename), int(match.group(1)), group))
+    return files
+
+def folder_signature(files):
+    # Hash of every file's name, size and mtime; any added, removed or edited log changes it
+    sha1 = hashlib.sha1()
+    for filepath, _, _ in files:
+        stat = os.stat(filepath)
+        sha1.update(f'{filepath}|{stat.st_size}|{stat.st_mtime_ns}\n'.encode())
+    return sha1.hexdigest()
+
+def _read_one(args):
+    filepath, player_id, group = args
+    try:
+        df = pd.read_csv(filepath)
+    except pd.errors.EmptyDataError:
+        return None
+    if df.empty:
+        return None
+    df = df.drop(columns=[column for column in df.columns if column.startswith('Unnamed')])
+    df['playerId'] = player_id
+    df['group'] = group
+    return df
+
+def read_game_logs(files, n_workers=None, use_processes=False):
+    '''
+    This function reads the per-player files with a pool and stacks them into one table.
+
+    Inputs:
+        files: list from list_game_log_files
+        n_workers: pool size, None for the executor default
+        use_processes: use a process pool instead of threads
+    Outputs:
+        game_logs: dataframe with one row per (playerId, gameDate), sorted by playerId then
+                   gameDate, with toi_seconds as int32 seconds and compact dtypes
+    '''
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with executor_class(max_workers=n_workers) as executor:
+        frames = [df for df in executor.map(_read_one, files, chunksize=64 if use_processes else 1)
+                  if df is not None]
+
+    # Stack files that share a header first; one concat over mismatched columns reindexes every frame
+    groups = {}
+    for df in frames:
+        groups.setdefault(tuple(df.columns), []).append(df)
+    game_logs = pd.concat([pd.concat(group, ignore_index=True) for group in groups.values()],
+                          ignore_index=True)
+
+    # Vectorized clean-up over the stacked table, not per file
+    game_logs['gameDate'] = pd.to_datetime(game_logs['gameDate'])
+    if 'toi' in game_logs.columns:
+        game_logs['toi_seconds'] = toi_to_seconds(game_logs.pop('toi'))
+    for column in count_columns:
+        if column in game_logs.columns:
+            game_logs[column] = game_logs[column].fillna(0).astype('int16')
+    for column in ['group', 'homeRoadFlag', 'opponentAbbrev']:
+        if column in game_logs.columns:
+            game_logs[column] = game_logs[column].astype('category')
+    if 'gameId' in game_logs.columns:
+        game_logs['gameId'] = game_logs['gameId'].astype('Int64')
+    game_logs['playerId'] = game_logs['playerId'].astype('int32')
+
+    return game_logs.sort_values(['playerId', 'gameDate'], kind='stable').reset_index(drop=True)
+
+def load_game_logs(folders=game_log_folders, folder=game_logs_cache_folder, n_workers=None, rebuild=False):
+    '''
+    This function returns the consolidated game-log table. It is rebuilt from the per-player
+    files only when one of them was added, removed or modified since the cached copy was
+    written; otherwise the cached file (or this process's copy) is used.
+
+    Inputs:
+        folders: dict of folder -> position group
+        folder: where the consolidated cache is kept
+        n_workers: pool size for a rebuild
+        rebuild: ignore any cached copy
+    Outputs:
+        game_logs: dataframe from read_game_logs; treat it as read-only
+    '''
+    key = tuple(sorted(folders.items()))
+    files = list_game_log_files(folders)
+    signature = folder_signature(files)
+
+    with _lock:
+        cached = _tables.get(key)
+        if cached is not None and cached[0] == signature and not rebuild:
+            return cached[1]
+
+        name = hashlib.sha1(repr(key).encode()).hexdigest()[:12]
+        snapshot_path = os.path.join(folder, f'game_logs_{name}{snapshot_extension}')
+        manifest_path = os.path.join(folder, f'game_logs_{name}.json')
+
+        game_logs = None
+        if not rebuild and os.path.exists(manifest_path) and os.path.exists(snapshot_path):
+            with open(manifest_path) as f:
+                if json.load(f).get('signature') == signature:
+                    game_logs = read_snapshot(snapshot_path)
+
+        if game_logs is None:
+            game_logs = read_game_logs(files, n_workers)
+            os.makedirs(folder, exist_ok=True)
+            write_snapshot(game_logs, snapshot_path)
+
+            def write_manifest(tmp_path):
+                with open(tmp_path, 'w') as f:
+                    json.dump({'signature': signature, 'files': len(files)}, f)
+            write_atomic(write_manifest, manifest_path)
+
+        _tables[key] = (signature, game_logs)
+        return game_logs
+
+def player_games(game_logs, player_id):
+    '''
+    This function slices one player's games out of the sorted table without a full scan.
+
+    Inputs:
+        game_logs: dataframe from load_game_logs
+        player_id: NHL playerId
+    Outputs:
+        games: dataframe of that player's games, empty if there are none
+    '''
+    player_ids = game_logs['playerId'].to_numpy()
+    start, end = np.searchsorted(player_ids, [player_id, player_id + 1])
+    return game_logs.iloc[start:end]
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Consolidate the NHL API game logs and time cold/warm loads')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    files = list_game_log_files()
+
+    start = time.perf_counter()
+    for filepath, player_id, group in files:
+        _read_one((filepath, player_id, group))
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    game_logs = load_game_logs(n_workers=args.workers, rebuild=True)
+    cold = time.perf_counter() - start
+
+    _tables.clear()
+    start = time.perf_counter()
+    load_game_logs()
+    warm_disk = time.perf_counter() - start
+
+    start = time.perf_counter()
+    load_game_logs()
+    warm_memory = time.perf_counter() - start
+
+    print(f"{len(files)} files, {len(game_logs):,} games, "
+          f"{game_logs.memory_usage(deep=True).sum() / 1e6:.1f} MB in memory")
+    print(f"Sequential read of every file:  {sequential:.2f}s")
+    print(f"Cold load (thread pool + cache write): {cold:.2f}s")
+    print(f"Warm load from cache file:      {warm_disk:.3f}s")
+    print(f"Warm load in the same process:  {warm_memory:.4f}s")
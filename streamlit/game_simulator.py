@@ -1,7 +1,7 @@
+import numpy as np
 import pandas as pd
-from sklearn.decomposition import PCA
-from sklearn.preprocessing import StandardScaler
 import os
+from instrumentation import timed, stage
 
 
 feature_weights = {
@@ -35,7 +35,9 @@ performance_metrics = [
 ]
 
 def preprocess_player_data(df):
-    
+    # sklearn is imported on first use; scoring only needs numpy
+    from sklearn.preprocessing import StandardScaler
+
     scaler = StandardScaler()
     scaled_df = pd.DataFrame(scaler.fit_transform(df[performance_metrics]), columns=performance_metrics)
     scaled_df['name'] = df['name'].values
@@ -43,8 +45,11 @@ def preprocess_player_data(df):
     scaled_df['salary'] = df['salary'].values
     return scaled_df, scaler
 
+@timed('preprocess/pca')
 def generate_feature_loadings(df, features, filepath):
-    
+    from sklearn.decomposition import PCA
+    from sklearn.preprocessing import StandardScaler
+
     # Create a copy so you don't modify the original data
     weighted_df = df.copy()
     # Apply the weights: Multiply each performance_metrics column by its weight
@@ -74,57 +79,92 @@ def load_feature_loadings(filepath):
     loadings_dict = dict(zip(loadings_df['performance_metrics'], loadings_df['loading']))
     return loadings_dict
 
+def loadings_vector(loadings, metrics=performance_metrics):
+    '''
+    This function lines the loadings dict up against a list of metrics.
+
+    Inputs:
+        loadings: dict of metric -> loading, as returned by load_feature_loadings
+        metrics: list of metric names giving the column order
+    Outputs:
+        weights: numpy array of shape (n_metrics,), 0 for metrics without a loading
+    '''
+    return np.array([loadings.get(metric, 0.0) for metric in metrics], dtype=float)
+
+def team_matrix(team_df, metrics=performance_metrics):
+    '''
+    This function pulls the metric columns of a team out as a float matrix.
+
+    Inputs:
+        team_df: dataframe with one row per player
+        metrics: list of metric names giving the column order
+    Outputs:
+        X: numpy array of shape (n_players, n_metrics), 0 for missing columns
+    '''
+    # Missing columns score 0, same as skipping them in the old per-row lookup
+    return team_df.reindex(columns=metrics, fill_value=0).to_numpy(dtype=float)
+
+def score_matrix(X, weights):
+    '''
+    This function scores a whole batch of players at once.
+
+    Inputs:
+        X: array of shape (n_players, n_metrics)
+        weights: array of shape (n_metrics,) from loadings_vector
+    Outputs:
+        scores: array of shape (n_players,) with the loadings-weighted score per player
+        contributions: array of shape (n_players, n_metrics) with each metric's share of the score
+    '''
+    X = np.asarray(X, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    contributions = X * weights
+    scores = X @ weights
+    return scores, contributions
+
 def compute_player_scores(team_df, loadings):
-    player_scores = {}
-    for index, player in team_df.iterrows():
-        score = 0
-        for performance_metrics, weight in loadings.items():
-            if performance_metrics in player:
-                score += player[performance_metrics] * weight
-        player_scores[player['name']] = score
-    return player_scores
+    metrics = list(loadings)
+    scores, _ = score_matrix(team_matrix(team_df, metrics), loadings_vector(loadings, metrics))
+    return dict(zip(team_df['name'], scores))
 
 def compute_individual_contributions(team_df, loadings, metrics):
-    contributions = {metric: {} for metric in metrics}
-    for index, player in team_df.iterrows():
-        for metric in metrics:
-            if metric in player:
-                contributions[metric][player['name']] = player[metric] * loadings[metric]
-    return contributions
-
-def simulate_game(user_team_filepath, ai_team_filepath, loadings_filepath, scaling_factor=1000):
-    # Load the performance_metrics loadings
-    loadings_dict = load_feature_loadings(loadings_filepath)
-
-    # Load user and AI teams
-    user_team = pd.read_csv(user_team_filepath)
-    ai_team = pd.read_csv(ai_team_filepath)
-
-    # Debug: Print the loaded teams
-    print("User Team Data:")
-    print(user_team)
-    print("AI Team Data:")
-    print(ai_team)
-
-    # Compute the scores
-    user_player_scores = compute_player_scores(user_team, loadings_dict)
-    ai_player_scores = compute_player_scores(ai_team, loadings_dict)
-
-    # Debug: Print the computed player scores
-    print("User Player Scores:")
-    print(user_player_scores)
-    print("AI Player Scores:")
-    print(ai_player_scores)
-
-    # Compute individual contributions for all metrics
-    user_contributions = compute_individual_contributions(user_team, loadings_dict, performance_metrics)
-    ai_contributions = compute_individual_contributions(ai_team, loadings_dict, performance_metrics)
-
-    # Debug: Print the computed contributions
-    print("User Contributions:")
-    print(user_contributions)
-    print("AI Contributions:")
-    print(ai_contributions)
+    present = [metric for metric in metrics if metric in team_df.columns]
+    _, contributions = score_matrix(team_matrix(team_df, present), loadings_vector(loadings, present))
+    by_metric = {metric: dict(zip(team_df['name'], contributions[:, i])) for i, metric in enumerate(present)}
+    return {metric: by_metric.get(metric, {}) for metric in metrics}
+
+def contributions_to_dict(names, contributions, metrics=performance_metrics):
+    # Reshape a contributions matrix into the {metric: {name: value}} layout the app displays
+    return {metric: dict(zip(names, contributions[:, i])) for i, metric in enumerate(metrics)}
+
+@timed('scoring')
+def simulate_game_frames(user_team, ai_team, loadings, scaling_factor=1000):
+    '''
+    This function plays a game between two teams that are already in memory. Nothing is read
+    from or written to disk, so concurrent sessions can call it side by side.
+
+    Inputs:
+        user_team: dataframe with a 'name' column and the metric columns, or an
+                   (n_players, n_metrics) array in performance_metrics order
+        ai_team: same as user_team
+        loadings: dict from load_feature_loadings or a weights array from loadings_vector
+        scaling_factor: divisor applied to the summed team scores before rounding
+    Outputs:
+        final_user_score, final_ai_score, user_player_scores, ai_player_scores,
+        user_contributions, ai_contributions (same as simulate_game)
+    '''
+    weights = loadings_vector(loadings) if isinstance(loadings, dict) else np.asarray(loadings, dtype=float)
+
+    # Score both teams with one matrix product each
+    user_names, user_X = _team_names_and_matrix(user_team)
+    ai_names, ai_X = _team_names_and_matrix(ai_team)
+    user_scores, user_matrix = score_matrix(user_X, weights)
+    ai_scores, ai_matrix = score_matrix(ai_X, weights)
+    user_player_scores = dict(zip(user_names, user_scores))
+    ai_player_scores = dict(zip(ai_names, ai_scores))
+
+    # Per-metric contributions come out of the same product
+    user_contributions = contributions_to_dict(user_names, user_matrix)
+    ai_contributions = contributions_to_dict(ai_names, ai_matrix)
 
     # Sum the scores to get the team scores
     user_score = sum(user_player_scores.values())
@@ -147,28 +187,74 @@ def simulate_game(user_team_filepath, ai_team_filepath, loadings_filepath, scali
 
     return final_user_score, final_ai_score, user_player_scores, ai_player_scores, user_contributions, ai_contributions
 
-def create_results_table(user_player_scores, ai_player_scores, user_contributions, ai_contributions):
-    all_names = sorted(set(user_player_scores.keys()).union(ai_player_scores.keys()))
-    
-    # Create a DataFrame to hold the results
-    results_df = pd.DataFrame(columns=['Team', 'Score'] + performance_metrics)
-    
-     # Fill in the DataFrame with user team data
-    for name in user_player_scores.keys():
-        results_df.at[name, 'Team'] = 'User'
-        results_df.at[name, 'Score'] = user_player_scores[name]
-        for metric in performance_metrics:
-            results_df.at[name, metric] = user_contributions[metric].get(name, 0)
-    
-    # Fill in the DataFrame with AI team data
-    for name in ai_player_scores.keys():
-        results_df.at[name, 'Team'] = 'AI'
-        results_df.at[name, 'Score'] = ai_player_scores[name]
-        for metric in performance_metrics:
-            results_df.at[name, metric] = ai_contributions[metric].get(name, 0) 
-    
+def _team_names_and_matrix(team):
+    if isinstance(team, pd.DataFrame):
+        return list(team['name']), team_matrix(team)
+    X = np.atleast_2d(np.asarray(team, dtype=float))
+    return [f'Player {i + 1}' for i in range(len(X))], X
+
+def simulate_game(user_team_filepath, ai_team_filepath, loadings_filepath, scaling_factor=1000, verbose=False):
+    with stage('data load'):
+        # Load the performance_metrics loadings
+        loadings_dict = load_feature_loadings(loadings_filepath)
+
+        # Load user and AI teams
+        user_team = pd.read_csv(user_team_filepath)
+        ai_team = pd.read_csv(ai_team_filepath)
+
+    # Debug: Print the loaded teams (only when asked; printing whole frames is not free)
+    if verbose:
+        print("User Team Data:")
+        print(user_team)
+        print("AI Team Data:")
+        print(ai_team)
+
+    results = simulate_game_frames(user_team, ai_team, loadings_dict, scaling_factor)
+
+    # Debug: Print the computed player scores and contributions
+    if verbose:
+        print("User Player Scores:")
+        print(results[2])
+        print("AI Player Scores:")
+        print(results[3])
+        print("User Contributions:")
+        print(results[4])
+        print("AI Contributions:")
+        print(results[5])
+
+    return results
+
+def results_frame(names, scores, contributions, team, metrics=performance_metrics):
+    '''
+    This function builds the results rows for one team straight from the scoring arrays.
+
+    Inputs:
+        names: player names, one per row of contributions
+        scores: array of shape (n_players,) from score_matrix
+        contributions: array of shape (n_players, n_metrics) from score_matrix
+        team: label for the Team column ('User' or 'AI')
+        metrics: list of metric names giving the column order
+    Outputs:
+        results_df: dataframe indexed by player name with Team, Score and one column per metric
+    '''
+    results_df = pd.DataFrame(contributions, index=pd.Index(names), columns=metrics)
+    results_df.insert(0, 'Score', scores)
+    results_df.insert(0, 'Team', team)
     return results_df
 
+@timed('results table')
+def create_results_table(user_player_scores, ai_player_scores, user_contributions, ai_contributions):
+    frames = []
+    for team, player_scores, contributions in [('User', user_player_scores, user_contributions),
+                                               ('AI', ai_player_scores, ai_contributions)]:
+        names = list(player_scores.keys())
+        matrix = pd.DataFrame(contributions).reindex(index=names, columns=performance_metrics).fillna(0).to_numpy()
+        frames.append(results_frame(names, np.fromiter(player_scores.values(), dtype=float), matrix, team))
+
+    # A name on both teams keeps its AI row, as before
+    results_df = pd.concat(frames)
+    return results_df[~results_df.index.duplicated(keep='last')]
+
 
 if __name__ == "__main__":
     user_team_filepath = 'user_team.csv'
@@ -191,7 +277,7 @@ if __name__ == "__main__":
         
         generate_feature_loadings(players, features, loadings_filepath)
     
-    final_user_score, final_ai_score, user_player_scores, ai_player_scores, user_contributions, ai_contributions = simulate_game(user_team_filepath, ai_team_filepath, loadings_filepath)
+    final_user_score, final_ai_score, user_player_scores, ai_player_scores, user_contributions, ai_contributions = simulate_game(user_team_filepath, ai_team_filepath, loadings_filepath, verbose=True)
     print(f"Team User: {final_user_score}")
     print(f"Team AI: {final_ai_score}")
 
@@ -0,0 +1,253 @@
+import io
+import os
+import json
+import time
+import uuid
+import pstats
+import cProfile
+import functools
+import threading
+import tracemalloc
+import contextlib
+from datetime import datetime, timezone
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Off unless NHL_INSTRUMENTATION=1; when off every stage() is a shared no-op
+enabled = os.environ.get('NHL_INSTRUMENTATION', '') not in ('', '0')
+log_filepath = os.environ.get('NHL_INSTRUMENTATION_LOG',
+                              os.path.join(project_root, 'files', 'cache', 'timings.jsonl'))
+
+# Each Streamlit session reruns in its own thread, so every thread keeps its own run
+_local = threading.local()
+_log_lock = threading.Lock()
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_null_stage = _NullStage()
+
+class _Stage:
+    __slots__ = ('run', 'name', 'start')
+
+    def __init__(self, run, name):
+        self.run = run
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        calls, seconds = self.run.stages.get(self.name, (0, 0.0))
+        self.run.stages[self.name] = (calls + 1, seconds + elapsed)
+        return False
+
+class Run:
+    '''
+    Timings and counters for one rerun of the app (or one CLI request).
+    '''
+
+    def __init__(self, label):
+        self.label = label
+        self.run_id = uuid.uuid4().hex[:12]
+        self.started = datetime.now(timezone.utc).isoformat(timespec='milliseconds')
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self.profile = None
+        self.profile_mode = None
+
+    def record(self):
+        return {
+            'run_id': self.run_id,
+            'label': self.label,
+            'started': self.started,
+            'total_seconds': time.perf_counter() - self.start,
+            'stages': {name: {'calls': calls, 'seconds': seconds}
+                       for name, (calls, seconds) in self.stages.items()},
+            'counters': dict(self.counters),
+            'profile_mode': self.profile_mode,
+            'profile': self.profile,
+        }
+
+def set_enabled(flag):
+    global enabled
+    enabled = bool(flag)
+
+def current_run():
+    return getattr(_local, 'run', None)
+
+def stage(name):
+    '''
+    This function times a block of code as one named stage of the current run.
+
+    Inputs:
+        name: stage name, e.g. 'data load' or 'knn query'
+    Outputs:
+        context manager; a shared no-op when instrumentation is off or no run is active
+    '''
+    if not enabled:
+        return _null_stage
+    run = getattr(_local, 'run', None)
+    if run is None:
+        return _null_stage
+    return _Stage(run, name)
+
+def timed(name):
+    # Decorator form of stage(); the flag is checked on every call, not at import
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def count(name, n=1):
+    if not enabled:
+        return
+    run = getattr(_local, 'run', None)
+    if run is not None:
+        run.counters[name] = run.counters.get(name, 0) + n
+
+def start_run(label='app', profile=None):
+    '''
+    This function starts recording a new run on this thread.
+
+    Inputs:
+        label: what is being run, stored with the record
+        profile: None, 'cprofile' or 'tracemalloc' to also capture a profile of this run
+    Outputs:
+        run: the Run, or None when instrumentation is off
+    '''
+    if not enabled:
+        return None
+    # A rerun cut short by st.stop() never reached end_run; close it out first
+    if getattr(_local, 'run', None) is not None:
+        end_run()
+    run = Run(label)
+    _local.run = run
+    if profile == 'cprofile':
+        run.profile_mode = profile
+        _local.profiler = cProfile.Profile()
+        _local.profiler.enable()
+    elif profile == 'tracemalloc':
+        run.profile_mode = profile
+        tracemalloc.start()
+    return run
+
+def _stop_profile(run, top):
+    if run.profile_mode == 'cprofile':
+        profiler = _local.profiler
+        profiler.disable()
+        _local.profiler = None
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(top)
+        run.profile = output.getvalue()
+    elif run.profile_mode == 'tracemalloc':
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        lines = [f'current {current / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB']
+        lines += [str(statistic) for statistic in snapshot.statistics('lineno')[:top]]
+        run.profile = '\n'.join(lines)
+
+def end_run(write=True, top=30):
+    '''
+    This function finishes the current run and returns its timing breakdown.
+
+    Inputs:
+        write: append the record as one json line to log_filepath
+        top: rows of cProfile / tracemalloc output to keep
+    Outputs:
+        record: dict with run_id, label, total_seconds, stages, counters and any profile,
+                or None when no run was active
+    '''
+    run = getattr(_local, 'run', None)
+    if run is None:
+        return None
+    _local.run = None
+    _stop_profile(run, top)
+    record = run.record()
+    if write:
+        write_record(record)
+    return record
+
+def write_record(record, filepath=None):
+    filepath = filepath or log_filepath
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    with _log_lock, open(filepath, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+@contextlib.contextmanager
+def instrumented_run(label='request', profile=None, write=True):
+    # Context-manager form of start_run/end_run for scripts; yields the finished record holder
+    result = {}
+    start_run(label, profile)
+    try:
+        yield result
+    finally:
+        record = end_run(write)
+        if record is not None:
+            result.update(record)
+
+def render_panel(st, record):
+    '''
+    This function shows a run's timing breakdown in a collapsed panel of the app.
+
+    Inputs:
+        st: the streamlit module
+        record: dict from end_run
+    '''
+    if record is None:
+        return
+    import pandas as pd
+    with st.expander(f"Timings: {record['total_seconds'] * 1000:.0f} ms this rerun"):
+        stages = pd.DataFrame([{'stage': name, 'calls': value['calls'], 'ms': value['seconds'] * 1000}
+                               for name, value in record['stages'].items()])
+        if not stages.empty:
+            st.dataframe(stages.sort_values('ms', ascending=False), hide_index=True)
+        if record['counters']:
+            st.write(record['counters'])
+        if record['profile']:
+            st.text(record['profile'])
+
+def summarize(filepath=None):
+    '''
+    This function rolls the json-lines log up into per-stage latency percentiles.
+
+    Inputs:
+        filepath: log to read, defaults to log_filepath
+    Outputs:
+        summary: dataframe indexed by stage with runs, p50, p95 and max in milliseconds
+    '''
+    import pandas as pd
+    rows = []
+    with open(filepath or log_filepath) as f:
+        for line in f:
+            record = json.loads(line)
+            rows.append({'stage': 'total', 'ms': record['total_seconds'] * 1000})
+            rows += [{'stage': name, 'ms': value['seconds'] * 1000} for name, value in record['stages'].items()]
+    grouped = pd.DataFrame(rows).groupby('stage')['ms']
+    return pd.DataFrame({'runs': grouped.size(), 'p50': grouped.median(), 'p95': grouped.quantile(0.95),
+                         'max': grouped.max()}).sort_values('p50', ascending=False)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Summarize the per-rerun timing log')
+    parser.add_argument('--log', default=log_filepath)
+    args = parser.parse_args()
+
+    print(summarize(args.log).round(2).to_string())
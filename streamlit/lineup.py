@@ -0,0 +1,231 @@
+import numpy as np
+import pandas as pd
+
+from game_simulator import performance_metrics, loadings_vector
+from lineup_solver import salary_cap
+
+# Columns the app shows for a team
+display_columns = ['name', 'position', 'team', 'salary']
+
+class Lineup:
+    '''
+    A team held as row numbers into a shared PlayerRegistry, so a session stores a few ints
+    instead of its own copies of the player rows. Rows are only pulled out of the registry's
+    table when a frame is asked for.
+
+    The registry is held by reference; a lineup keeps reading the table it was built on
+    even after the csv changes and registry_for hands out a new one.
+    '''
+    __slots__ = ('registry', 'rows')
+
+    def __init__(self, registry, rows=()):
+        self.registry = registry
+        self.rows = [int(row) for row in rows]
+
+    @classmethod
+    def from_names(cls, registry, names):
+        # Unknown names are skipped, like PlayerRegistry.frame
+        return cls(registry, [registry.row_by_name[name] for name in names if name in registry.row_by_name])
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __bool__(self):
+        return bool(self.rows)
+
+    def __contains__(self, name):
+        row = self.registry.row_by_name.get(name)
+        return row is not None and row in self.rows
+
+    def __iter__(self):
+        return iter(self.names)
+
+    @property
+    def names(self):
+        names = self.registry.names
+        return [names[row] for row in self.rows]
+
+    def add(self, name):
+        '''
+        This function adds a player to the lineup.
+
+        Inputs:
+            name: player name from the registry
+        Outputs:
+            row: the player's row in the registry's table; KeyError for an unknown name
+        '''
+        row = self.registry.row_by_name[name]
+        if row not in self.rows:
+            self.rows.append(row)
+        return row
+
+    def remove(self, name):
+        row = self.registry.row_by_name.get(name)
+        if row in self.rows:
+            self.rows.remove(row)
+
+    def clear(self):
+        self.rows.clear()
+
+    def salary(self):
+        # Total salary of the lineup, read from the shared salary column
+        salaries = self.registry.column('salary')
+        return int(sum(salaries[row] for row in self.rows))
+
+    def count(self, position):
+        positions = self.registry.column('position')
+        return sum(1 for row in self.rows if positions[row] == position)
+
+    def frame(self, columns=None):
+        '''
+        This function returns the lineup's players as a dataframe, in the order they were added.
+
+        Inputs:
+            columns: columns to keep, all of them when None
+        Outputs:
+            players: positional take from the registry's table
+        '''
+        players = self.registry.players
+        if columns is None:
+            return players.iloc[self.rows]
+        return players.iloc[self.rows, [players.columns.get_loc(column) for column in columns]]
+
+    def display_frame(self):
+        # Name, position, team and salary, the columns the app shows for a team
+        available = [column for column in display_columns if column in self.registry.players.columns]
+        players = self.frame([column for column in available if column != 'position'])
+        players = players.assign(position=self.registry.column('position')[self.rows])
+        return players[[column for column in display_columns if column in players.columns]]
+
+class ScoredLineup(Lineup):
+    '''
+    A Lineup that keeps its loadings score and per-metric contributions as running totals.
+    Adding, removing or swapping a player moves one row of the registry's metric matrix in
+    or out, so the team is never rescored from its frame.
+
+    Scores are the same as simulate_game_frames: metric values times the loadings, summed.
+    '''
+    __slots__ = ('weights', 'contributions', 'score')
+
+    def __init__(self, registry, loadings, rows=()):
+        super().__init__(registry, rows)
+        self.weights = loadings_vector(loadings) if isinstance(loadings, dict) else np.asarray(loadings, dtype=float)
+        self.rescore()
+
+    @classmethod
+    def from_names(cls, registry, loadings, names):
+        return cls(registry, loadings, [registry.row_by_name[name] for name in names if name in registry.row_by_name])
+
+    def _metrics(self):
+        return self.registry.matrix(performance_metrics)
+
+    def _shift(self, row, sign):
+        # One player's contributions in or out of the totals: O(metrics)
+        self.contributions += sign * self._metrics()[row] * self.weights
+        self.score = float(self.contributions.sum())
+
+    def rescore(self):
+        # Totals from scratch, for a new lineup or to shed rounding after many updates
+        self.contributions = self._metrics()[self.rows].sum(axis=0) * self.weights
+        self.score = float(self.contributions.sum())
+
+    def add(self, name):
+        row = self.registry.row_by_name[name]
+        if row not in self.rows:
+            self.rows.append(row)
+            self._shift(row, 1)
+        return row
+
+    def remove(self, name):
+        row = self.registry.row_by_name.get(name)
+        if row in self.rows:
+            self.rows.remove(row)
+            self._shift(row, -1)
+
+    def clear(self):
+        self.rows.clear()
+        self.rescore()
+
+    def swap(self, out_name, in_name):
+        '''
+        This function replaces one player with another in the same slot.
+
+        Inputs:
+            out_name: player in the lineup
+            in_name: player from the registry who is not in the lineup
+        Outputs:
+            row: the incoming player's row; KeyError for an unknown name, ValueError when
+                 out_name is not in the lineup or in_name already is
+        '''
+        out_row = self.registry.row_by_name.get(out_name)
+        in_row = self.registry.row_by_name[in_name]
+        if out_row not in self.rows:
+            raise ValueError(f"{out_name} is not in the lineup")
+        if in_row in self.rows:
+            raise ValueError(f"{in_name} is already in the lineup")
+        self.rows[self.rows.index(out_row)] = in_row
+        self._shift(out_row, -1)
+        self._shift(in_row, 1)
+        return in_row
+
+    def metric_totals(self):
+        # Each metric's share of the team score
+        return pd.Series(self.contributions, index=performance_metrics)
+
+    def swap_table(self, remaining=None, candidates=None):
+        '''
+        This function finds the best replacement for every player in the lineup in one pass:
+        every (slot, candidate) pair is scored as a matrix, keeping the position and the cap.
+
+        Inputs:
+            remaining: cap left over, salary_cap minus the lineup's salary when None
+            candidates: boolean mask over the registry's rows of players allowed in, e.g.
+                        the teams playing tonight; everyone when None
+        Outputs:
+            swaps: dataframe with one row per slot that has a legal replacement: out, in,
+                   gain in score and salary_change, best gain first
+        '''
+        columns = ['out', 'in', 'gain', 'salary_change']
+        if not self.rows:
+            return pd.DataFrame(columns=columns)
+        remaining = salary_cap - self.salary() if remaining is None else remaining
+        scores = self._metrics() @ self.weights
+        salaries = self.registry.players['salary'].to_numpy(dtype=float, na_value=np.nan)
+        positions = self.registry.column('position')
+
+        rows = np.array(self.rows)
+        allowed = ~np.isnan(salaries) if candidates is None else np.asarray(candidates, dtype=bool) & ~np.isnan(salaries)
+        allowed[rows] = False
+        if not allowed.any():
+            return pd.DataFrame(columns=columns)
+        # (slots, candidates): same position, the salary change fits what is left of the cap
+        salary_change = salaries[None, allowed] - salaries[rows, None]
+        fits = (positions[None, allowed] == positions[rows, None]) & (salary_change <= remaining)
+        gains = np.where(fits, scores[None, allowed] - scores[rows, None], -np.inf)
+
+        best = gains.argmax(axis=1)
+        slots = np.flatnonzero(fits.any(axis=1))
+        incoming = np.flatnonzero(allowed)[best[slots]]
+        names = self.registry.names
+        swaps = pd.DataFrame({
+            'out': [names[row] for row in rows[slots]],
+            'in': [names[row] for row in incoming],
+            'gain': gains[slots, best[slots]],
+            'salary_change': salary_change[slots, best[slots]].astype(int),
+        })
+        return swaps.sort_values('gain', ascending=False, kind='stable').reset_index(drop=True)
+
+    def best_swap(self, remaining=None, candidates=None):
+        '''
+        This function picks the single swap that raises the score the most under the cap.
+
+        Inputs:
+            remaining: cap left over, salary_cap minus the lineup's salary when None
+            candidates: boolean mask over the registry's rows, as in swap_table
+        Outputs:
+            swap: dict with out, in, gain and salary_change, or None when no swap helps
+        '''
+        swaps = self.swap_table(remaining, candidates)
+        if swaps.empty or swaps['gain'].iloc[0] <= 0:
+            return None
+        return swaps.iloc[0].to_dict()
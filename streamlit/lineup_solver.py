@@ -0,0 +1,440 @@
+import heapq
+
+import numpy as np
+import pandas as pd
+
+from game_simulator import loadings_vector, team_matrix, score_matrix
+
+salary_cap = 30000000
+team_composition = {'F': 3, 'D': 2}
+
+# Function to keep only players that could appear in an optimal lineup
+def prune_dominated(salaries, scores, slots):
+    '''
+    This function drops players that at least `slots` other players of the same position
+    match or beat on both salary (cheaper or equal) and score (higher or equal). Such a
+    player can always be swapped for one of those not already in the lineup without
+    losing score or going over the cap, so the best lineup never needs them.
+
+    Inputs:
+        salaries: array of player salaries
+        scores: array of player scores
+        slots: number of lineup spots for this position
+    Outputs:
+        keep: sorted array of indices of the players that survive
+    '''
+    salaries = np.asarray(salaries)
+    scores = np.asarray(scores)
+    if slots <= 0:
+        return np.array([], dtype=int)
+
+    # Cheapest first, best first within a salary, so everyone before a player is at least as cheap
+    order = np.lexsort((-scores, salaries))
+    best_seen = []
+    keep = []
+    for i in order:
+        if len(best_seen) < slots or best_seen[0] < scores[i]:
+            keep.append(i)
+        if len(best_seen) < slots:
+            heapq.heappush(best_seen, scores[i])
+        elif best_seen[0] < scores[i]:
+            heapq.heapreplace(best_seen, scores[i])
+    return np.sort(np.array(keep, dtype=int))
+
+def _salary_units(salaries, cap, max_buckets, round_up=True):
+    # Exact when every salary is a multiple of one unit and the cap fits in max_buckets of them.
+    # Otherwise salaries go to a coarser unit: rounded up they can only ever be cautious, rounded
+    # down only ever optimistic, which makes them a bound for searches that check real salaries.
+    salaries = np.asarray(salaries, dtype=np.int64)
+    unit = int(np.gcd.reduce(np.append(salaries, np.int64(cap)))) or 1
+    exact = cap // unit <= max_buckets
+    if not exact:
+        unit = -(-cap // max_buckets)
+    costs = -(-salaries // unit) if round_up else salaries // unit
+    return costs.astype(int), int(cap // unit), exact
+
+def solve_lineup(salaries, scores, positions, composition=team_composition, cap=salary_cap, max_buckets=6000):
+    '''
+    This function finds the highest scoring lineup with exactly composition[pos] players
+    of each position whose salaries add up to no more than the cap. It is a 0/1 knapsack
+    DP over (forwards taken, defense taken, salary bucket), run on the pruned pools.
+
+    Inputs:
+        salaries: array of player salaries
+        scores: array of player scores
+        positions: array of 'F' / 'D' labels
+        composition: dict of position -> players needed
+        cap: salary cap
+        max_buckets: largest number of salary buckets the DP may use
+    Outputs:
+        chosen: array of indices of the chosen players, or None if no lineup fits
+        exact: True when salaries were bucketed without rounding; the lineup is the best
+               one under the real salaries either way
+    '''
+    salaries = np.asarray(salaries, dtype=np.int64)
+    scores = np.asarray(scores, dtype=float)
+    positions = np.asarray(positions)
+    need_f, need_d = composition.get('F', 0), composition.get('D', 0)
+
+    if not _salary_units(salaries, cap, max_buckets)[2]:
+        # Rounded-up buckets could rule out lineups that fit; search on the real salaries instead
+        lineups, exact = top_lineups(salaries, scores, positions, 1, composition, cap, max_buckets)
+        return (lineups[0][1] if lineups else None), exact
+
+    candidates = []
+    for position, slots in [('F', need_f), ('D', need_d)]:
+        idx = np.flatnonzero(positions == position)
+        candidates.append(idx[prune_dominated(salaries[idx], scores[idx], slots)])
+    candidates = np.concatenate(candidates)
+
+    costs, budget, exact = _salary_units(salaries[candidates], cap, max_buckets)
+
+    # dp[f, d, b]: best score using f forwards and d defense with cost at most b buckets
+    dp = np.full((need_f + 1, need_d + 1, budget + 1), -np.inf)
+    dp[0, 0, :] = 0.0
+    taken = []
+    for player, cost in zip(candidates, costs):
+        if cost > budget:
+            taken.append(None)
+            continue
+        if positions[player] == 'F':
+            if need_f == 0:
+                taken.append(None)
+                continue
+            new = dp[:-1, :, :budget + 1 - cost] + scores[player]
+            improved = new > dp[1:, :, cost:]
+            dp[1:, :, cost:] = np.where(improved, new, dp[1:, :, cost:])
+        else:
+            if need_d == 0:
+                taken.append(None)
+                continue
+            new = dp[:, :-1, :budget + 1 - cost] + scores[player]
+            improved = new > dp[:, 1:, cost:]
+            dp[:, 1:, cost:] = np.where(improved, new, dp[:, 1:, cost:])
+        taken.append(improved)
+
+    if not np.isfinite(dp[need_f, need_d, budget]):
+        return None, exact
+
+    # Walk the DP back from the full lineup to recover who was picked
+    chosen = []
+    f, d, b = need_f, need_d, budget
+    for player, cost, improved in reversed(list(zip(candidates, costs, taken))):
+        if improved is None:
+            continue
+        if positions[player] == 'F' and f > 0 and b >= cost and improved[f - 1, d, b - cost]:
+            chosen.append(player)
+            f, b = f - 1, b - cost
+        elif positions[player] == 'D' and d > 0 and b >= cost and improved[f, d - 1, b - cost]:
+            chosen.append(player)
+            d, b = d - 1, b - cost
+    return np.array(chosen[::-1], dtype=int), exact
+
+class _LineupSearch:
+    '''
+    Exact best-completion tables over the pruned pools, shared by the top-K and frontier
+    searches. Defense are laid out first and forwards after, each sorted best score first,
+    so a lineup is a path of take/skip decisions through that order.
+
+    When the salaries do not fit max_buckets exactly they are rounded down, so the tables
+    never underestimate what a budget can buy; the searches then check the real salaries
+    against the cap.
+    '''
+
+    def __init__(self, salaries, scores, positions, composition, cap, max_buckets, extra=0):
+        salaries = np.asarray(salaries, dtype=np.int64)
+        scores = np.asarray(scores, dtype=float)
+        positions = np.asarray(positions)
+        self.need_f, self.need_d = composition.get('F', 0), composition.get('D', 0)
+
+        # `extra` more survivors per position keep the runners-up lineups reachable
+        pools = []
+        for position, slots in [('D', self.need_d), ('F', self.need_f)]:
+            idx = np.flatnonzero(positions == position)
+            if slots > 0:
+                idx = idx[prune_dominated(salaries[idx], scores[idx], slots + extra)]
+                pools.append(idx[np.argsort(-scores[idx], kind='stable')])
+            else:
+                pools.append(idx[:0])
+        self.n_d = len(pools[0])
+        self.players = np.concatenate(pools)
+        self.salaries = salaries[self.players]
+        self.scores = scores[self.players]
+        self.cap = int(cap)
+        self.costs, self.budget, self.exact = _salary_units(self.salaries, cap, max_buckets, round_up=False)
+
+        # forward_best[i, n, b]: best score from exactly n of forwards i.. costing at most b buckets;
+        # defense_best is the same over defense, plus the best forwards the leftover budget buys
+        self.forward_best = self._suffix_best(self.n_d, len(self.players), self.need_f,
+                                              np.zeros(self.budget + 1))
+        self.defense_best = self._suffix_best(0, self.n_d, self.need_d, self.forward_best[0, self.need_f])
+
+    def _suffix_best(self, start, stop, need, base):
+        n_players = stop - start
+        best = np.full((n_players + 1, need + 1, self.budget + 1), -np.inf)
+        best[n_players, 0] = base
+        for i in range(n_players - 1, -1, -1):
+            best[i] = best[i + 1]
+            cost = self.costs[start + i]
+            if need > 0 and cost <= self.budget:
+                np.maximum(best[i, 1:, cost:], best[i + 1, :-1, :self.budget + 1 - cost] + self.scores[start + i],
+                           out=best[i, 1:, cost:])
+        return best
+
+    def bound(self, pos, n, b):
+        # Best score still to come from position pos with n of its position left and b buckets
+        if pos < self.n_d:
+            return self.defense_best[pos, n, b]
+        return self.forward_best[pos - self.n_d, n, b]
+
+    def advance(self, pos, n, b, take):
+        # Next (pos, n, b) after taking or skipping the player at pos, or None if that is impossible
+        if take:
+            cost = self.costs[pos]
+            if n == 0 or cost > b:
+                return None
+            n, b = n - 1, b - cost
+        pos += 1
+        # Once the defense are all picked the remaining defense are skipped in one step
+        if pos <= self.n_d and (n == 0 or pos == self.n_d):
+            if n > 0:
+                return None
+            pos, n = self.n_d, self.need_f
+        return pos, n, b
+
+    def start(self, b=None):
+        # Root of the search, or None when not enough defense made it through pruning
+        b = self.budget if b is None else b
+        if self.need_d == 0:
+            return self.n_d, self.need_f, b
+        if self.n_d == 0:
+            return None
+        return 0, self.need_d, b
+
+    def done(self, pos, n):
+        return pos >= self.n_d and n == 0
+
+# Function to list the best k distinct lineups under the cap
+def top_lineups(salaries, scores, positions, k=100, composition=team_composition, cap=salary_cap, max_buckets=2000):
+    '''
+    This function returns the k highest scoring distinct lineups that fit under the cap.
+
+    Players with k + slots - 1 or more cheaper-and-better teammates of their position can
+    not be in any of the top k, so they are pruned first. The rest are searched best-first,
+    where every partial lineup is ranked by its score so far plus the best completion from
+    the DP tables, so lineups come off the heap in score order. With exact buckets there are
+    no dead ends; with rounded ones the completion is an upper bound and partial lineups
+    over the cap on real salaries are dropped.
+
+    Inputs:
+        salaries: array of player salaries
+        scores: array of player scores
+        positions: array of 'F' / 'D' labels
+        k: number of lineups to return
+        composition: dict of position -> players needed
+        cap: salary cap
+        max_buckets: largest number of salary buckets the DP tables may use
+    Outputs:
+        lineups: list of (score, array of chosen indices), best first; shorter than k
+                 when fewer lineups fit
+        exact: True when salaries were bucketed without rounding
+    '''
+    search = _LineupSearch(salaries, scores, positions, composition, cap, max_buckets, extra=max(k - 1, 0))
+
+    lineups = []
+    root = search.start()
+    if root is None or not np.isfinite(search.bound(*root)):
+        return lineups, search.exact
+    heap = [(-search.bound(*root), 0, 0.0, 0, *root, ())]
+    pushed = 1
+    while heap and len(lineups) < k:
+        _, _, score, spent, pos, n, b, chosen = heapq.heappop(heap)
+        if search.done(pos, n):
+            lineups.append((score, search.players[list(chosen)]))
+            continue
+        for take in (True, False):
+            child = search.advance(pos, n, b, take)
+            if child is None:
+                continue
+            child_spent = spent + int(search.salaries[pos]) if take else spent
+            # Rounded buckets only bound the search; the real salaries decide what fits
+            if child_spent > search.cap:
+                continue
+            child_score = score + search.scores[pos] if take else score
+            child_bound = search.bound(*child)
+            if np.isfinite(child_bound):
+                heapq.heappush(heap, (-(child_score + child_bound), pushed, child_score, child_spent, *child,
+                                      chosen + (pos,) if take else chosen))
+                pushed += 1
+    return lineups, search.exact
+
+# Function to trace the efficient frontier of lineup salary against score
+def salary_frontier(salaries, scores, positions, composition=team_composition, cap=salary_cap, max_buckets=2000):
+    '''
+    This function finds every lineup on the salary vs score frontier: for each total
+    salary, the best lineup costing no more, kept only where it beats every cheaper one.
+
+    The DP table already holds the best score at every budget, so the frontier is the
+    budgets where that best goes up, each traced back to its lineup.
+
+    Inputs:
+        salaries: array of player salaries
+        scores: array of player scores
+        positions: array of 'F' / 'D' labels
+        composition: dict of position -> players needed
+        cap: salary cap
+        max_buckets: largest number of salary buckets the DP tables may use
+    Outputs:
+        frontier: list of (total salary, score, array of chosen indices), cheapest first
+        exact: True when salaries were bucketed without rounding
+    '''
+    search = _LineupSearch(salaries, scores, positions, composition, cap, max_buckets)
+    root = search.start()
+    if root is None:
+        return [], search.exact
+    best = np.array([search.bound(root[0], root[1], b) for b in range(search.budget + 1)])
+    steps = np.flatnonzero(np.isfinite(best) & (best > np.concatenate([[-np.inf], best[:-1]])))
+
+    points = []
+    for b in steps:
+        # Follow the tables down: take a player whenever that keeps the best completion
+        state, chosen = search.start(b), []
+        while not search.done(state[0], state[1]):
+            pos = state[0]
+            taken = search.advance(*state, True)
+            skipped = search.advance(*state, False)
+            take_value = search.scores[pos] + search.bound(*taken) if taken is not None else -np.inf
+            if skipped is None or take_value >= search.bound(*skipped):
+                chosen.append(pos)
+                state = taken
+            else:
+                state = skipped
+        players = search.players[chosen]
+        points.append((int(search.salaries[chosen].sum()), float(search.scores[chosen].sum()), players))
+    if not search.exact:
+        # Rounded-down buckets can trace lineups over the real cap; the best one that fits
+        # comes from the exact search instead
+        points = [point for point in points if point[0] <= search.cap]
+        best_fit, _ = top_lineups(salaries, scores, positions, 1, composition, cap, max_buckets)
+        points += [(int(np.asarray(salaries)[chosen].sum()), score, chosen) for score, chosen in best_fit]
+
+    # Rounded buckets can order salaries slightly differently; keep only the undominated points
+    frontier = []
+    for point in sorted(points, key=lambda point: (point[0], -point[1])):
+        if not frontier or point[1] > frontier[-1][1]:
+            frontier.append(point)
+    return frontier, search.exact
+
+def player_positions(df):
+    # Prefer the F/D position column, fall back to the encoded one
+    if 'position' in df.columns:
+        return df['position'].to_numpy()
+    return df['position_encoded'].map({0: 'D', 1: 'F'}).to_numpy()
+
+def optimal_lineup(forwards, defense, loadings, fixed=None, cap=salary_cap, composition=team_composition):
+    '''
+    This function picks the best 3F/2D lineup under the cap by the simulator's loadings score.
+
+    Inputs:
+        forwards: dataframe of forwards with name, salary and the metric columns
+        defense: dataframe of defensemen with name, salary and the metric columns
+        loadings: dict from load_feature_loadings or a weights array from loadings_vector
+        fixed: optional dataframe of players already on the team; they are kept and
+               their salary and spots are taken out before solving
+        cap: salary cap
+        composition: dict of position -> players needed
+    Outputs:
+        lineup: dataframe of the chosen players (fixed players first) with a 'score' column,
+                or None when no lineup fits under the cap
+        remaining_cap: cap left after paying the lineup
+    '''
+    pool, scores, fixed, remaining, cap = _scored_pool(forwards, defense, loadings, fixed, cap, composition)
+    if pool is None:
+        return None, cap
+
+    chosen, _ = solve_lineup(pool['salary'].to_numpy(), scores, pool['position'].to_numpy(), remaining, cap)
+    if chosen is None:
+        return None, cap
+
+    lineup = pool.iloc[chosen].assign(score=scores[chosen])
+    if fixed is not None:
+        lineup = pd.concat([fixed, lineup])
+    return lineup, cap - int(pool['salary'].iloc[chosen].sum())
+
+def _scored_pool(forwards, defense, loadings, fixed, cap, composition):
+    # One F/D pool scored by the loadings, with any fixed players' salary and spots taken out
+    weights = loadings_vector(loadings) if isinstance(loadings, dict) else np.asarray(loadings, dtype=float)
+
+    pool = pd.concat([forwards.assign(position='F'), defense.assign(position='D')], ignore_index=True)
+    remaining = dict(composition)
+    if fixed is not None and not fixed.empty:
+        fixed = fixed.assign(position=player_positions(fixed))
+        fixed_scores, _ = score_matrix(team_matrix(fixed), weights)
+        fixed = fixed.assign(score=fixed_scores)
+        pool = pool[~pool['name'].isin(fixed['name'])].reset_index(drop=True)
+        cap = cap - int(fixed['salary'].sum())
+        for position in fixed['position']:
+            remaining[position] = remaining.get(position, 0) - 1
+        if cap < 0 or min(remaining.values()) < 0:
+            return None, None, fixed, remaining, cap
+    else:
+        fixed = None
+
+    scores, _ = score_matrix(team_matrix(pool), weights)
+    return pool, scores, fixed, remaining, cap
+
+def _lineup_rows(pool, fixed, chosen, score, salary):
+    # One summary row per lineup; fixed players are part of every lineup
+    names = list(fixed['name']) if fixed is not None else []
+    if fixed is not None:
+        score += float(fixed['score'].sum())
+        salary += int(fixed['salary'].sum())
+    return {'score': score, 'salary': salary, 'players': names + pool['name'].iloc[chosen].tolist()}
+
+def best_lineups(forwards, defense, loadings, k=100, fixed=None, cap=salary_cap, composition=team_composition):
+    '''
+    This function lists the k best distinct 3F/2D lineups under the cap by the simulator's loadings score.
+
+    Inputs:
+        forwards: dataframe of forwards with name, salary and the metric columns
+        defense: dataframe of defensemen with name, salary and the metric columns
+        loadings: dict from load_feature_loadings or a weights array from loadings_vector
+        k: number of lineups to return
+        fixed: optional dataframe of players that must be in every lineup
+        cap: salary cap
+        composition: dict of position -> players needed
+    Outputs:
+        lineups: dataframe with rank, score, salary and the list of player names, best first
+    '''
+    pool, scores, fixed, remaining, cap_left = _scored_pool(forwards, defense, loadings, fixed, cap, composition)
+    rows = []
+    if pool is not None:
+        lineups, _ = top_lineups(pool['salary'].to_numpy(), scores, pool['position'].to_numpy(), k, remaining, cap_left)
+        rows = [_lineup_rows(pool, fixed, chosen, score, int(pool['salary'].iloc[chosen].sum()))
+                for score, chosen in lineups]
+    lineups = pd.DataFrame(rows, columns=['score', 'salary', 'players'])
+    lineups.insert(0, 'rank', np.arange(1, len(lineups) + 1))
+    return lineups
+
+def lineup_frontier(forwards, defense, loadings, fixed=None, cap=salary_cap, composition=team_composition):
+    '''
+    This function lists the lineups on the salary vs score frontier under the cap: the best
+    lineup for its price, where every more expensive one scores higher.
+
+    Inputs:
+        forwards: dataframe of forwards with name, salary and the metric columns
+        defense: dataframe of defensemen with name, salary and the metric columns
+        loadings: dict from load_feature_loadings or a weights array from loadings_vector
+        fixed: optional dataframe of players that must be in every lineup
+        cap: salary cap
+        composition: dict of position -> players needed
+    Outputs:
+        frontier: dataframe with salary, score and the list of player names, cheapest first
+    '''
+    pool, scores, fixed, remaining, cap_left = _scored_pool(forwards, defense, loadings, fixed, cap, composition)
+    rows = []
+    if pool is not None:
+        frontier, _ = salary_frontier(pool['salary'].to_numpy(), scores, pool['position'].to_numpy(),
+                                      remaining, cap_left)
+        rows = [_lineup_rows(pool, fixed, chosen, score, salary) for salary, score, chosen in frontier]
+    return pd.DataFrame(rows, columns=['score', 'salary', 'players'])[['salary', 'score', 'players']]
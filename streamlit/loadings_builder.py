@@ -0,0 +1,248 @@
+import os
+import json
+import time
+import hashlib
+
+import numpy as np
+import pandas as pd
+from sklearn.decomposition import IncrementalPCA
+from sklearn.preprocessing import StandardScaler
+
+from data_store import (project_root, cache_folder, file_signature, content_hash, write_atomic,
+                        read_snapshot, write_snapshot, snapshot_extension)
+from season_pipeline import season_files, skater_rename, percentage_columns, key_dtypes
+from game_simulator import feature_weights, performance_metrics
+from instrumentation import timed
+
+master_copies_folder = os.path.join(project_root, 'files', 'master_copies')
+loadings_filepath = os.path.join(master_copies_folder, 'position_loadings' + snapshot_extension)
+loadings_cache_folder = os.path.join(cache_folder, 'loadings_builder')
+
+groups = ['F', 'D']
+situations = ['all', '5on5', '5on4', '4on5']
+
+# Season file columns needed for the metrics; assists are the two assist columns added up
+metric_sources = {source: column for source, column in skater_rename.items()
+                  if column in performance_metrics or column in ['primary_assists', 'secondary_assists']}
+read_columns = ['position', 'situation', 'games_played'] + list(metric_sources)
+
+def _file_hashes(files, folder=loadings_cache_folder):
+    '''
+    This function returns the content hash of every season file, hashing again only the
+    files whose size/mtime moved since the last run.
+
+    Inputs:
+        files: dict of season -> filepath from season_files
+        folder: where the signature -> hash manifest is kept
+    Outputs:
+        hashes: dict of season -> sha1 hex digest
+    '''
+    os.makedirs(folder, exist_ok=True)
+    manifest_path = os.path.join(folder, 'manifest.json')
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    hashes = {}
+    for season, filepath in files.items():
+        signature = file_signature(filepath)
+        entry = manifest.get(str(season))
+        if entry is None or entry['signature'] != signature:
+            entry = {'signature': signature, 'hash': content_hash(filepath)}
+            manifest[str(season)] = entry
+        hashes[season] = entry['hash']
+
+    def write(tmp_path):
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+    write_atomic(write, manifest_path)
+    return hashes
+
+def loadings_key(file_hashes, group, situation, min_games):
+    '''
+    This function fingerprints everything one set of loadings is built from: the season
+    files' bytes, the feature weights, the metric list, the split and the games cut-off.
+
+    Inputs:
+        file_hashes: dict of season -> sha1 from _file_hashes
+        group: 'F' or 'D'
+        situation: situation split, e.g. '5on5'
+        min_games: fewest games a player-season needs to be used
+    Outputs:
+        key: sha1 hex digest
+    '''
+    payload = json.dumps({
+        'files': sorted(file_hashes.items()),
+        'weights': sorted(feature_weights.items()),
+        'metrics': performance_metrics,
+        'group': group,
+        'situation': situation,
+        'min_games': min_games,
+    })
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+def weighted_rates(chunk, min_games):
+    '''
+    This function turns one chunk of season rows into weighted per-game metric rows.
+
+    Inputs:
+        chunk: season file rows with read_columns
+        min_games: fewest games a player-season needs to be kept
+    Outputs:
+        groups: array of 'F'/'D' per kept row
+        situations: array of situation per kept row
+        X: float array of shape (n_rows, n_metrics) in performance_metrics order, per-game
+           rates (percentages as they are) multiplied by feature_weights
+    '''
+    chunk = chunk[chunk['games_played'] >= max(min_games, 1)].rename(columns=metric_sources)
+    chunk = chunk.assign(assists=chunk['primary_assists'] + chunk['secondary_assists'])
+    games = chunk['games_played'].to_numpy(dtype=np.float64)
+
+    X = chunk[performance_metrics].to_numpy(dtype=np.float64)
+    counts = np.array([metric not in percentage_columns for metric in performance_metrics])
+    X[:, counts] /= games[:, None]
+    X *= np.array([feature_weights.get(metric, 1) for metric in performance_metrics])
+
+    group = np.where(chunk['position'].astype(str) == 'D', 'D', 'F')
+    return group, chunk['situation'].astype(str).to_numpy(), X
+
+def _stream(files, wanted, min_games, chunksize):
+    # Every season file in chunks, yielding the rows of each wanted (group, situation) split
+    dtype = {column: 'float32' for column in metric_sources}
+    dtype.update({'position': key_dtypes['position'], 'situation': key_dtypes['situation'],
+                  'games_played': key_dtypes['games_played']})
+    wanted_situations = {situation for _, situation in wanted}
+    for filepath in files.values():
+        for chunk in pd.read_csv(filepath, usecols=read_columns, dtype=dtype, chunksize=chunksize):
+            chunk = chunk[chunk['situation'].isin(wanted_situations)]
+            if chunk.empty:
+                continue
+            group, situation, X = weighted_rates(chunk, min_games)
+            for key in wanted:
+                rows = (group == key[0]) & (situation == key[1])
+                if rows.any():
+                    yield key, X[rows]
+
+@timed('incremental loadings')
+def fit_loadings(files, wanted, min_games=10, chunksize=5000):
+    '''
+    This function fits one single-component PCA per split without holding the seasons in
+    memory: a first pass over the files fits each split's scaler, a second pass feeds the
+    scaled rows to each split's IncrementalPCA.
+
+    Inputs:
+        files: dict of season -> filepath from season_files
+        wanted: list of (group, situation) splits to fit
+        min_games: fewest games a player-season needs to be used
+        chunksize: rows parsed per chunk
+    Outputs:
+        fitted: dict of (group, situation) -> (loadings array in performance_metrics order,
+                explained variance ratio, rows used)
+    '''
+    scalers = {key: StandardScaler() for key in wanted}
+    for key, X in _stream(files, wanted, min_games, chunksize):
+        scalers[key].partial_fit(X)
+
+    pcas = {key: IncrementalPCA(n_components=1) for key in wanted}
+    for key, X in _stream(files, wanted, min_games, chunksize):
+        pcas[key].partial_fit(scalers[key].transform(X))
+
+    fitted = {}
+    for key in wanted:
+        pca = pcas[key]
+        if not hasattr(pca, 'components_'):
+            continue  # no rows for this split
+        loadings = pca.components_[0]
+        # A component's sign is arbitrary; point it the way goals score, as the csv loadings do
+        if loadings[performance_metrics.index('goals')] < 0:
+            loadings = -loadings
+        fitted[key] = (loadings, float(pca.explained_variance_ratio_[0]), int(pca.n_samples_seen_))
+    return fitted
+
+def read_loadings(filepath=loadings_filepath):
+    # The stored loadings table, or an empty one in the same layout
+    if os.path.exists(filepath):
+        return read_snapshot(filepath)
+    index = pd.MultiIndex.from_tuples([], names=['group', 'situation'])
+    return pd.DataFrame(columns=performance_metrics + ['explained_variance', 'n_rows', 'key'], index=index)
+
+def build_loadings(groups=groups, situations=situations, min_games=10, filepath=loadings_filepath,
+                   force=False, chunksize=5000):
+    '''
+    This function brings the per-position, per-situation loadings up to date. Splits whose
+    key still matches the stored one are kept; only stale or missing splits are refitted.
+
+    Inputs:
+        groups: position groups to build, 'F' and/or 'D'
+        situations: situation splits to build
+        min_games: fewest games a player-season needs to be used
+        filepath: the loadings table, one row per (group, situation)
+        force: refit every requested split
+        chunksize: rows parsed per chunk
+    Outputs:
+        table: dataframe indexed by (group, situation) with one column per metric plus
+               explained_variance, n_rows and key
+        rebuilt: list of (group, situation) splits that were refitted
+    '''
+    files = season_files('skaters')
+    file_hashes = _file_hashes(files)
+    table = read_loadings(filepath)
+
+    keys = {(group, situation): loadings_key(file_hashes, group, situation, min_games)
+            for group in groups for situation in situations}
+    stale = [split for split, key in keys.items()
+             if force or split not in table.index or table.at[split, 'key'] != key]
+    if not stale:
+        return table, []
+
+    fitted = fit_loadings(files, stale, min_games, chunksize)
+    rows = pd.DataFrame(
+        [list(loadings) + [explained, n_rows, keys[split]] for split, (loadings, explained, n_rows) in fitted.items()],
+        columns=table.columns,
+        index=pd.MultiIndex.from_tuples(list(fitted), names=['group', 'situation']))
+    table = pd.concat([table.drop(index=[split for split in fitted if split in table.index]), rows])
+    table[performance_metrics + ['explained_variance']] = table[performance_metrics + ['explained_variance']].astype('float32')
+    table['n_rows'] = table['n_rows'].astype('int32')
+    table = table.sort_index()
+
+    write_snapshot(table, filepath)
+    return table, list(fitted)
+
+def load_loadings(group='F', situation='all', filepath=loadings_filepath):
+    '''
+    This function returns one split's loadings in the load_feature_loadings layout.
+
+    Inputs:
+        group: 'F' or 'D'
+        situation: situation split
+        filepath: the loadings table written by build_loadings
+    Outputs:
+        loadings: dict of metric -> loading
+    '''
+    table = read_loadings(filepath)
+    if (group, situation) not in table.index:
+        raise KeyError(f"No loadings for {group} / {situation} in {filepath}. Run build_loadings first.")
+    row = table.loc[(group, situation), performance_metrics]
+    return {metric: float(value) for metric, value in row.items()}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Build PCA loadings per position group and situation from the season files')
+    parser.add_argument('--groups', nargs='+', choices=groups, default=groups)
+    parser.add_argument('--situations', nargs='+', default=situations)
+    parser.add_argument('--min-games', type=int, default=10)
+    parser.add_argument('--output', default=loadings_filepath)
+    parser.add_argument('--force', action='store_true', help='refit every split even if its inputs did not change')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    table, rebuilt = build_loadings(args.groups, args.situations, args.min_games, args.output, args.force)
+    elapsed = time.perf_counter() - start
+
+    print(f"Splits refitted: {rebuilt if rebuilt else 'none, all up to date'}")
+    print(table[performance_metrics].T.round(3).to_string())
+    print(table[['explained_variance', 'n_rows']].to_string())
+    print(f"Finished in {elapsed:.2f}s")
@@ -0,0 +1,280 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from game_simulator import performance_metrics, loadings_vector, team_matrix, score_matrix
+from game_logs import game_log_folders, load_game_logs, player_games
+from instrumentation import timed
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+name_player_id_filepath = os.path.join(project_root, 'files', 'other', 'name_playerId.csv')
+
+# NHL API game-log columns and the simulator metric each one feeds
+log_metric_map = {
+    'goals': 'goals',
+    'assists': 'assists',
+    'shots': 'shots_on_goal',
+    'shifts': 'shifts',
+    'toi_seconds': 'icetime',
+}
+
+def load_player_ids(filepath=name_player_id_filepath):
+    '''
+    This function loads the name -> NHL playerId lookup.
+
+    Inputs:
+        filepath: csv with name and playerId_all columns
+    Outputs:
+        player_ids: dict of name -> playerId
+    '''
+    df = pd.read_csv(filepath).dropna(subset=['playerId_all'])
+    return dict(zip(df['name'], df['playerId_all'].astype('int64')))
+
+def load_player_game_log(player_id, folders=game_log_folders):
+    '''
+    This function reads one player's game log and maps it onto the simulator metrics.
+
+    Inputs:
+        player_id: NHL playerId
+        folders: dict of game-log folder -> position group
+    Outputs:
+        log_df: dataframe with one row per game and one column per mapped metric,
+                or None when there is no usable log for the player
+    '''
+    # toi_seconds stays in seconds, the unit of icetime in the master tables
+    log_df = player_games(load_game_logs(folders), int(player_id))
+    log_df = log_df.reindex(columns=list(log_metric_map)).rename(columns=log_metric_map)
+    log_df = log_df.dropna(how='all')
+    return log_df.fillna(0) if not log_df.empty else None
+
+# Positions of the logged metrics in performance_metrics, in log_metric_map order
+logged_positions = [performance_metrics.index(metric) for metric in log_metric_map.values()]
+
+def game_score_pools(player_ids, loadings, folders=game_log_folders, game_logs=None):
+    '''
+    This function scores every logged game of many players in one pass over the game-log table.
+
+    Inputs:
+        player_ids: iterable of NHL playerIds (missing values are skipped)
+        loadings: dict from load_feature_loadings
+        folders: game-log folders
+        game_logs: table from load_game_logs; loaded from folders when None
+    Outputs:
+        pools: dict of playerId -> array of per-game scores for the logged metrics;
+               players without a usable log are left out
+    '''
+    if game_logs is None:
+        game_logs = load_game_logs(folders)
+    logged_weights = loadings_vector(loadings)[logged_positions]
+
+    ids = pd.Series(player_ids).dropna().astype('int64').unique()
+    rows = game_logs[game_logs['playerId'].isin(ids)]
+    # toi_seconds stays in seconds, the unit of icetime in the master tables
+    log_df = rows.reindex(columns=list(log_metric_map))
+    usable = log_df.notna().any(axis=1).to_numpy()
+    scores = log_df[usable].fillna(0).to_numpy(dtype=float) @ logged_weights
+
+    # The table is sorted by playerId, so each player's games are one run
+    owners, starts = np.unique(rows['playerId'].to_numpy()[usable], return_index=True)
+    return dict(zip(owners.tolist(), np.split(scores, starts[1:])))
+
+def player_score_parts(players, loadings, player_ids=None, folders=game_log_folders, game_logs=None):
+    '''
+    This function splits each player's score into a fixed part and a pool of per-game
+    scores to bootstrap from.
+
+    Metrics the game logs do not record (hits, danger shots, ...) stay at the player's
+    season average. Metrics they do record are replaced by one of the player's real games.
+    Players without a game log keep their season average for everything.
+
+    Inputs:
+        players: dataframe with a 'name' column and the metric columns
+        loadings: dict from load_feature_loadings
+        player_ids: dict of name -> playerId; the player_id column is used first
+        folders: game-log folders
+        game_logs: table from load_game_logs; loaded from folders when None
+    Outputs:
+        bases: array with the part of each player's score that does not vary game to game
+        pools: list with each player's array of per-game scores, or None without a log
+    '''
+    _, contributions = score_matrix(team_matrix(players), loadings_vector(loadings))
+    ids = players['player_id'] if 'player_id' in players.columns else players['name'].map(player_ids or {})
+    by_id = game_score_pools(ids, loadings, folders, game_logs)
+
+    pools = [by_id.get(int(player_id)) if pd.notna(player_id) else None for player_id in ids]
+    logged = np.array([pool is not None for pool in pools], dtype=bool)
+    bases = contributions.sum(axis=1) - np.where(logged, contributions[:, logged_positions].sum(axis=1), 0.0)
+    return bases, pools
+
+def team_score_distribution(team_df, loadings, player_ids=None, folders=game_log_folders, game_logs=None):
+    '''
+    This function splits a team's score into a fixed part and a per-player pool of
+    per-game scores to bootstrap from, as in player_score_parts.
+
+    Inputs:
+        team_df: dataframe with a 'name' column and the metric columns
+        loadings: dict from load_feature_loadings
+        player_ids: dict of name -> playerId; team_df's player_id column is used first
+        folders: game-log folders
+        game_logs: table from load_game_logs; loaded from folders when None
+    Outputs:
+        base: float, the part of the team score that does not vary game to game
+        pools: list of arrays, one per logged player, of per-game scores for the logged metrics
+    '''
+    bases, pools = player_score_parts(team_df, loadings, player_ids, folders, game_logs)
+    return float(bases.sum()), [pool for pool in pools if pool is not None]
+
+def team_draw_layout(players, team_of, n_teams, loadings, player_ids=None, folders=game_log_folders):
+    '''
+    This function lays many teams' rosters out so all their totals can be drawn at once.
+    A player on several rosters has one pool, so a draw for them is shared by every team
+    that has them.
+
+    Inputs:
+        players: dataframe of every roster spot, grouped by team, with 'name' and the metric columns
+        team_of: array with the team index of each row, in non-decreasing order
+        n_teams: number of teams
+        loadings: dict from load_feature_loadings
+        player_ids: dict of name -> playerId; the player_id column is used first
+        folders: game-log folders
+    Outputs:
+        layout: tuple of arrays for draw_team_totals
+    '''
+    team_of = np.asarray(team_of, dtype=np.int64)
+    # The fixed parts add straight into the team bases
+    player_bases, player_pools = player_score_parts(players, loadings, player_ids, folders)
+    bases = np.bincount(team_of, weights=player_bases, minlength=n_teams)
+
+    # Logged spots point at one pool per distinct player, laid out in one flat array
+    slots = np.array([row for row, pool in enumerate(player_pools) if pool is not None], dtype=np.int64)
+    _, first_seen, slot_player = np.unique(players['name'].to_numpy()[slots].astype(str),
+                                           return_index=True, return_inverse=True)
+    pools = [player_pools[slots[i]] for i in first_seen]
+    lengths = np.array([len(pool) for pool in pools], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+    draws = np.concatenate(pools) if pools else np.zeros(0)
+    owning, first_slot = np.unique(team_of[slots], return_index=True)
+    return bases, draws, offsets, lengths, slot_player, first_slot, owning
+
+def draw_team_totals(layout, rng, size):
+    '''
+    This function draws size independent games for every team in a layout.
+
+    Inputs:
+        layout: tuple from team_draw_layout
+        rng: numpy Generator
+        size: number of games
+    Outputs:
+        totals: array of shape (size, n_teams) with each team's unscaled score per game
+    '''
+    bases, draws, offsets, lengths, slot_player, first_slot, owning = layout
+    totals = np.tile(bases, (size, 1))
+    if len(lengths):
+        # One real game per player per draw; each team's spots are one contiguous run
+        picks = offsets + (rng.random((size, len(lengths))) * lengths).astype(np.int64)
+        totals[:, owning] += np.add.reduceat(draws[picks][:, slot_player], first_slot, axis=1)
+    return totals
+
+def _simulate_chunk(args):
+    user_base, user_pools, ai_base, ai_pools, n_games, seed = args
+    rng = np.random.default_rng(seed)
+    totals = []
+    for base, pools in [(user_base, user_pools), (ai_base, ai_pools)]:
+        team_totals = np.full(n_games, base)
+        for pool in pools:
+            team_totals += pool[rng.integers(0, len(pool), size=n_games)]
+        totals.append(team_totals)
+    return totals[0], totals[1]
+
+@timed('monte carlo')
+def simulate_game_monte_carlo(user_team, ai_team, loadings, n_games=100000, seed=None, n_workers=1,
+                              scaling_factor=1000, player_ids=None, folders=game_log_folders):
+    '''
+    This function plays the same matchup n_games times, drawing every logged player's
+    stats from one of their real games each time.
+
+    Inputs:
+        user_team: dataframe with a 'name' column and the metric columns
+        ai_team: same as user_team
+        loadings: dict from load_feature_loadings
+        n_games: number of simulated games
+        seed: seed for reproducible draws
+        n_workers: processes to split the games across; 1 runs in-process
+        scaling_factor: divisor applied to team totals, as in simulate_game
+        player_ids: dict of name -> playerId, loaded from name_playerId.csv when None
+        folders: game-log folders
+    Outputs:
+        results: dict with
+            user_win_probability, ai_win_probability, tie_probability: floats
+            user_scores, ai_scores: arrays of length n_games with the scaled team scores
+            summary: dataframe of mean, std and percentiles per team
+    '''
+    if player_ids is None:
+        player_ids = load_player_ids()
+    user_base, user_pools = team_score_distribution(user_team, loadings, player_ids, folders)
+    ai_base, ai_pools = team_score_distribution(ai_team, loadings, player_ids, folders)
+
+    # Split the games into independent streams so workers never share draws
+    n_chunks = max(1, min(n_workers, n_games))
+    sizes = np.full(n_chunks, n_games // n_chunks)
+    sizes[:n_games % n_chunks] += 1
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    tasks = [(user_base, user_pools, ai_base, ai_pools, int(size), child) for size, child in zip(sizes, seeds)]
+
+    if n_chunks == 1:
+        chunks = [_simulate_chunk(tasks[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=n_chunks) as executor:
+            chunks = list(executor.map(_simulate_chunk, tasks))
+
+    user_scores = np.concatenate([chunk[0] for chunk in chunks]) / scaling_factor
+    ai_scores = np.concatenate([chunk[1] for chunk in chunks]) / scaling_factor
+
+    summary = pd.DataFrame({
+        team: {
+            'mean': scores.mean(),
+            'std': scores.std(),
+            'p05': np.percentile(scores, 5),
+            'p50': np.percentile(scores, 50),
+            'p95': np.percentile(scores, 95),
+        }
+        for team, scores in [('User', user_scores), ('AI', ai_scores)]
+    }).T
+
+    return {
+        'user_win_probability': float(np.mean(user_scores > ai_scores)),
+        'ai_win_probability': float(np.mean(ai_scores > user_scores)),
+        'tie_probability': float(np.mean(user_scores == ai_scores)),
+        'user_scores': user_scores,
+        'ai_scores': ai_scores,
+        'summary': summary,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+    from game_simulator import load_feature_loadings
+
+    parser = argparse.ArgumentParser(description='Monte Carlo matchup between two saved teams')
+    parser.add_argument('--user-team', default=os.path.join(project_root, 'files', 'team_data', 'user_team.csv'))
+    parser.add_argument('--ai-team', default=os.path.join(project_root, 'files', 'team_data', 'ai_team.csv'))
+    parser.add_argument('--loadings', default=os.path.join(project_root, 'files', 'master_copies', 'feature_loadings.csv'))
+    parser.add_argument('--games', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = simulate_game_monte_carlo(pd.read_csv(args.user_team), pd.read_csv(args.ai_team),
+                                        load_feature_loadings(args.loadings), n_games=args.games,
+                                        seed=args.seed, n_workers=args.workers)
+    elapsed = time.perf_counter() - start
+
+    print(f"Team User wins {results['user_win_probability']:.1%} of {args.games:,} games")
+    print(f"Team AI wins {results['ai_win_probability']:.1%} of {args.games:,} games")
+    print(results['summary'])
+    print(f"Simulated in {elapsed:.2f}s")
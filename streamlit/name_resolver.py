@@ -0,0 +1,272 @@
+import os
+import difflib
+
+import numpy as np
+import pandas as pd
+
+from season_pipeline import season_files
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+cap_filepath = os.path.join(project_root, 'files', 'salary', 'cap_all.csv')
+
+directory_columns = ['playerId', 'season', 'name', 'team', 'position']
+position_groups = ['F', 'D', 'G']
+
+def flip_last_first(names):
+    '''
+    This function turns "Last, First" names into "First Last"; other names pass through.
+
+    Inputs:
+        names: series of names
+    Outputs:
+        names: series of "First Last" names
+    '''
+    parts = names.str.extract(r'^\s*([^,]+?)\s*,\s*(.+?)\s*$')
+    return (parts[1] + ' ' + parts[0]).fillna(names)
+
+def normalize_names(names, drop_accented=False):
+    '''
+    This function reduces names to a comparable key: accents removed, lower case, only
+    letters and single spaces, so "J.T. Miller", "JT Miller" and "J. T. Miller" agree.
+
+    Inputs:
+        names: series of "First Last" names
+        drop_accented: drop accented letters instead of stripping the accent, which is
+                       how the MoneyPuck files spell them ("Stützle" -> "Sttzle")
+    Outputs:
+        keys: series of normalized names
+    '''
+    keys = names.astype(str)
+    if drop_accented:
+        keys = keys.str.replace(r'[^\x00-\x7f]', '', regex=True)
+    keys = keys.str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii')
+    keys = keys.str.lower().str.replace(r'[.\'`]', '', regex=True)
+    keys = keys.str.replace(r'[^a-z]+', ' ', regex=True).str.strip()
+    # Spaced initials run together: "j t miller" -> "jt miller"
+    keys = keys.str.replace(r'\b([a-z]) (?=[a-z]\b)', r'\1', regex=True)
+    return keys
+
+def parse_currency(values):
+    '''
+    This function parses money strings such as "$13,250,000" into numbers.
+
+    Inputs:
+        values: series of money strings
+    Outputs:
+        amounts: Int64 series, missing where the value could not be parsed
+    '''
+    cleaned = values.astype(str).str.replace(r'[$,\s]', '', regex=True)
+    return pd.to_numeric(cleaned, errors='coerce').round().astype('Int64')
+
+def position_group(positions):
+    # 'C, RW' -> 'F', 'LD, RD' -> 'D', 'G' -> 'G'; MoneyPuck's C/L/R/D/G map the same way
+    positions = positions.astype(str)
+    return np.where(positions.str.contains('G'), 'G', np.where(positions.str.contains('D'), 'D', 'F'))
+
+def load_player_directory(kinds=('skaters', 'goalies')):
+    '''
+    This function reads the name, team and position of every player in every season file.
+
+    Inputs:
+        kinds: which season files to read
+    Outputs:
+        directory: dataframe with one row per playerId holding the most recent season's
+                   name, team and position, plus the normalized name key
+    '''
+    frames = []
+    for kind in kinds:
+        for filepath in season_files(kind).values():
+            df = pd.read_csv(filepath, usecols=directory_columns + ['situation'])
+            frames.append(df.loc[df['situation'] == 'all', directory_columns])
+    seasons = pd.concat(frames, ignore_index=True)
+
+    # Keep each player's most recent season
+    directory = seasons.sort_values('season').drop_duplicates('playerId', keep='last').reset_index(drop=True)
+    add_name_keys(directory, directory['name'])
+    directory['group'] = position_group(directory['position'])
+    return directory
+
+def add_name_keys(df, names):
+    # Every key a pass can join on: full name, accent-dropped name, last name and first-name stem
+    df['key'] = normalize_names(names)
+    df['dropped_key'] = normalize_names(names, drop_accented=True)
+    parts = df['key'].str.split(' ', n=1)
+    df['last'] = parts.str[1].fillna(parts.str[0])
+    df['first_stem'] = parts.str[0].str[:3]
+    return df
+
+class NameResolver:
+    '''
+    Normalized-name and playerId indexes over every player in the season files, built once
+    and used to attach playerIds to tables that only carry names (salary sheets, ...).
+
+    Matching is exact on the normalized name first (with and without accented letters),
+    then on last name plus the first three letters of the first name (Alex/Alexander,
+    Pat/Patrick), with team and position breaking ties between namesakes. What is left
+    falls back to fuzzy matching within blocks of players that share a last-name initial
+    and position group (every group when the query has no position).
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.by_id = directory.set_index('playerId')
+        # Normalized name -> directory rows, most recent season last
+        self.by_key = directory.groupby('key').indices
+        # (last-name initial, position group) -> candidate keys for the fuzzy fallback
+        last_initial = directory['key'].str.split().str[-1].str[0].fillna('')
+        self.blocks = {block: sorted(set(keys)) for block, keys in
+                       directory['key'].groupby([last_initial, directory['group']])}
+
+    @classmethod
+    def build(cls, kinds=('skaters', 'goalies')):
+        return cls(load_player_directory(kinds))
+
+    def _merge_pass(self, queries, on, method):
+        '''
+        This function matches queries to the directory with one vectorized merge.
+
+        Inputs:
+            queries: dataframe indexed by row with key columns, team and group
+            on: key columns to join on
+            method: label recorded for rows matched by this pass
+        Outputs:
+            matches: dataframe indexed by row with playerId, method and score
+        '''
+        directory = self.directory[['playerId', 'season'] + on].assign(
+            candidate_team=self.directory['team'], candidate_group=self.directory['group'])
+        query_columns = ['row', 'team', 'group'] + [column for column in on if column != 'group']
+        candidates = queries.reset_index()[query_columns].merge(directory, on=on, how='inner')
+        if candidates.empty:
+            return pd.DataFrame(columns=['playerId', 'method', 'score'], index=pd.Index([], name='row'))
+
+        # Namesakes are narrowed by team, then position group, then the most recent season
+        candidates['team_match'] = candidates['team'] == candidates['candidate_team']
+        candidates['group_match'] = candidates['group'] == candidates['candidate_group']
+        candidates = candidates.sort_values(['team_match', 'group_match', 'season'], ascending=False)
+        namesakes = candidates.groupby('row').size()
+        best = candidates.drop_duplicates('row', keep='first').set_index('row')
+        labels = np.where(namesakes.reindex(best.index) > 1, method + ' (namesake)', method)
+        return pd.DataFrame({'playerId': best['playerId'], 'method': labels, 'score': 1.0}, index=best.index)
+
+    def _fuzzy(self, queries, cutoff):
+        rows = []
+        for row, key, group in zip(queries.index, queries['key'], queries['group']):
+            if not key:
+                continue
+            # Without a position the query may be in any group
+            groups = [group] if group is not None else position_groups
+            block = [candidate for g in groups for candidate in self.blocks.get((key.split()[-1][0], g), [])]
+            match = difflib.get_close_matches(key, block, n=1, cutoff=cutoff)
+            if match:
+                positions = self.by_key[match[0]]
+                player = self.directory.iloc[positions[-1]]
+                score = difflib.SequenceMatcher(None, key, match[0]).ratio()
+                rows.append((row, player['playerId'], 'fuzzy', score))
+        return pd.DataFrame(rows, columns=['row', 'playerId', 'method', 'score']).set_index('row')
+
+    def resolve(self, names, teams=None, positions=None, cutoff=0.85):
+        '''
+        This function finds the playerId for each name.
+
+        Inputs:
+            names: series of names, "First Last" or "Last, First"
+            teams: optional series of team abbreviations, used to split namesakes
+            positions: optional series of positions (C, LW, RD, G, 'LD, RD', ...); without
+                       them a name can match a player in any position group
+            cutoff: lowest difflib ratio accepted by the fuzzy fallback
+        Outputs:
+            resolved: dataframe aligned with names: input name, matched playerId and
+                      directory name, the pass that matched it (None when
+                      nothing did) and match score
+        '''
+        names = pd.Series(names).reset_index(drop=True)
+        queries = pd.DataFrame({
+            'team': pd.Series(teams).reset_index(drop=True) if teams is not None else None,
+            'group': position_group(pd.Series(positions).reset_index(drop=True)) if positions is not None else None,
+        }, index=names.index)
+        add_name_keys(queries, flip_last_first(names))
+        queries.index.name = 'row'
+
+        # Cheapest, most certain passes first; each only sees what the earlier ones left
+        passes = [
+            (['key'], 'exact'),
+            (['dropped_key'], 'exact (accents dropped)'),
+            (['last', 'first_stem'] + (['group'] if positions is not None else []), 'first-name variant'),
+        ]
+        found = []
+        unmatched = queries
+        for on, method in passes:
+            matches = self._merge_pass(unmatched, on, method)
+            found.append(matches)
+            unmatched = unmatched.drop(index=matches.index)
+        if not unmatched.empty:
+            found.append(self._fuzzy(unmatched, cutoff))
+        found = [f for f in found if not f.empty]
+        if found:
+            matches = pd.concat(found)
+        else:
+            # Nothing matched: keep the columns so the join still fills them with blanks
+            matches = pd.DataFrame(columns=['playerId', 'method', 'score'], index=pd.Index([], name='row'))
+
+        resolved = pd.DataFrame({'input_name': names}).join(matches)
+        resolved['playerId'] = resolved['playerId'].astype('Int64')
+        resolved['name'] = resolved['playerId'].map(self.by_id['name'])
+        return resolved[['input_name', 'playerId', 'name', 'method', 'score']]
+
+    def resolve_salaries(self, cap_df, cutoff=0.85):
+        '''
+        This function attaches playerIds and numeric cap hits to a salary sheet.
+
+        Inputs:
+            cap_df: dataframe in the cap_all.csv layout (PLAYERS, TEAM, POS, CAP HIT, TOTAL)
+            cutoff: lowest difflib ratio accepted by the fuzzy fallback
+        Outputs:
+            matched: dataframe of playerId, name, team, position, cap_hit, total, method, score
+            unmatched: the cap_df rows that could not be matched
+        '''
+        resolved = self.resolve(cap_df['PLAYERS'], cap_df['TEAM'], cap_df['POS'], cutoff)
+        salaries = pd.DataFrame({
+            'playerId': resolved['playerId'],
+            'name': resolved['name'],
+            'salary_name': cap_df['PLAYERS'].values,
+            'team': cap_df['TEAM'].values,
+            'position': cap_df['POS'].values,
+            'cap_hit': parse_currency(cap_df['CAP HIT']).values,
+            'total': parse_currency(cap_df['TOTAL']).values,
+            'method': resolved['method'],
+            'score': resolved['score'],
+        })
+        found = salaries['playerId'].notna()
+        return salaries[found].reset_index(drop=True), cap_df[~found.values].reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    import time
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Match salary sheet names to NHL playerIds')
+    parser.add_argument('--salary-file', default=cap_filepath)
+    parser.add_argument('--cutoff', type=float, default=0.85)
+    parser.add_argument('--output', default=None, help='csv for the matched salaries')
+    parser.add_argument('--unmatched-output', default=None, help='csv for the rows that did not match')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    resolver = NameResolver.build()
+    built = time.perf_counter() - start
+    cap_df = pd.read_csv(args.salary_file)
+    matched, unmatched = resolver.resolve_salaries(cap_df, args.cutoff)
+    elapsed = time.perf_counter() - start
+
+    print(f"Directory: {len(resolver.directory):,} players from every season file ({built:.2f}s)")
+    print(f"Matched {len(matched):,} of {len(cap_df):,} salary rows in {elapsed:.2f}s")
+    print(matched['method'].value_counts().to_string())
+    print(matched[matched['method'] == 'fuzzy'][['salary_name', 'name', 'score']].to_string(index=False))
+    if not unmatched.empty:
+        print(f"\n{len(unmatched)} unmatched:")
+        print(unmatched[['PLAYERS', 'TEAM', 'POS', 'CAP HIT']].to_string(index=False))
+
+    if args.output:
+        matched.to_csv(args.output, index=False)
+    if args.unmatched_output:
+        unmatched.to_csv(args.unmatched_output, index=False)
@@ -1,7 +1,35 @@
+import os
+import threading
+
 import numpy as np
 import pandas as pd
 import joblib
 
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The skater goals model from testing/skater.ipynb, fitted by train_skater_model.py;
+# best_xgb_model_goalie.pkl takes goalie features
+default_model_filepath = os.path.join(project_root, 'models', 'skater_gradient_boosting_model.pkl')
+
+# Model inputs, in the order the models were trained on
+feature_columns = [
+    'I_F_highDangerGoals_all',
+    'I_F_highDangerShots_all',
+    'I_F_lowDangerGoals_all',
+    'I_F_lowDangerShots_all',
+    'I_F_mediumDangerGoals_all',
+    'I_F_mediumDangerShots_all',
+    'I_F_shotAttempts_all',
+    'I_F_shotsOnGoal_all',
+    'PositionEn_encoded'
+]
+
+# LabelEncoder codes the notebooks fit on the position column
+position_codes = {'C': 0, 'D': 1, 'L': 2, 'R': 3}
+
+# Models already loaded in this process, keyed by path
+_models = {}
+_lock = threading.Lock()
+
 # Function to load the model
 def load_model(model_file):
     '''
@@ -15,6 +43,49 @@ def load_model(model_file):
     model = joblib.load(model_file)
     return model
 
+# Function to read the feature names a model was fitted with
+def model_feature_names(model):
+    '''
+    This function returns the columns a model was trained on, when the model recorded them.
+
+    Inputs:
+        model: trained sklearn estimator or xgboost model
+    Outputs:
+        names: list of feature names, or None when the model was fitted on a bare array
+    '''
+    names = getattr(model, 'feature_names_in_', None)
+    if names is None and hasattr(model, 'get_booster'):
+        names = model.get_booster().feature_names
+    return None if names is None else [str(name) for name in names]
+
+# Function to get a model through the process-wide cache
+def get_model(model_file=default_model_filepath):
+    '''
+    This function loads a model once per process and hands back the same object after that.
+    The file is only loaded again if it changes on disk.
+
+    Inputs:
+        model_file: string indicating the file location
+    Outputs:
+        model: the trained model; FileNotFoundError when there is no file, ValueError when
+               it was trained on other features than feature_columns, e.g. the goalie model
+    '''
+    if not os.path.exists(model_file):
+        raise FileNotFoundError(f"No model at {model_file}; fit one with train_skater_model.py or pass another file")
+    key = os.path.abspath(model_file)
+    mtime = os.path.getmtime(model_file)
+    with _lock:
+        cached = _models.get(key)
+        if cached is None or cached[0] != mtime:
+            model = load_model(model_file)
+            names = model_feature_names(model)
+            if names is not None and names != feature_columns:
+                raise ValueError(f"{os.path.basename(model_file)} was trained on {names}, "
+                                 f"not the skater features {feature_columns}")
+            cached = (mtime, model)
+            _models[key] = cached
+        return cached[1]
+
 # Function to create new data
 def create_new_data(
         I_F_highDangerGoals_all,	
@@ -91,26 +162,100 @@ def run_prediction(model, X):
     y = model.predict(X)
     return y
 
+# Function to put a batch of players into model input form
+def feature_matrix(X):
+    '''
+    This function turns a batch of players into the matrix the models expect.
+
+    Inputs:
+        X: dataframe with the feature columns (extra columns are ignored), or a numpy
+           array with one row per player and the feature columns in order
+    Outputs:
+        X_batch: dataframe of float features, one row per player
+    '''
+    if isinstance(X, pd.DataFrame):
+        missing = [column for column in feature_columns if column not in X.columns]
+        if missing:
+            raise ValueError(f"Missing feature columns: {missing}")
+        return X[feature_columns].astype(float)
+    X = np.asarray(X, dtype=float)
+    if X.ndim == 1:
+        X = X.reshape(1, -1)
+    if X.shape[1] != len(feature_columns):
+        raise ValueError(f"Expected {len(feature_columns)} feature columns, got {X.shape[1]}")
+    return pd.DataFrame(X, columns=feature_columns)
+
+# Function to score a whole batch of players
+def predict_batch(X, model=None, model_file=default_model_filepath):
+    '''
+    This function scores every player in X with a single predict call.
+
+    Inputs:
+        X: dataframe or numpy array, see feature_matrix
+        model: trained model, or None to use the cached model from model_file
+        model_file: string indicating the file location
+    Outputs:
+        y: numpy array with one prediction per row of X
+    '''
+    if model is None:
+        model = get_model(model_file)
+    return np.asarray(run_prediction(model, feature_matrix(X)))
+
+# Function to read a season file as model features
+def season_features(filepath, situation='all', chunksize=50000):
+    '''
+    This function reads a MoneyPuck season file in chunks and yields the model features
+    for one situation.
+
+    Inputs:
+        filepath: skaters_20XX.csv style season file
+        situation: situation rows to keep
+        chunksize: rows read per chunk
+    Outputs:
+        chunks: generator of (players, X) dataframes; players has playerId, name and
+                position, X has the feature columns
+    '''
+    raw_columns = [column[:-len('_all')] for column in feature_columns[:-1]]
+    usecols = ['playerId', 'name', 'position', 'situation'] + raw_columns
+    for chunk in pd.read_csv(filepath, usecols=usecols, chunksize=chunksize):
+        chunk = chunk[chunk['situation'] == situation]
+        X = chunk[raw_columns].set_axis(feature_columns[:-1], axis=1)
+        X['PositionEn_encoded'] = chunk['position'].map(position_codes).fillna(-1).astype(int)
+        yield chunk[['playerId', 'name', 'position']], X
+
 # Main function (runs when the file is run through a terminal)
 if __name__ == "__main__":
-    # Load the model from a pickle file
-    model = load_model('/Users/blairjdaniel/lighthouse/lighthouse/NHL/NHL_points_projection/models/gradient_boosting_model.pkl')
-
-    # Package new data
-    X = create_new_data(
-        28.0,	
-        70.0,	
-        62.0,	
-        2022.0,	
-        24.0,	
-        190.0,		
-        3168.0,	
-        1686.0,	
-        1
-    )
-
-    # Run the model to predict
-    y = run_prediction(model, X)
+    import time
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Score a full season file in batches')
+    parser.add_argument('season_file', help='skaters_20XX.csv style season file')
+    parser.add_argument('--model', default=default_model_filepath)
+    parser.add_argument('--situation', default='all')
+    parser.add_argument('--chunksize', type=int, default=50000)
+    parser.add_argument('--output', default=None, help='optional csv for the predictions')
+    args = parser.parse_args()
+
+    # Load the model once, outside the timed loop
+    model = get_model(args.model)
+
+    results = []
+    rows = 0
+    predict_time = 0.0
+    start = time.perf_counter()
+    for players, X in season_features(args.season_file, args.situation, args.chunksize):
+        predict_start = time.perf_counter()
+        y = predict_batch(X, model)
+        predict_time += time.perf_counter() - predict_start
+        rows += len(X)
+        results.append(players.assign(prediction=y))
+    elapsed = time.perf_counter() - start
+
+    predictions = pd.concat(results, ignore_index=True)
+    if args.output:
+        predictions.to_csv(args.output, index=False)
 
     # Print the results
-    print(f"Predicted value: {y[0]}")
\ No newline at end of file
+    print(predictions.sort_values('prediction', ascending=False).head(10).to_string(index=False))
+    print(f"Scored {rows:,} rows in {elapsed:.3f}s ({rows / elapsed:,.0f} rows/sec end to end, "
+          f"{rows / predict_time:,.0f} rows/sec in predict)")
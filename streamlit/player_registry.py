@@ -0,0 +1,172 @@
+import bisect
+import threading
+
+import numpy as np
+import pandas as pd
+
+from game_simulator import team_matrix
+
+class PlayerRegistry:
+    '''
+    Hash lookups by name and playerId plus a sorted prefix index over one player table,
+    so the app's per-click lookups stop scanning the whole roster.
+
+    Build it once per table with registry_for(df); the table is never modified.
+    '''
+
+    def __init__(self, players):
+        self.players = players.reset_index(drop=True)
+        self.names = self.players['name'].tolist()
+
+        # First row wins for a repeated name, matching the app's old .iloc[0]
+        self.row_by_name = {}
+        for row, name in enumerate(self.names):
+            self.row_by_name.setdefault(name, row)
+
+        self.row_by_id = {}
+        for column in ['playerId', 'player_id']:
+            if column in self.players.columns:
+                for row, player_id in enumerate(self.players[column]):
+                    if pd.notna(player_id):
+                        self.row_by_id.setdefault(int(player_id), row)
+                break
+
+        # Sorted (lowercased key, row) pairs holding the full name and each later word of it,
+        # so "mcd" finds "Connor McDavid" as well as "con" does
+        entries = [(word, row) for row, name in enumerate(self.names) for word in str(name).lower().split()[1:]]
+        entries += [(str(name).lower(), row) for row, name in enumerate(self.names)]
+        entries.sort()
+        self.prefix_keys = [key for key, _ in entries]
+        self.prefix_rows = [row for _, row in entries]
+
+        self.rows_by_team = ({team: rows for team, rows in self.players.groupby('team').indices.items()}
+                             if 'team' in self.players.columns else {})
+
+        # Whole-column arrays, pulled out of the table the first time they are asked for
+        self.columns = {}
+        # Metric matrices over every row, keyed by the tuple of metrics
+        self.matrices = {}
+
+    def __contains__(self, name):
+        return name in self.row_by_name
+
+    def __len__(self):
+        return len(self.players)
+
+    def get(self, name, default=None):
+        # One player's full row as a Series, or default when the name is unknown
+        row = self.row_by_name.get(name)
+        return self.players.iloc[row] if row is not None else default
+
+    def get_by_id(self, player_id, default=None):
+        row = self.row_by_id.get(int(player_id))
+        return self.players.iloc[row] if row is not None else default
+
+    def column(self, name):
+        '''
+        This function returns one column of the table as a read-only array, shared by every caller.
+
+        Inputs:
+            name: column name; 'position' falls back to position_encoded as F/D
+        Outputs:
+            values: numpy array with one entry per row
+        '''
+        values = self.columns.get(name)
+        if values is None:
+            if name == 'position' and 'position' not in self.players.columns:
+                values = self.players['position_encoded'].map({0: 'D', 1: 'F'}).to_numpy()
+            else:
+                values = self.players[name].to_numpy()
+            values.flags.writeable = False
+            self.columns[name] = values
+        return values
+
+    def matrix(self, metrics):
+        '''
+        This function returns the metric columns of every row as one float matrix, shared by every caller.
+
+        Inputs:
+            metrics: list of metric names giving the column order, e.g. performance_metrics
+        Outputs:
+            X: read-only numpy array of shape (n_rows, n_metrics), 0 for missing columns
+        '''
+        key = tuple(metrics)
+        X = self.matrices.get(key)
+        if X is None:
+            X = team_matrix(self.players, list(metrics))
+            X.flags.writeable = False
+            self.matrices[key] = X
+        return X
+
+    def frame(self, names):
+        '''
+        This function returns the rows for a list of names in one positional take.
+
+        Inputs:
+            names: iterable of player names; unknown names are skipped
+        Outputs:
+            players: dataframe of the matching rows, in the order given
+        '''
+        rows = [self.row_by_name[name] for name in names if name in self.row_by_name]
+        return self.players.iloc[rows]
+
+    def on_teams(self, teams):
+        # Every player on any of the given teams, in table order
+        rows = [self.rows_by_team[team] for team in teams if team in self.rows_by_team]
+        if not rows:
+            return self.players.iloc[[]]
+        return self.players.iloc[np.sort(np.concatenate(rows))]
+
+    def team_mask(self, teams):
+        # Boolean mask over the table's rows of the players on any of the given teams
+        mask = np.zeros(len(self.players), dtype=bool)
+        for team in teams:
+            if team in self.rows_by_team:
+                mask[self.rows_by_team[team]] = True
+        return mask
+
+    def complete(self, prefix, limit=10):
+        '''
+        This function suggests names that start with prefix, or have a word that does.
+
+        Inputs:
+            prefix: what has been typed so far; case is ignored
+            limit: most suggestions to return
+        Outputs:
+            names: up to limit matching names, full-name matches first
+        '''
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+        start = bisect.bisect_left(self.prefix_keys, prefix)
+        end = bisect.bisect_left(self.prefix_keys, prefix + '\uffff', lo=start)
+        rows = dict.fromkeys(self.prefix_rows[start:end])
+        # Names that start with the prefix read better ahead of last-name hits
+        ordered = sorted(rows, key=lambda row: (not self.names[row].lower().startswith(prefix), self.names[row]))
+        return [self.names[row] for row in ordered[:limit]]
+
+# Registries built in this process, keyed by the table object they index
+_registries = {}
+_lock = threading.Lock()
+
+def registry_for(players):
+    '''
+    This function returns the registry for a table, building it the first time it is seen.
+    load_table hands back the same dataframe until the csv changes, so Streamlit reruns
+    reuse the registry instead of rebuilding it.
+
+    Inputs:
+        players: player dataframe with at least name (and team / playerId for those lookups)
+    Outputs:
+        registry: PlayerRegistry
+    '''
+    key = id(players)
+    with _lock:
+        cached = _registries.get(key)
+        # Holding the table in the cache keeps its id from being reused by another object
+        if cached is None or cached[0] is not players:
+            if len(_registries) >= 8:
+                _registries.clear()  # old tables from csvs that have since changed
+            cached = (players, PlayerRegistry(players))
+            _registries[key] = cached
+        return cached[1]
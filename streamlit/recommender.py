@@ -1,8 +1,6 @@
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics.pairwise import euclidean_distances
-from sklearn.decomposition import PCA
+from instrumentation import timed
 
 # Initialize sets to keep track of recommended players
 recommended_defense = set()
@@ -41,7 +39,11 @@ features = [
     'assists',  
 ]
 
+@timed('preprocess/pca')
 def preprocess_data(player_data):
+    # sklearn is imported on first use, so importing features stays cheap
+    from sklearn.decomposition import PCA
+    from sklearn.preprocessing import StandardScaler
 
     # Scale the data
     scaler = StandardScaler()
@@ -69,8 +71,18 @@ def preprocess_data(player_data):
   
     return pca_df, scaler
 
+# Function to pick the n smallest distances without sorting the whole pool
+def closest_indices_excluding_self(distances, n):
+    k = min(n + 1, len(distances))
+    nearest = np.argpartition(distances, k - 1)[:k]
+    nearest = nearest[np.argsort(distances[nearest], kind='stable')]
+    return nearest[1:]  # Exclude the target player itself
+
 # Function to find the 5 closest players
+@timed('knn query')
 def find_closest_defense(player_name, df, n=5):
+    from sklearn.metrics.pairwise import euclidean_distances
+
     # Get the feature values for the target player
     target_player = df[df['name'] == player_name].drop(columns=['name', 'position', 'team', 'salary'])
     
@@ -78,7 +90,7 @@ def find_closest_defense(player_name, df, n=5):
     distances = euclidean_distances(df.drop(columns=['name', 'position', 'salary', 'team']), target_player).flatten()
     
     # Get the indices of the 5 closest players
-    closest_indices = np.argsort(distances)[1:n+1]  # Exclude the target player itself
+    closest_indices = closest_indices_excluding_self(distances, n)
     
     # Get the player names of the closest players
     closest_players = df.iloc[closest_indices][['name', 'position', 'team', 'salary']]
@@ -88,7 +100,10 @@ def find_closest_defense(player_name, df, n=5):
 
 
 # Function to find the 5 closest players
+@timed('knn query')
 def find_closest_forwards(player_name, df, n=5):
+    from sklearn.metrics.pairwise import euclidean_distances
+
     # Get the feature values for the target player
     target_player = df[df['name'] == player_name].drop(columns=['name', 'position', 'salary', 'team'])
     
@@ -96,14 +111,17 @@ def find_closest_forwards(player_name, df, n=5):
     distances = euclidean_distances(df.drop(columns=['name', 'position', 'salary', 'team']), target_player).flatten()
     
     # Get the indices of the 5 closest players
-    closest_indices = np.argsort(distances)[1:n+1]  # Exclude the target player itself
+    closest_indices = closest_indices_excluding_self(distances, n)
     
     # Get the player names of the closest players
     closest_players = df.iloc[closest_indices][['name', 'position','team', 'salary']]
     
     return closest_players
 
+@timed('knn query')
 def find_closest_goalie(player_name, df, n=5):
+    from sklearn.metrics.pairwise import euclidean_distances
+
     # Get the feature values for the target player
     target_player = df[df['name'] == player_name].drop(columns=['name', 'position', 'salary'])
     
@@ -111,7 +129,7 @@ def find_closest_goalie(player_name, df, n=5):
     distances = euclidean_distances(df.drop(columns=['name', 'position', 'salary']), target_player).flatten()
     
     # Get the indices of the n closest players
-    closest_indices = np.argsort(distances)[1:n+1]  # Exclude the target player itself
+    closest_indices = closest_indices_excluding_self(distances, n)
     
     # Get the player names of the closest players
     closest_players = df.iloc[closest_indices][['name', 'position', 'salary']]
@@ -0,0 +1,170 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from recommender import features
+from instrumentation import timed
+
+position_mapping = {0: 'D', 1: 'F'}
+
+class RecommenderIndex:
+    '''
+    Scaler + PCA fitted once over a player pool, with the projected matrix and a KD-tree
+    kept around so similar-player queries don't refit or rescan anything.
+
+    Build it with RecommenderIndex.fit(player_data), or load_or_fit_index() to reuse the
+    copy saved next to the source csv.
+    '''
+
+    def __init__(self, scaler, pca, projected, players):
+        # sklearn and joblib load with the first index, not with the app
+        from sklearn.neighbors import KDTree
+
+        self.scaler = scaler
+        self.pca = pca
+        self.projected = projected
+        self.players = players.reset_index(drop=True)
+        self.tree = KDTree(projected)
+        # First row wins for a repeated name, as in PlayerRegistry
+        self.row_by_name = {}
+        for row, name in enumerate(self.players['name']):
+            self.row_by_name.setdefault(name, row)
+        self.teams = self.players['team'].to_numpy()
+        # Integer team codes keep the team filter a cheap integer isin
+        self.team_codes, team_names = pd.factorize(self.players['team'])
+        self.code_by_team = {team: code for code, team in enumerate(team_names)}
+        self.salaries = self.players['salary'].to_numpy(dtype=float)
+        self.positions = self.players['position'].to_numpy()
+
+    @classmethod
+    @timed('preprocess/pca')
+    def fit(cls, player_data, n_components=10):
+        '''
+        This function fits the scaler and PCA the same way preprocess_data does.
+
+        Inputs:
+            player_data: dataframe with name, team, salary, the recommender features and
+                         a position or position_encoded column
+            n_components: number of PCA components to keep
+        Outputs:
+            index: RecommenderIndex over player_data
+        '''
+        from sklearn.decomposition import PCA
+        from sklearn.preprocessing import StandardScaler
+
+        scaler = StandardScaler()
+        scaled_data = scaler.fit_transform(player_data[features])
+        pca = PCA(n_components=n_components)
+        projected = np.ascontiguousarray(pca.fit_transform(scaled_data))
+
+        if 'position_encoded' in player_data.columns:
+            positions = player_data['position_encoded'].map(position_mapping)
+        else:
+            positions = player_data['position']
+        players = pd.DataFrame({
+            'name': player_data['name'].values,
+            'position': positions.values,
+            'team': player_data['team'].values,
+            'salary': player_data['salary'].values,
+        })
+        return cls(scaler, pca, projected, players)
+
+    def frame(self):
+        # Same layout as preprocess_data's pca_df, for code that still wants a dataframe
+        pca_df = pd.DataFrame(self.projected, columns=[f'PC{i+1}' for i in range(self.projected.shape[1])])
+        return pd.concat([pca_df, self.players[['name', 'team', 'salary', 'position']]], axis=1)
+
+    def mask(self, teams=None, max_salary=None, position=None, candidates=None):
+        '''
+        This function builds the candidate mask for a query.
+
+        Inputs:
+            teams: iterable of team abbreviations to keep, or None for all
+            max_salary: highest salary to keep, or None for no limit
+            position: 'F' or 'D' to keep, or None for both
+            candidates: boolean array over the pool from a prefilter such as
+                        ArchetypeModel.prefilter, or None
+        Outputs:
+            mask: boolean array over the pool, or None when nothing is filtered
+        '''
+        if teams is None and max_salary is None and position is None and candidates is None:
+            return None
+        mask = np.ones(len(self.players), dtype=bool) if candidates is None else np.array(candidates, dtype=bool)
+        if teams is not None:
+            codes = [self.code_by_team[team] for team in teams if team in self.code_by_team]
+            mask &= np.isin(self.team_codes, codes)
+        if max_salary is not None:
+            mask &= self.salaries <= max_salary
+        if position is not None:
+            mask &= self.positions == position
+        return mask
+
+    @timed('knn query')
+    def query(self, player_name, n=5, teams=None, max_salary=None, position=None, candidates=None):
+        '''
+        This function finds the n players closest to player_name in PCA space.
+
+        Inputs:
+            player_name: name of the target player
+            n: number of players to return
+            teams, max_salary, position, candidates: optional filters, see mask()
+        Outputs:
+            closest_players: dataframe of name, position, team, salary and distance,
+                             nearest first, without the target player
+        '''
+        target = self.row_by_name.get(player_name)
+        if target is None:
+            raise KeyError(f"{player_name} is not in the recommender index.")
+        point = self.projected[target]
+        mask = self.mask(teams, max_salary, position, candidates)
+
+        if mask is None:
+            # Unfiltered queries go straight to the tree
+            distances, rows = self.tree.query(point.reshape(1, -1), k=min(n + 1, len(self.players)))
+            distances, rows = distances[0], rows[0]
+        else:
+            # Filtered queries only look at the candidates that pass, with a partial top-k
+            candidates = np.flatnonzero(mask)
+            diff = self.projected[candidates] - point
+            candidate_distances = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+            k = min(n + 1, len(candidates))
+            if k == 0:
+                return self.players.iloc[[]].assign(distance=[])
+            nearest = np.argpartition(candidate_distances, k - 1)[:k]
+            nearest = nearest[np.argsort(candidate_distances[nearest], kind='stable')]
+            rows, distances = candidates[nearest], candidate_distances[nearest]
+
+        keep = rows != target
+        rows, distances = rows[keep][:n], distances[keep][:n]
+        return self.players.iloc[rows].assign(distance=distances)
+
+    def save(self, filepath):
+        import joblib
+        joblib.dump((self.scaler, self.pca, self.projected, self.players), filepath)
+
+    @classmethod
+    def load(cls, filepath):
+        import joblib
+        scaler, pca, projected, players = joblib.load(filepath)
+        return cls(scaler, pca, projected, players)
+
+def load_or_fit_index(source_filepath, index_filepath=None, n_components=10):
+    '''
+    This function returns the index for a player csv, refitting only when the csv is
+    newer than the saved index.
+
+    Inputs:
+        source_filepath: player csv the index is built from
+        index_filepath: where to keep the fitted index, defaults to <source>.index.joblib
+        n_components: number of PCA components to keep
+    Outputs:
+        index: RecommenderIndex
+    '''
+    if index_filepath is None:
+        index_filepath = os.path.splitext(source_filepath)[0] + '.index.joblib'
+    if os.path.exists(index_filepath) and os.path.getmtime(index_filepath) >= os.path.getmtime(source_filepath):
+        return RecommenderIndex.load(index_filepath)
+    index = RecommenderIndex.fit(pd.read_csv(source_filepath), n_components)
+    index.save(index_filepath)
+    return index
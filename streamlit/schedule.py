@@ -1,12 +1,143 @@
-import pandas as pd
+import threading
 from datetime import datetime
 
-# Load your full schedule (adjust the path and CSV reading as needed)
-schedule_df = pd.read_csv('/Users/blairjdaniel/lighthouse/lighthouse/NHL/NHL_points_projection/files/schedule/schedule.csv')
+import numpy as np
+import pandas as pd
+from data_store import load_table, file_signature
+
+schedule_filepath = '/Users/blairjdaniel/lighthouse/lighthouse/NHL/NHL_points_projection/files/schedule/schedule.csv'
+
+def _day(value):
+    return np.datetime64(pd.Timestamp(value).normalize(), 'ns')
+
+class ScheduleIndex:
+    '''
+    The schedule sorted by date, with the day boundaries and each day's teams worked out
+    once, so "games on a date", "teams in a range" and "a team's next game" are binary
+    searches instead of filters over the whole table.
+    '''
+
+    def __init__(self, schedule_df):
+        games = schedule_df.sort_values('Date', kind='stable').reset_index(drop=True)
+        self.games = games
+        days = games['Date'].dt.normalize().to_numpy().astype('datetime64[ns]')
+
+        # Unique days and where each one starts/ends in the sorted table
+        self.days, self.day_starts = np.unique(days, return_index=True)
+        self.day_ends = np.append(self.day_starts[1:], len(games))
+        home = games['Home Team'].to_numpy()
+        away = games['Away Team'].to_numpy()
+        self.day_teams = [frozenset(home[start:end]) | frozenset(away[start:end])
+                          for start, end in zip(self.day_starts, self.day_ends)]
+
+        # Team -> row positions of its games, in date order, with the matching days
+        rows = np.arange(len(games))
+        team_rows = pd.concat([pd.Series(rows, index=home), pd.Series(rows, index=away)])
+        self.team_games = {team: np.unique(positions.to_numpy())
+                           for team, positions in team_rows.groupby(level=0)}
+        self.team_days = {team: days[positions] for team, positions in self.team_games.items()}
+
+    @classmethod
+    def from_csv(cls, filepath=schedule_filepath):
+        return cls(load_table(filepath, parse_dates=['Date']))
+
+    def _day_range(self, start, end):
+        # Index range into self.days covering [start, end], both inclusive
+        return np.searchsorted(self.days, _day(start), 'left'), np.searchsorted(self.days, _day(end), 'right')
+
+    def games_between(self, start, end):
+        '''
+        This function returns every game from start to end, both days included.
+
+        Inputs:
+            start, end: anything pd.Timestamp accepts; the time of day is ignored
+        Outputs:
+            games: slice of the schedule, in date order
+        '''
+        first, last = self._day_range(start, end)
+        if first >= last:
+            return self.games.iloc[0:0]
+        return self.games.iloc[self.day_starts[first]:self.day_ends[last - 1]]
+
+    def games_on(self, date):
+        return self.games_between(date, date)
+
+    def teams_between(self, start, end):
+        '''
+        This function returns the teams with at least one game from start to end.
+
+        Inputs:
+            start, end: anything pd.Timestamp accepts; the time of day is ignored
+        Outputs:
+            teams: sorted list of team abbreviations
+        '''
+        first, last = self._day_range(start, end)
+        return sorted(frozenset().union(*self.day_teams[first:last]))
+
+    def teams_on(self, date):
+        first, last = self._day_range(date, date)
+        return sorted(self.day_teams[first]) if first < last else []
+
+    def games_for_team(self, team, start=None, end=None):
+        '''
+        This function returns one team's games, optionally limited to a date range.
+
+        Inputs:
+            team: team abbreviation
+            start, end: optional range, both days included
+        Outputs:
+            games: slice of the schedule, in date order
+        '''
+        positions = self.team_games.get(team)
+        if positions is None:
+            return self.games.iloc[0:0]
+        days = self.team_days[team]
+        first = 0 if start is None else np.searchsorted(days, _day(start), 'left')
+        last = len(days) if end is None else np.searchsorted(days, _day(end), 'right')
+        return self.games.iloc[positions[first:last]]
+
+    def next_game(self, team, date):
+        # First game on or after date, or None when the team has no games left
+        games = self.games_for_team(team, start=date)
+        return games.iloc[0] if not games.empty else None
+
+# Index built in this process and the file signature it was built from
+_index = {}
+_lock = threading.Lock()
+
+def get_schedule(filepath=schedule_filepath):
+    '''
+    This function returns the schedule index, rebuilding it only when the csv changes.
+
+    Inputs:
+        filepath: schedule csv with Date, Away Team and Home Team columns
+    Outputs:
+        index: ScheduleIndex
+    '''
+    signature = file_signature(filepath)
+    with _lock:
+        cached = _index.get(filepath)
+        if cached is None or cached[0] != signature:
+            cached = (signature, ScheduleIndex.from_csv(filepath))
+            _index[filepath] = cached
+        return cached[1]
+
+def today():
+    # Worked out on every call so a long-running server moves on after midnight
+    return pd.Timestamp(datetime.today().strftime('%Y-%m-%d'))
+
+def get_today_schedule(filepath=schedule_filepath):
+    return get_schedule(filepath).games_on(today())
 
-# Convert the 'Date' column to datetime (if not already)
-schedule_df['Date'] = pd.to_datetime(schedule_df['Date'])
+def get_teams_playing(filepath=schedule_filepath):
+    return get_schedule(filepath).teams_on(today())
 
-# Filter the schedule to just today's games (normalize both timestamps)
-today = pd.to_datetime(datetime.today().strftime('%Y-%m-%d'))
-today_schedule = schedule_df[schedule_df['Date'].dt.normalize() == today]
\ No newline at end of file
+# Older code imports these names directly; they are looked up when the import runs, so
+# `from schedule import today_schedule` holds that day's games until it runs again (each
+# Streamlit rerun does). Code that outlives a rerun should call get_today_schedule()
+def __getattr__(name):
+    if name == 'schedule_df':
+        return get_schedule().games
+    if name == 'today_schedule':
+        return get_today_schedule()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
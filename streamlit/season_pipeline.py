@@ -0,0 +1,313 @@
+import os
+import re
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_store import project_root, cache_folder, file_signature, content_hash
+
+skaters_folder = os.path.join(project_root, 'files', 'skaters')
+goalies_folder = os.path.join(project_root, 'files', 'goalies')
+master_copies_folder = os.path.join(project_root, 'files', 'master_copies')
+# Rebuilt tables land here for a look before they are copied over the master copies
+staging_folder = os.path.join(project_root, 'files', 'staging')
+pipeline_cache_folder = os.path.join(cache_folder, 'season_pipeline')
+
+# MoneyPuck skater column -> master table column, as in the forwards/defence notebooks
+skater_rename = {
+    'I_F_dZoneShiftStarts': 'd_zone_shift_starts',
+    'I_F_giveaways': 'giveaways',
+    'I_F_goals': 'goals',
+    'I_F_highDangerGoals': 'high_danger_goals',
+    'I_F_highDangerShots': 'high_danger_shots',
+    'I_F_hits': 'hits',
+    'I_F_lowDangerGoals': 'low_danger_goals',
+    'I_F_lowDangerShots': 'low_danger_shots',
+    'I_F_mediumDangerGoals': 'medium_danger_goals',
+    'I_F_mediumDangerShots': 'medium_danger_shots',
+    'I_F_missedShots': 'missed_shots',
+    'I_F_oZoneShiftStarts': 'o_zone_shift_starts',
+    'I_F_penalityMinutes': 'penalty_minutes',
+    'I_F_points': 'points',
+    'I_F_reboundGoals': 'rebound_goals',
+    'I_F_rebounds': 'rebounds',
+    'I_F_shifts': 'shifts',
+    'I_F_shotAttempts': 'shot_attempts',
+    'I_F_shotsOnGoal': 'shots_on_goal',
+    'I_F_takeaways': 'takeaways',
+    'faceoffsLost': 'faceoffs_lost',
+    'faceoffsWon': 'faceoffs_won',
+    'icetime': 'icetime',
+    'onIce_corsiPercentage': 'on_ice_corsi_percentage',
+    'onIce_fenwickPercentage': 'on_ice_fenwick_percentage',
+    'penaltiesDrawn': 'penalties_drawn',
+    'shotsBlockedByPlayer': 'shots_blocked_by_player',
+    'I_F_primaryAssists': 'primary_assists',
+    'I_F_secondaryAssists': 'secondary_assists',
+}
+
+# MoneyPuck goalie column -> master table column, as in the goalies notebook
+goalie_rename = {
+    'icetime': 'icetime',
+    'xGoals': 'x_goals',
+    'goals': 'goals',
+    'unblocked_shot_attempts': 'unblocked_shot_attempts',
+    'xRebounds': 'x_rebounds',
+    'rebounds': 'rebounds',
+    'xFreeze': 'x_freeze',
+    'freeze': 'freeze',
+    'xOnGoal': 'x_on_goal',
+    'ongoal': 'on_goal',
+    'xPlayStopped': 'x_play_stopped',
+    'playStopped': 'play_stopped',
+    'xPlayContinuedInZone': 'x_play_continued_in_zone',
+    'playContinuedInZone': 'play_continued_in_zone',
+    'xPlayContinuedOutsideZone': 'x_play_continued_outside_zone',
+    'playContinuedOutsideZone': 'play_continued_outside_zone',
+    'flurryAdjustedxGoals': 'flurry_adjusted_x_goals',
+    'lowDangerShots': 'low_danger_shots',
+    'mediumDangerShots': 'medium_danger_shots',
+    'highDangerShots': 'high_danger_shots',
+    'lowDangerxGoals': 'low_danger_x_goals',
+    'mediumDangerxGoals': 'medium_danger_x_goals',
+    'highDangerxGoals': 'high_danger_x_goals',
+    'lowDangerGoals': 'low_danger_goals',
+    'mediumDangerGoals': 'medium_danger_goals',
+    'highDangerGoals': 'high_danger_goals',
+    'blocked_shot_attempts': 'blocked_shot_attempts',
+    'penalityMinutes': 'penalty_minutes',
+    'penalties': 'penalties',
+}
+
+# Column order of forwards_rec.csv / defense_rec.csv
+skater_master_columns = [
+    'name', 'd_zone_shift_starts', 'giveaways', 'goals', 'high_danger_goals', 'high_danger_shots',
+    'hits', 'low_danger_goals', 'low_danger_shots', 'medium_danger_goals', 'medium_danger_shots',
+    'missed_shots', 'o_zone_shift_starts', 'penalty_minutes', 'points', 'rebound_goals', 'rebounds',
+    'shifts', 'shot_attempts', 'shots_on_goal', 'takeaways', 'faceoffs_lost', 'faceoffs_won',
+    'games_played', 'icetime', 'on_ice_corsi_percentage', 'on_ice_fenwick_percentage',
+    'penalties_drawn', 'shots_blocked_by_player', 'assists', 'position_encoded', 'position',
+]
+
+# Percentages are averaged over games instead of being summed
+percentage_columns = ['on_ice_corsi_percentage', 'on_ice_fenwick_percentage']
+
+key_columns = ['playerId', 'season', 'name', 'team', 'position', 'situation', 'games_played']
+key_dtypes = {
+    'playerId': 'int32',
+    'season': 'int16',
+    'name': 'object',
+    'team': 'category',
+    'position': 'category',
+    'situation': 'category',
+    'games_played': 'int16',
+}
+
+table_specs = {
+    'skaters': {'folder': skaters_folder, 'prefix': 'skaters', 'rename': skater_rename},
+    'goalies': {'folder': goalies_folder, 'prefix': 'goalies', 'rename': goalie_rename},
+}
+
+def season_files(kind):
+    '''
+    This function lists the yearly files for skaters or goalies.
+
+    Inputs:
+        kind: 'skaters' or 'goalies'
+    Outputs:
+        files: dict of season -> filepath, e.g. {2024: '.../skaters_2024.csv'}
+    '''
+    spec = table_specs[kind]
+    pattern = re.compile(rf"^{spec['prefix']}_(\d{{4}})\.csv$")
+    files = {}
+    for filename in sorted(os.listdir(spec['folder'])):
+        match = pattern.match(filename)
+        if match:
+            files[int(match.group(1))] = os.path.join(spec['folder'], filename)
+    return files
+
+def read_season_totals(filepath, kind, situations=('all',), chunksize=2000):
+    '''
+    This function streams one season file and keeps only the columns and situations needed.
+
+    Inputs:
+        filepath: season csv
+        kind: 'skaters' or 'goalies'
+        situations: situation splits to keep
+        chunksize: rows parsed per chunk
+    Outputs:
+        totals: dataframe with one row per (playerId, situation), season totals with the
+                master column names; percentages are multiplied by games played so they
+                can be summed across seasons
+    '''
+    rename = table_specs[kind]['rename']
+    dtype = dict(key_dtypes, **{column: 'float32' for column in rename})
+    chunks = []
+    for chunk in pd.read_csv(filepath, usecols=key_columns + list(rename), dtype=dtype, chunksize=chunksize):
+        chunks.append(chunk[chunk['situation'].isin(situations)])
+    totals = pd.concat(chunks, ignore_index=True).rename(columns=rename)
+    totals['situation'] = totals['situation'].astype(str)
+
+    for column in percentage_columns:
+        if column in totals.columns:
+            totals[column] = totals[column] * totals['games_played']
+    return totals
+
+def combine_totals(partials):
+    '''
+    This function adds up season totals per player and turns them into per-game rates.
+
+    Inputs:
+        partials: list of dataframes from read_season_totals
+    Outputs:
+        rates: dataframe with one row per (playerId, situation); name, team and position
+               come from the player's latest season. Percentages keep the master tables'
+               meaning: each season's percentage summed, over career games played, the
+               way the notebooks built forwards_rec.csv
+    '''
+    totals = pd.concat(partials, ignore_index=True).sort_values('season')
+    stats = [column for column in totals.columns if column not in key_columns]
+    # Back from games-weighted to each season's own percentage before summing
+    games = totals['games_played'].clip(lower=1).to_numpy(dtype=np.float64)
+    for column in percentage_columns:
+        if column in totals.columns:
+            totals[column] = totals[column].to_numpy(dtype=np.float64) / games
+    grouped = totals.groupby(['playerId', 'situation'], sort=False)
+
+    rates = grouped[stats + ['games_played']].sum()
+    latest = grouped[['name', 'team', 'position']].last()
+    games = rates['games_played'].clip(lower=1).to_numpy(dtype=np.float64)
+    rates[stats] = rates[stats].to_numpy(dtype=np.float64) / games[:, None]
+    return latest.join(rates).reset_index()
+
+def skater_master_tables(rates):
+    '''
+    This function shapes skater rates like forwards_rec.csv / defense_rec.csv.
+
+    Inputs:
+        rates: dataframe from combine_totals for skaters
+    Outputs:
+        forwards, defense: dataframes in the master table layout
+    '''
+    rates = rates.copy()
+    rates['assists'] = rates.pop('primary_assists') + rates.pop('secondary_assists')
+    rates['position'] = np.where(rates['position'].astype(str) == 'D', 'D', 'F')
+    rates['position_encoded'] = (rates['position'] == 'F').astype(int)
+    rates = rates[['playerId', 'team'] + skater_master_columns].sort_values('name', kind='stable')
+    return (rates[rates['position'] == 'F'].reset_index(drop=True),
+            rates[rates['position'] == 'D'].reset_index(drop=True))
+
+def goalie_master_table(rates):
+    # Same layout as goalies_rec.csv, plus the ids the notebooks dropped
+    rates = rates.assign(position='G')
+    columns = ['playerId', 'name', 'team'] + list(goalie_rename.values()) + ['games_played', 'position']
+    return rates[columns].sort_values('name', kind='stable').reset_index(drop=True)
+
+def _load_manifest(path):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+def _save_manifest(manifest, path):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+def season_partials(kind, situations=('all',), folder=pipeline_cache_folder):
+    '''
+    This function returns every season's totals, re-reading only season files that changed
+    since the last run. A file counts as changed when its size/mtime moved and its sha1 no
+    longer matches.
+
+    Inputs:
+        kind: 'skaters' or 'goalies'
+        situations: situation splits to keep
+        folder: where per-season totals and the manifest are kept
+    Outputs:
+        partials: dict of season -> totals dataframe
+        rebuilt: list of seasons that were re-read from csv
+    '''
+    os.makedirs(folder, exist_ok=True)
+    manifest_path = os.path.join(folder, f'{kind}_manifest.json')
+    manifest = _load_manifest(manifest_path)
+    situations_key = ','.join(sorted(situations))
+
+    partials = {}
+    rebuilt = []
+    for season, filepath in season_files(kind).items():
+        partial_path = os.path.join(folder, f'{kind}_{season}_{situations_key.replace(",", "-")}.pkl')
+        entry = manifest.get(str(season))
+        signature = file_signature(filepath)
+
+        if entry is not None and entry['situations'] == situations_key and os.path.exists(partial_path):
+            if entry['signature'] == signature:
+                partials[season] = pd.read_pickle(partial_path)
+                continue
+            digest = content_hash(filepath)
+            if entry['hash'] == digest:
+                entry['signature'] = signature
+                partials[season] = pd.read_pickle(partial_path)
+                continue
+        else:
+            digest = content_hash(filepath)
+
+        partials[season] = read_season_totals(filepath, kind, situations)
+        partials[season].to_pickle(partial_path)
+        manifest[str(season)] = {'signature': signature, 'hash': digest, 'situations': situations_key}
+        rebuilt.append(season)
+
+    _save_manifest(manifest, manifest_path)
+    return partials, rebuilt
+
+def run_pipeline(kind='skaters', situation='all', output_folder=staging_folder):
+    '''
+    This function refreshes the master per-game tables from the season files.
+
+    Inputs:
+        kind: 'skaters' (writes forwards_rec.csv and defense_rec.csv) or 'goalies'
+              (writes goalies_rec.csv)
+        situation: situation split the master tables are built from
+        output_folder: where the csvs are written, None to skip writing; the staging
+                       folder by default, master_copies_folder to replace what the app reads
+    Outputs:
+        tables: dict of table name -> dataframe
+        rebuilt: list of seasons that were re-read from csv
+    '''
+    partials, rebuilt = season_partials(kind, situations=(situation,))
+    rates = combine_totals(list(partials.values()))
+
+    if kind == 'skaters':
+        forwards, defense = skater_master_tables(rates)
+        tables = {'forwards_rec': forwards, 'defense_rec': defense}
+    else:
+        tables = {'goalies_rec': goalie_master_table(rates)}
+
+    if output_folder is not None:
+        os.makedirs(output_folder, exist_ok=True)
+        for table_name, df in tables.items():
+            df.to_csv(os.path.join(output_folder, f'{table_name}.csv'), index=False)
+    return tables, rebuilt
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Rebuild the master per-game tables from the season files')
+    parser.add_argument('kind', nargs='?', choices=list(table_specs), default='skaters')
+    parser.add_argument('--situation', default='all')
+    parser.add_argument('--output-folder', default=staging_folder,
+                        help=f'staging by default; pass {master_copies_folder} to replace the master copies')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    tables, rebuilt = run_pipeline(args.kind, args.situation, args.output_folder)
+    elapsed = time.perf_counter() - start
+
+    print(f"Seasons re-read: {rebuilt if rebuilt else 'none, all cached'}")
+    for table_name, df in tables.items():
+        print(f"{table_name}: {len(df)} players")
+    print(f"Finished in {elapsed:.2f}s")
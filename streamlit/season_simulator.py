@@ -0,0 +1,338 @@
+import os
+import pickle
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from game_simulator import performance_metrics, loadings_vector, team_matrix, score_matrix
+from lineup_solver import team_composition, player_positions
+from monte_carlo import load_player_ids, team_draw_layout, draw_team_totals
+from game_logs import game_log_folders, list_game_log_files, folder_signature
+from schedule import schedule_filepath, get_schedule
+from data_store import cache_folder, write_atomic
+from instrumentation import timed
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+season_cache_folder = os.path.join(cache_folder, 'season_sim')
+
+# Standings points: a win, and the loser's point for a game decided past regulation
+win_points = 2
+overtime_loss_points = 1
+# Share of NHL games that go to overtime or a shootout; the closest games get the loser point
+overtime_share = 0.23
+
+divisions = {
+    'Atlantic': ['BOS', 'BUF', 'DET', 'FLA', 'MTL', 'OTT', 'TBL', 'TOR'],
+    'Metropolitan': ['CAR', 'CBJ', 'NJD', 'NYI', 'NYR', 'PHI', 'PIT', 'WSH'],
+    'Central': ['CHI', 'COL', 'DAL', 'MIN', 'NSH', 'STL', 'UTA', 'WPG'],
+    'Pacific': ['ANA', 'CGY', 'EDM', 'LAK', 'SEA', 'SJS', 'VAN', 'VGK'],
+}
+conferences = {'Eastern': ['Atlantic', 'Metropolitan'], 'Western': ['Central', 'Pacific']}
+
+# Full names some schedule exports use, mapped to the abbreviations in the player tables
+team_abbreviations = {
+    'Anaheim Ducks': 'ANA', 'Arizona Coyotes': 'ARI', 'Boston Bruins': 'BOS', 'Buffalo Sabres': 'BUF',
+    'Calgary Flames': 'CGY', 'Carolina Hurricanes': 'CAR', 'Chicago Blackhawks': 'CHI',
+    'Colorado Avalanche': 'COL', 'Columbus Blue Jackets': 'CBJ', 'Dallas Stars': 'DAL',
+    'Detroit Red Wings': 'DET', 'Edmonton Oilers': 'EDM', 'Florida Panthers': 'FLA',
+    'Los Angeles Kings': 'LAK', 'Minnesota Wild': 'MIN', 'Montreal Canadiens': 'MTL',
+    'Montréal Canadiens': 'MTL', 'Nashville Predators': 'NSH', 'New Jersey Devils': 'NJD',
+    'New York Islanders': 'NYI', 'New York Rangers': 'NYR', 'Ottawa Senators': 'OTT',
+    'Philadelphia Flyers': 'PHI', 'Pittsburgh Penguins': 'PIT', 'San Jose Sharks': 'SJS',
+    'Seattle Kraken': 'SEA', 'St. Louis Blues': 'STL', 'St Louis Blues': 'STL',
+    'Tampa Bay Lightning': 'TBL', 'Toronto Maple Leafs': 'TOR', 'Utah Hockey Club': 'UTA',
+    'Utah Mammoth': 'UTA', 'Vancouver Canucks': 'VAN', 'Vegas Golden Knights': 'VGK',
+    'Washington Capitals': 'WSH', 'Winnipeg Jets': 'WPG',
+}
+
+# Results computed in this process, keyed by the inputs' hash
+_results = {}
+_lock = threading.Lock()
+
+def team_lineups(players, loadings, composition=team_composition):
+    '''
+    This function dresses each team's best players: the top composition[pos] players of
+    each position by the loadings score, the same 3F/2D shape as the head-to-head game.
+
+    Inputs:
+        players: dataframe with name, team, position (or position_encoded) and the metric columns
+        loadings: dict from load_feature_loadings
+        composition: dict of position -> players dressed
+    Outputs:
+        lineups: dataframe of the dressed players sorted by team, with a 'score' column
+    '''
+    scores, _ = score_matrix(team_matrix(players), loadings_vector(loadings))
+    players = players.assign(position=player_positions(players), score=scores)
+    depth = players.groupby(['team', 'position'])['score'].rank(method='first', ascending=False)
+    dressed = depth <= players['position'].map(composition).fillna(0)
+    return players[dressed].sort_values(['team', 'score'], ascending=[True, False], kind='stable')
+
+def season_games(schedule_index, teams):
+    '''
+    This function turns the schedule into team-index arrays grouped by date.
+
+    Inputs:
+        schedule_index: ScheduleIndex
+        teams: list of team abbreviations, giving the index of each team
+    Outputs:
+        home, away: arrays of team indices, one entry per game, in date order
+        day_bounds: list of (start, end) ranges into home/away, one per game day
+    '''
+    position = {team: i for i, team in enumerate(teams)}
+    games = schedule_index.games
+    home = games['Home Team'].map(lambda team: position[team_abbreviations.get(team, team)]).to_numpy()
+    away = games['Away Team'].map(lambda team: position[team_abbreviations.get(team, team)]).to_numpy()
+    return home, away, list(zip(schedule_index.day_starts.tolist(), schedule_index.day_ends.tolist()))
+
+def schedule_teams(schedule_index):
+    # Every team in the schedule, as abbreviations
+    games = schedule_index.games
+    names = pd.concat([games['Home Team'], games['Away Team']]).unique()
+    return sorted({team_abbreviations.get(name, name) for name in names})
+
+def _season_chunk(args):
+    layout, home, away, day_bounds, n_seasons, overtime_margin, home_advantage, seed = args
+    rng = np.random.default_rng(seed)
+    n_teams = len(layout[0])
+    points = np.zeros((n_seasons, n_teams), dtype=np.int32)
+    wins = np.zeros((n_seasons, n_teams), dtype=np.int32)
+    seasons = np.arange(n_seasons)[:, None]
+    # Every game on a date is played at once, for every replay in the chunk
+    for start, end in day_bounds:
+        totals = draw_team_totals(layout, rng, n_seasons)
+        day_home, day_away = home[start:end], away[start:end]
+        home_totals = totals[:, day_home] + home_advantage
+        away_totals = totals[:, day_away]
+        # A dead heat on raw totals is a shootout coin flip
+        home_won = (home_totals > away_totals) | ((home_totals == away_totals) & (rng.random(home_totals.shape) < 0.5))
+        overtime = np.abs(home_totals - away_totals) <= overtime_margin
+        winners = np.where(home_won, day_home, day_away)
+        losers = np.where(home_won, day_away, day_home)
+        # add.at, in case a bad schedule row has a team twice on one date
+        np.add.at(points, (seasons, winners), win_points)
+        np.add.at(points, (seasons, losers), overtime * overtime_loss_points)
+        np.add.at(wins, (seasons, winners), 1)
+    return points, wins
+
+def overtime_margin(layout, home, away, day_bounds, rng, share=overtime_share, home_advantage=0.0):
+    '''
+    This function finds the score margin below which a game counts as going past regulation,
+    so that about `share` of the schedule's games do.
+
+    Inputs:
+        layout: tuple from team_draw_layout
+        home, away, day_bounds: from season_games
+        rng: numpy Generator for the calibration season
+        share: wanted share of overtime games
+        home_advantage: added to the home team's unscaled total
+    Outputs:
+        margin: unscaled score difference
+    '''
+    # One replay of the schedule, drawn day by day like the real thing
+    margins = []
+    for start, end in day_bounds:
+        totals = draw_team_totals(layout, rng, 1)[0]
+        margins.append(np.abs(totals[home[start:end]] + home_advantage - totals[away[start:end]]))
+    return float(np.quantile(np.concatenate(margins), share)) if margins else 0.0
+
+def playoff_teams(points, wins, teams, rng, playoff_spots=16):
+    '''
+    This function works out who makes the playoffs in every replayed season.
+
+    With the full 32-team league it is the NHL format: the top three of each division plus
+    the two best of the rest in each conference. Otherwise the top playoff_spots overall.
+    Ties on points go to the team with more wins, then a coin flip.
+
+    Inputs:
+        points: array of shape (n_seasons, n_teams)
+        wins: array of shape (n_seasons, n_teams)
+        teams: list of team abbreviations in column order
+        rng: numpy Generator for the coin flips
+        playoff_spots: spots used when the teams do not fill the NHL divisions
+    Outputs:
+        made: boolean array of shape (n_seasons, n_teams)
+    '''
+    key = points * 1000.0 + wins + rng.random(points.shape) * 0.5
+    made = np.zeros(points.shape, dtype=bool)
+    seasons = np.arange(len(points))[:, None]
+    position = {team: i for i, team in enumerate(teams)}
+
+    if set(teams) != {team for members in divisions.values() for team in members}:
+        top = np.argsort(-key, axis=1)[:, :playoff_spots]
+        made[seasons, top] = True
+        return made
+
+    for conference in conferences.values():
+        for division in conference:
+            members = np.array([position[team] for team in divisions[division]])
+            top = members[np.argsort(-key[:, members], axis=1)[:, :3]]
+            made[seasons, top] = True
+        members = np.array([position[team] for division in conference for team in divisions[division]])
+        wild_card_key = np.where(made[:, members], -np.inf, key[:, members])
+        made[seasons, members[np.argsort(-wild_card_key, axis=1)[:, :2]]] = True
+    return made
+
+def _inputs_hash(lineups, loadings, schedule_index, options, player_ids, folders=game_log_folders):
+    # Roster snapshot, loadings, schedule, game logs and run options together decide the results
+    sha1 = hashlib.sha1()
+    roster = lineups[['team', 'name'] + [metric for metric in performance_metrics if metric in lineups.columns]]
+    sha1.update(pd.util.hash_pandas_object(roster, index=False).to_numpy().tobytes())
+    # The ids pick which game logs each dressed player draws from
+    sha1.update(repr([(name, int(player_ids[name]) if name in player_ids else None) for name in sorted(roster['name'])]).encode())
+    sha1.update(loadings_vector(loadings).tobytes())
+    schedule = schedule_index.games[['Date', 'Home Team', 'Away Team']]
+    sha1.update(pd.util.hash_pandas_object(schedule, index=False).to_numpy().tobytes())
+    # Refreshed game logs change the pools every draw comes from
+    sha1.update(folder_signature(list_game_log_files(folders)).encode())
+    sha1.update(repr(options).encode())
+    return sha1.hexdigest()[:16]
+
+@timed('season simulation')
+def simulate_season(players, loadings, schedule_index=None, n_seasons=1000, seed=0, n_workers=None,
+                    scaling_factor=1000, home_advantage=0.0, player_ids=None, composition=team_composition,
+                    folder=season_cache_folder, use_cache=True):
+    '''
+    This function replays the whole schedule n_seasons times and reports each team's
+    point totals and playoff odds.
+
+    Each team dresses its best 3F/2D by the loadings score. In every game each logged player
+    plays one of their real games (as in simulate_game_monte_carlo) and the higher total wins.
+    The closest overtime_share of games count as going past regulation, and their loser
+    takes a point.
+
+    Inputs:
+        players: dataframe of every rostered player with name, team, position and the metric columns
+        loadings: dict from load_feature_loadings
+        schedule_index: ScheduleIndex, the shared one from get_schedule() when None
+        n_seasons: number of replays
+        seed: seed for the draws; cached results are only reused for the same seed
+        n_workers: processes to split the replays across; None uses every core
+        scaling_factor: divisor applied to the strength column, as in simulate_game
+        home_advantage: added to the home team's unscaled total
+        player_ids: dict of name -> playerId, loaded from name_playerId.csv when None
+        composition: dict of position -> players dressed
+        folder: where results are cached on disk
+        use_cache: reuse and store results keyed by the hash of the inputs
+    Outputs:
+        results: dict with teams (list), points and wins (arrays of shape (n_seasons, n_teams)),
+                 playoffs (boolean array of the same shape) and summary (dataframe per team
+                 with mean, std and percentiles of points and playoff odds)
+    '''
+    schedule_index = schedule_index if schedule_index is not None else get_schedule()
+    lineups = team_lineups(players, loadings, composition)
+    options = (n_seasons, seed, scaling_factor, home_advantage, sorted(composition.items()))
+    if player_ids is None:
+        player_ids = load_player_ids()
+    key = _inputs_hash(lineups, loadings, schedule_index, options, player_ids)
+    cache_path = os.path.join(folder, f'season_{key}.pkl')
+
+    if use_cache:
+        with _lock:
+            if key in _results:
+                return _results[key]
+        if os.path.exists(cache_path):
+            with open(cache_path, 'rb') as f:
+                results = pickle.load(f)
+            with _lock:
+                _results[key] = results
+            return results
+
+    teams = schedule_teams(schedule_index)
+    home, away, day_bounds = season_games(schedule_index, teams)
+    lineups = lineups[lineups['team'].isin(teams)]
+    team_of = lineups['team'].map({team: i for i, team in enumerate(teams)}).to_numpy()
+    layout = team_draw_layout(lineups, team_of, len(teams), loadings, player_ids, game_log_folders)
+
+    # Split the replays into independent streams so workers never share draws
+    n_workers = n_workers or os.cpu_count() or 1
+    n_chunks = max(1, min(n_workers, n_seasons))
+    sizes = np.full(n_chunks, n_seasons // n_chunks)
+    sizes[:n_seasons % n_chunks] += 1
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks + 1)
+    rng = np.random.default_rng(seeds[-1])
+    margin = overtime_margin(layout, home, away, day_bounds, rng, overtime_share, home_advantage)
+    tasks = [(layout, home, away, day_bounds, int(size), margin, home_advantage, child)
+             for size, child in zip(sizes, seeds)]
+
+    if n_chunks == 1:
+        chunks = [_season_chunk(tasks[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=n_chunks) as executor:
+            chunks = list(executor.map(_season_chunk, tasks))
+    points = np.concatenate([chunk[0] for chunk in chunks])
+    wins = np.concatenate([chunk[1] for chunk in chunks])
+    playoffs = playoff_teams(points, wins, teams, rng)
+
+    summary = pd.DataFrame({
+        'team': teams,
+        'strength': lineups.groupby('team')['score'].sum().reindex(teams, fill_value=0).to_numpy() / scaling_factor,
+        'mean_points': points.mean(axis=0),
+        'std_points': points.std(axis=0),
+        'p05': np.percentile(points, 5, axis=0),
+        'p50': np.percentile(points, 50, axis=0),
+        'p95': np.percentile(points, 95, axis=0),
+        'playoff_odds': playoffs.mean(axis=0),
+    }).sort_values('mean_points', ascending=False).reset_index(drop=True)
+    results = {'teams': teams, 'points': points, 'wins': wins, 'playoffs': playoffs, 'summary': summary}
+
+    if use_cache:
+        os.makedirs(folder, exist_ok=True)
+
+        def write_results(tmp_path):
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(results, f, protocol=pickle.HIGHEST_PROTOCOL)
+        write_atomic(write_results, cache_path)
+        with _lock:
+            _results[key] = results
+    return results
+
+def points_distribution(results):
+    '''
+    This function tabulates how often each team finished on each point total.
+
+    Inputs:
+        results: dict from simulate_season
+    Outputs:
+        distribution: dataframe indexed by point total with one column per team,
+                      holding the share of replays that ended on that total
+    '''
+    points = results['points']
+    counts = np.stack([np.bincount(points[:, i], minlength=points.max() + 1) for i in range(points.shape[1])], axis=1)
+    distribution = pd.DataFrame(counts / len(points), columns=results['teams'])
+    # Nobody ends on fewer points than the lowest total seen
+    return distribution.iloc[np.flatnonzero(counts.any(axis=1))[0]:]
+
+
+if __name__ == "__main__":
+    import time
+    import argparse
+    from game_simulator import load_feature_loadings
+    from schedule import ScheduleIndex
+
+    master_copies_folder = os.path.join(project_root, 'files', 'master_copies')
+
+    parser = argparse.ArgumentParser(description='Replay the season schedule and report playoff odds')
+    parser.add_argument('--players', nargs='+', default=[os.path.join(master_copies_folder, 'forward_final.csv'),
+                                                         os.path.join(master_copies_folder, 'defense_final.csv')])
+    parser.add_argument('--schedule', default=schedule_filepath)
+    parser.add_argument('--loadings', default=os.path.join(master_copies_folder, 'feature_loadings.csv'))
+    parser.add_argument('--seasons', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--home-advantage', type=float, default=0.0)
+    parser.add_argument('--no-cache', action='store_true')
+    args = parser.parse_args()
+
+    players = pd.concat([pd.read_csv(filepath) for filepath in args.players], ignore_index=True)
+    schedule_index = ScheduleIndex.from_csv(args.schedule)
+    start = time.perf_counter()
+    results = simulate_season(players, load_feature_loadings(args.loadings), schedule_index,
+                              args.seasons, args.seed, args.workers, home_advantage=args.home_advantage,
+                              use_cache=not args.no_cache)
+    elapsed = time.perf_counter() - start
+
+    print(results['summary'].round(3).to_string(index=False))
+    print(f"{args.seasons:,} seasons of {len(schedule_index.games):,} games in {elapsed:.2f}s")
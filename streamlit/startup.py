@@ -0,0 +1,135 @@
+import os
+import re
+import sys
+import json
+import time
+import subprocess
+import threading
+from datetime import datetime, timezone
+
+# Taken when the app first imports this module, before anything heavy is loaded
+process_start = time.perf_counter()
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+streamlit_folder = os.path.dirname(os.path.abspath(__file__))
+startup_log_filepath = os.environ.get('NHL_STARTUP_LOG', os.path.join(project_root, 'files', 'cache', 'startup.jsonl'))
+# Seconds a new worker may take to reach its first render
+startup_budget = float(os.environ.get('NHL_STARTUP_BUDGET', '3.0'))
+
+# What streamlit_app.py imports before its first render; feature modules load on first click
+app_modules = ['pandas', 'data_store', 'player_registry', 'lineup', 'schedule', 'instrumentation',
+               'game_simulator', 'streamlit']
+
+# Milestones of the first script run in this process, in seconds since process_start
+_marks = {}
+_reported = False
+_lock = threading.Lock()
+
+def mark(name):
+    # Record a milestone once per process; reruns after the first one are ignored
+    with _lock:
+        if not _reported:
+            _marks.setdefault(name, time.perf_counter() - process_start)
+
+def report_first_render(filepath=None):
+    '''
+    This function closes out the first run: it marks the first render and appends the
+    startup milestones to the startup log. Later calls do nothing.
+
+    Inputs:
+        filepath: log to append to, defaults to startup_log_filepath
+    Outputs:
+        record: dict with the milestones and whether the budget was met, or None after the first call
+    '''
+    global _reported
+    mark('first render')
+    with _lock:
+        if _reported:
+            return None
+        _reported = True
+        marks = dict(_marks)
+    record = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'pid': os.getpid(),
+        'marks': marks,
+        'time_to_first_render': marks['first render'],
+        'budget': startup_budget,
+        'within_budget': marks['first render'] <= startup_budget,
+    }
+    filepath = filepath or startup_log_filepath
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    with open(filepath, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+    return record
+
+def import_breakdown(modules=app_modules, python=sys.executable, cwd=streamlit_folder):
+    '''
+    This function times importing modules in a fresh interpreter with -X importtime, so
+    nothing already loaded in this process hides the cost.
+
+    Inputs:
+        modules: module names to import, in order; ones that are not installed are skipped
+        python: interpreter to run
+        cwd: folder the app modules are imported from
+    Outputs:
+        imports: dataframe with one row per module loaded: module, depth (0 for the ones
+                 asked for, more for what they pulled in), self_ms and cumulative_ms; as in
+                 importtime, a module is listed after everything it imported
+    '''
+    code = '\n'.join(f'try:\n    import {module}\nexcept ImportError:\n    pass' for module in modules)
+    result = subprocess.run([python, '-X', 'importtime', '-c', code], cwd=cwd, capture_output=True, text=True)
+    pattern = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+    rows = []
+    for line in result.stderr.splitlines():
+        match = pattern.match(line)
+        if match:
+            rows.append((match.group(4), len(match.group(3)) // 2, int(match.group(1)) / 1000, int(match.group(2)) / 1000))
+
+    import pandas as pd
+    return pd.DataFrame(rows, columns=['module', 'depth', 'self_ms', 'cumulative_ms'])
+
+def startup_summary(filepath=None):
+    '''
+    This function rolls the startup log up into percentiles per milestone.
+
+    Inputs:
+        filepath: log to read, defaults to startup_log_filepath
+    Outputs:
+        summary: dataframe indexed by milestone with workers, p50, p95 and max in seconds
+    '''
+    import pandas as pd
+    rows = []
+    with open(filepath or startup_log_filepath) as f:
+        for line in f:
+            record = json.loads(line)
+            rows += [{'milestone': name, 'seconds': seconds} for name, seconds in record['marks'].items()]
+    grouped = pd.DataFrame(rows).groupby('milestone', sort=False)['seconds']
+    return pd.DataFrame({'workers': grouped.size(), 'p50': grouped.median(), 'p95': grouped.quantile(0.95),
+                         'max': grouped.max()})
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Report what a cold start of the app spends its time on')
+    parser.add_argument('--modules', nargs='+', default=app_modules)
+    parser.add_argument('--top', type=int, default=15, help='heaviest packages to list')
+    parser.add_argument('--budget', type=float, default=startup_budget, help='seconds allowed for the imports')
+    parser.add_argument('--log', default=startup_log_filepath)
+    args = parser.parse_args()
+
+    imports = import_breakdown(args.modules)
+    requested = imports[(imports['depth'] == 0) & imports['module'].isin(args.modules)]
+    total = requested['cumulative_ms'].sum() / 1000
+    print('Imports before the first render (fresh interpreter):')
+    print(requested[['module', 'cumulative_ms']].round(1).to_string(index=False))
+    print(f'\nHeaviest of the {len(imports):,} modules loaded:')
+    print(imports.nlargest(args.top, 'self_ms')[['module', 'self_ms', 'cumulative_ms']].round(1).to_string(index=False))
+    heavy = [module for module in ['sklearn', 'scipy', 'joblib', 'aiohttp'] if module in set(imports['module'])]
+    print(f"\nLoaded eagerly that should be lazy: {', '.join(heavy) if heavy else 'none'}")
+    print(f'Total import time: {total:.2f}s (budget {args.budget:.2f}s)')
+
+    if os.path.exists(args.log):
+        print('\nTime to first render, from the app workers that have started:')
+        print(startup_summary(args.log).round(3).to_string())
+    sys.exit(0 if total <= args.budget else 1)
@@ -2,30 +2,59 @@ import sys
 import os
 sys.path.append(os.path.abspath('/Users/blairjdaniel/lighthouse/lighthouse/NHL/NHL_points_projection'))
 
+# First, so the startup clock starts before the heavy imports
+import startup
 import streamlit as st
 import pandas as pd
-from ai_team_generator import generate_ai_team
-from recommender import find_closest_defense, find_closest_forwards, preprocess_data
-from game_simulator import simulate_game, generate_feature_loadings, preprocess_player_data, create_results_table, performance_metrics
+# The AI team, recommender, lineup solver and Monte Carlo modules (and
+# sklearn behind them) are imported inside the buttons that use them, not before the first render
+from game_simulator import simulate_game_frames, load_feature_loadings, generate_feature_loadings, preprocess_player_data, create_results_table, performance_metrics
+from data_store import load_table
+from player_registry import registry_for
+from lineup import Lineup, ScoredLineup
 import streamlit.components.v1 as components
-from schedule import today_schedule
+from schedule import get_schedule, today
+import instrumentation
+from instrumentation import stage
 
+startup.mark('imports')
 st.set_page_config(layout="wide")
 
+# Per-rerun timings, only recorded when NHL_INSTRUMENTATION=1
+profile_mode = None
+if instrumentation.enabled:
+    profile_mode = st.sidebar.selectbox('Profile this rerun', [None, 'cprofile', 'tracemalloc'])
+instrumentation.start_run('app', profile=profile_mode)
+
 # Define the folder path for the master copies
 master_copies_folder = '/Users/blairjdaniel/lighthouse/lighthouse/NHL/NHL_points_projection/files/master_copies/'
-# Load the forward and defense CSV files
-forward_df = pd.read_csv(os.path.join(master_copies_folder, 'forward_final.csv'))
-defense_df = pd.read_csv(os.path.join(master_copies_folder, 'defense_final.csv'))
+# Load the forward and defense tables through the snapshot cache; reruns reuse the same frames.
+# The skater schema drops the saved index columns and downcasts to float32/int16/categoricals.
+forward_df = load_table(os.path.join(master_copies_folder, 'forward_final.csv'), schema='skaters')
+defense_df = load_table(os.path.join(master_copies_folder, 'defense_final.csv'), schema='skaters')
 
 # Combine the two DataFrames into one
-all_players_data = pd.read_csv('/Users/blairjdaniel/lighthouse/lighthouse/NHL/NHL_points_projection/files/master_copies/player_team_2025.csv')
+all_players_data = load_table(os.path.join(master_copies_folder, 'player_team_2025.csv'), schema='skaters')
+# Name/playerId lookups and autocomplete over the same table, built once per process
+player_registry = registry_for(all_players_data)
+
+
 
+startup.mark('data load')
 
+# Fit the recommender scaler/PCA once per process, on the first search rather than at startup;
+# the fitted index is saved next to each csv
+@st.cache_resource
+def load_recommender_indexes():
+    from recommender_index import load_or_fit_index
+    return (load_or_fit_index(os.path.join(master_copies_folder, 'forward_final.csv')),
+            load_or_fit_index(os.path.join(master_copies_folder, 'defense_final.csv')))
 
-# Now call your preprocessing function on the combined DataFrame.
-scaled_defense_df, defense_scaler = preprocess_data(forward_df)
-scaled_forward_df, forward_scaler = preprocess_data(defense_df)
+# Archetypes over every skater season, fitted once and saved under files/cache
+@st.cache_resource
+def load_archetype_model():
+    from archetypes import build_archetypes
+    return build_archetypes()
 
 
 # # Load all player data from a single CSV
@@ -46,22 +75,27 @@ scaled_forward_df, forward_scaler = preprocess_data(defense_df)
 loadings_filepath = '/Users/blairjdaniel/lighthouse/lighthouse/NHL/NHL_points_projection/files/master_copies/feature_loadings.csv'
 if not os.path.exists(loadings_filepath):
     generate_feature_loadings(all_players_data, performance_metrics, loadings_filepath)
+loadings_dict = load_feature_loadings(loadings_filepath)
 
-# Initialize session state for selected players, closest options, AI team, & salary caps
+# Initialize session state for selected players, closest options, AI team, & salary caps.
+# Teams are Lineups: row numbers into the shared registry, not copies of the player rows.
+# The user's team also keeps its score as running totals, updated on every add/remove/swap.
 if 'selected_players' not in st.session_state:
-    st.session_state.selected_players = []
+    st.session_state.selected_players = ScoredLineup(player_registry, loadings_dict)
 if 'closest_options' not in st.session_state:
     st.session_state.closest_options = []  # This will be used if "Find Similar Players" is clicked
 if 'ai_generated_team' not in st.session_state:
-    st.session_state.ai_generated_team = []  # Placeholder for AI-generated team
+    st.session_state.ai_generated_team = Lineup(player_registry)  # Placeholder for AI-generated team
 if 'user_salary_cap' not in st.session_state:
     st.session_state.user_salary_cap = 30000000  # $30,000,000 for the user
 if 'ai_salary_cap' not in st.session_state:
     st.session_state.ai_salary_cap = 30000000  # $30,000,000 for the AI
+if 'pending_swap' not in st.session_state:
+    st.session_state.pending_swap = None  # Best swap found for the user's team, waiting to be made
 if 'pending_player' not in st.session_state:
-    st.session_state.pending_player = None  # Track the player pending confirmation
+    st.session_state.pending_player = None  # Name of the player pending confirmation
 if 'first_selected_player' not in st.session_state:
-    st.session_state.first_selected_player = None  # Track the first player selected by the user
+    st.session_state.first_selected_player = None  # Name of the first player selected by the user
 if 'filtered_players' not in st.session_state:
     st.session_state.filtered_players = None  # Track the filtered players by salary
 
@@ -71,41 +105,46 @@ MAX_DEFENSE = 2
 
 st.markdown("<h1 style='text-align: center;'>NHL Player Recommender</h1>", unsafe_allow_html=True)
 
-if today_schedule.empty:
-    st.write("No games scheduled for today.")
-else:
-    # Wrap all game tables in one container that prevents wrapping
-    schedule_html = """
-    <<div style="width: 100%; text-align: center; white-space: nowrap; overflow-x: auto; color: white;">
-    """
+# Look tonight's games up on every rerun; the index itself is only rebuilt when the csv changes
+schedule_index = get_schedule()
+today_schedule = schedule_index.games_on(today())
+
+with stage('render'):
+    if today_schedule.empty:
+        st.write("No games scheduled for today.")
+    else:
+        # Wrap all game tables in one container that prevents wrapping
+        schedule_html = """
+        <<div style="width: 100%; text-align: center; white-space: nowrap; overflow-x: auto; color: white;">
+        """
     
-    # Iterate over each game and wrap each table in an inline-block div
-    for index, row in today_schedule.iterrows():
-        schedule_html += f"""
-        <div style="display: inline-block; margin: 5px;">
-            <table style="border-collapse: collapse; text-align: center;">
-                <tr>
-                    <td style="border: 1px solid #ddd; padding: 2px; font-weight: bold; width: 25px;">{row['Date'].strftime('%I:%M %p')}</td>
-                    <td style="border: 1px solid #ddd; padding: 2px; width: 25px;">
-                        <table style="border-collapse: collapse; text-align: center;">
-                            <tr>
-                                <td style="padding: 4px; font-weight: bold;">{row['Away Team']}</td>
-                            </tr>
-                            <tr>
-                                <td style="padding: 4px;">{row['Home Team']}</td>
-                            </tr>
-                        </table>
-                    </td>
-                </tr>
-            </table>
+        # Iterate over each game and wrap each table in an inline-block div
+        for index, row in today_schedule.iterrows():
+            schedule_html += f"""
+            <div style="display: inline-block; margin: 5px;">
+                <table style="border-collapse: collapse; text-align: center;">
+                    <tr>
+                        <td style="border: 1px solid #ddd; padding: 2px; font-weight: bold; width: 25px;">{row['Date'].strftime('%I:%M %p')}</td>
+                        <td style="border: 1px solid #ddd; padding: 2px; width: 25px;">
+                            <table style="border-collapse: collapse; text-align: center;">
+                                <tr>
+                                    <td style="padding: 4px; font-weight: bold;">{row['Away Team']}</td>
+                                </tr>
+                                <tr>
+                                    <td style="padding: 4px;">{row['Home Team']}</td>
+                                </tr>
+                            </table>
+                        </td>
+                    </tr>
+                </table>
+            </div>
+            """
+
+        # Close the container div
+        schedule_html += """
         </div>
         """
-
-    # Close the container div
-    schedule_html += """
-    </div>
-    """
-    components.html(schedule_html, height=200)
+        components.html(schedule_html, height=200)
     
 
 
@@ -126,33 +165,33 @@ with col1:
     st.markdown("<h2 style='text-align: center;'>Player Search</h2>", unsafe_allow_html=True)
     player_type = st.selectbox('Select player type:', ['Defense', 'Forward'])
     target_player_name = st.text_input('Enter the name of the target player:')
+    # Suggest full names for a partial entry
+    if target_player_name and target_player_name not in player_registry:
+        suggestions = player_registry.complete(target_player_name)
+        if suggestions:
+            target_player_name = st.selectbox('Matching players:', suggestions)
     salary_limit = st.number_input('Enter maximum salary:', min_value=0, value=0)
+    same_archetype = st.checkbox('Only players of the same archetype')
 
     def make_clickable(name):
         return f'<a href="https://puckpedia.com/player/{name.replace(" ", "-")}" class="pp-player">{name}</a>'
 
         # Get the teams playing tonight from the schedule
-    if today_schedule.empty:
+    teams_playing = schedule_index.teams_on(today())
+    if not teams_playing:
         st.warning("No games scheduled for today.")
-        teams_playing = []  # or you can skip filtering if you want to show all players
-    else:
-        # Assume schedule has 'Home Team' and 'Away Team' columns
-        home_teams = today_schedule['Home Team'].unique().tolist()
-        away_teams = today_schedule['Away Team'].unique().tolist()
-        teams_playing = list(set(home_teams + away_teams))
 
 
     if st.button('Find Similar Players'):
-        if target_player_name == "" or target_player_name not in all_players_data['name'].tolist():
+        if target_player_name == "" or target_player_name not in player_registry:
             st.warning("Please enter a valid target player name from the data.")
         else:
-            target_player_row = all_players_data[all_players_data['name'] == target_player_name]
-            if not target_player_row.empty:
-                target_player_salary = target_player_row.iloc[0]['salary']
-                st.write(f"{target_player_name}'s Salary: ${target_player_salary:,}")
+            target_player_row = player_registry.get(target_player_name)
+            target_player_salary = target_player_row['salary']
+            st.write(f"{target_player_name}'s Salary: ${target_player_salary:,}")
 
             # Check that the selected player type matches the target player's actual position.
-            target_player_position = target_player_row.iloc[0]['position']
+            target_player_position = target_player_row['position']
             if player_type == 'Defense' and target_player_position != 'D':
                 st.warning("Please choose a Defenseman as the target player.")
                 st.stop()  # Stop further execution within this button event.
@@ -160,21 +199,18 @@ with col1:
                 st.warning("Please choose a Forward as the target player.")
                 st.stop()
             
-            if player_type == 'Defense':
-                # Filter defense_df by teams playing tonight
-                filtered_defense_df = defense_df[defense_df['team'].isin(teams_playing)]
-                # Check if the target player's row exists in the filtered DataFrame
-                if filtered_defense_df[filtered_defense_df['name'] == target_player_name].empty:
-                    st.warning("The selected target player is not playing tonight. Please choose a player who is playing.")
-                    st.stop()
-                closest_players = find_closest_defense(target_player_name, filtered_defense_df)
-            elif player_type == 'Forward':
-                # Filter forward_df by teams playing tonight
-                filtered_forward_df = forward_df[forward_df['team'].isin(teams_playing)]
-                if filtered_forward_df[filtered_forward_df['name'] == target_player_name].empty:
-                    st.warning("The selected target player is not playing tonight. Please choose a player who is playing.")
-                    st.stop()
-                closest_players = find_closest_forwards(target_player_name, filtered_forward_df)
+            # Query only players on teams playing tonight
+            forward_index, defense_index = load_recommender_indexes()
+            player_index = defense_index if player_type == 'Defense' else forward_index
+            target_row = player_index.row_by_name.get(target_player_name)
+            if target_row is None or player_index.teams[target_row] not in teams_playing:
+                st.warning("The selected target player is not playing tonight. Please choose a player who is playing.")
+                st.stop()
+            candidates = None
+            if same_archetype:
+                pool_df = defense_df if player_type == 'Defense' else forward_df
+                candidates = load_archetype_model().prefilter(pool_df, target_player_name)
+            closest_players = player_index.query(target_player_name, n=5, teams=teams_playing, candidates=candidates)
 
             if closest_players.empty:
                 st.warning(f"No similar players found for {target_player_name} playing tonight.")
@@ -192,7 +228,7 @@ with col1:
 if st.button('Filter Players by Salary'):
     if salary_limit > 0:
          # First, filter players to only those playing tonight
-        players_playing = all_players_data[all_players_data['team'].isin(teams_playing)]
+        players_playing = player_registry.on_teams(teams_playing)
         filtered_players = players_playing[players_playing['salary'] <= salary_limit]
         if filtered_players.empty:
             st.warning(f"No players found with salary under ${salary_limit:,}.")
@@ -222,24 +258,23 @@ with col2:
             if st.session_state.closest_options:
                 options = st.session_state.closest_options
             else:
-                options = all_players_data['name'].tolist()
+                options = player_registry.names
             
             selected_player = st.selectbox('Select a player to add to your team:', options)
             submit_button = st.form_submit_button(label='Add Selected Player')
             
             if submit_button:
-                player_row = all_players_data[all_players_data['name'] == selected_player]
-                if player_row.empty:
+                player_row = player_registry.get(selected_player)
+                if player_row is None:
                     st.error("Player not found in data.")
                 else:
-                    position_encoded = player_row.iloc[0]['position_encoded']
-                    salary = player_row.iloc[0]['salary']
-                    team = player_row.iloc[0]['team']
+                    position_encoded = player_row['position_encoded']
+                    salary = player_row['salary']
                     
-                    count_forwards = sum(1 for p in st.session_state.selected_players if p['position_encoded'] == 1)
-                    count_defense = sum(1 for p in st.session_state.selected_players if p['position_encoded'] == 0)
+                    count_forwards = st.session_state.selected_players.count('F')
+                    count_defense = st.session_state.selected_players.count('D')
                     
-                    if selected_player in [p['name'] for p in st.session_state.selected_players]:
+                    if selected_player in st.session_state.selected_players:
                         st.warning(f"{selected_player} is already on the team.")
                     elif position_encoded == 1 and count_forwards >= MAX_FORWARDS:
                         st.warning("The team already has 3 forwards.")
@@ -248,32 +283,23 @@ with col2:
                     elif st.session_state.user_salary_cap - salary < 0:
                         st.warning("Adding this player would exceed your salary cap.")
                     else:
-                        st.session_state.pending_player = {
-                            'name': selected_player,
-                            'position_encoded': position_encoded,
-                            'team': team,
-                            'salary': salary
-                        }
+                        st.session_state.pending_player = selected_player
                         st.warning(f"Are you sure you want to add {selected_player} to your team?")
 
         if st.session_state.pending_player:
             if st.button('Confirm'):
-                player = st.session_state.pending_player
-                st.session_state.selected_players.append(player)
-                st.session_state.user_salary_cap -= player['salary']
+                player_name = st.session_state.pending_player
+                st.session_state.selected_players.add(player_name)
+                st.session_state.user_salary_cap -= player_registry.get(player_name)['salary']
                 st.session_state.pending_player = None
-                st.success(f"Added {player['name']} to your team.")
+                st.success(f"Added {player_name} to your team.")
                 if st.session_state.first_selected_player is None:
-                    st.session_state.first_selected_player = player
+                    st.session_state.first_selected_player = player_name
         
         st.write('Selected Players:')
-        selected_players_df = pd.DataFrame(st.session_state.selected_players)
-        
-        if 'position_encoded' in selected_players_df.columns:
-            selected_players_df['position'] = selected_players_df['position_encoded'].map({0: 'D', 1: 'F'})
+        selected_players_df = st.session_state.selected_players.display_frame()
         
         if 'team' in selected_players_df.columns and 'salary' in selected_players_df.columns:
-            selected_players_df = selected_players_df[['name', 'position', 'team', 'salary']]
             st.write(selected_players_df)
         else:
             st.warning("Team or salary information is missing for some players.")
@@ -283,9 +309,28 @@ with col2:
             colA, colB = st.columns([1, 4])
             if colA.button('Remove', key=f"remove_{index}"):
                 st.session_state.user_salary_cap += row['salary']
-                st.session_state.selected_players = [p for p in st.session_state.selected_players if p['name'] != row['name']]
+                st.session_state.selected_players.remove(row['name'])
                 st.experimental_rerun()
             colB.write(f"{row['name']} ({row['position']}) - ${row['salary']:,}")
+
+        # Running score of the team, and the single swap that would raise it most under the cap
+        if st.session_state.selected_players:
+            st.write(f"Team score: {st.session_state.selected_players.score:,.1f}")
+            if st.button('Suggest Best Swap'):
+                # Only players on teams playing tonight, like the similar-player search
+                st.session_state.pending_swap = st.session_state.selected_players.best_swap(
+                    st.session_state.user_salary_cap, candidates=player_registry.team_mask(teams_playing))
+                if st.session_state.pending_swap is None:
+                    st.info("No single swap with a player playing tonight improves the team under the remaining cap.")
+            swap = st.session_state.pending_swap
+            if swap and swap['out'] in st.session_state.selected_players and swap['in'] not in st.session_state.selected_players:
+                st.write(f"Swap {swap['out']} for {swap['in']}: +{swap['gain']:,.1f} score, "
+                         f"${swap['salary_change']:+,} salary")
+                if st.button('Make Swap'):
+                    st.session_state.selected_players.swap(swap['out'], swap['in'])
+                    st.session_state.user_salary_cap -= swap['salary_change']
+                    st.session_state.pending_swap = None
+                    st.experimental_rerun()
         
         st.markdown('</div>', unsafe_allow_html=True)
 
@@ -294,21 +339,22 @@ with st.container():
     st.header(f'AI-Generated Team (Remaining Cap: ${st.session_state.ai_salary_cap:,})')
     if st.button('Generate AI Team'):
         if st.session_state.first_selected_player:
+            from ai_team_generator import generate_ai_team
 
             # Filter available players by teams playing tonight
             valid_defense = defense_df[defense_df['team'].isin(teams_playing)]
             valid_forward = forward_df[forward_df['team'].isin(teams_playing)]
 
-            st.session_state.ai_generated_team, st.session_state.ai_salary_cap = generate_ai_team(
-                all_players_data, defense_df, forward_df, st.session_state.first_selected_player
+            ai_team, st.session_state.ai_salary_cap = generate_ai_team(
+                player_registry, defense_df, forward_df,
+                player_registry.get(st.session_state.first_selected_player), loadings_dict
             )
+            st.session_state.ai_generated_team = Lineup.from_names(player_registry, [p['name'] for p in ai_team])
         else:
             st.warning("Please select a player for your team first.")
     # Display AI-generated team table
-    ai_generated_df = pd.DataFrame(st.session_state.ai_generated_team)
-    if not ai_generated_df.empty:
-        ai_generated_df['position'] = ai_generated_df['position_encoded'].map({0: 'D', 1: 'F'})
-        ai_generated_df = ai_generated_df[['name', 'position', 'team', 'salary']]
+    if st.session_state.ai_generated_team:
+        ai_generated_df = st.session_state.ai_generated_team.display_frame()
         st.write('AI-Generated Players:')
         st.write(ai_generated_df)
     else:
@@ -316,27 +362,31 @@ with st.container():
 
 st.markdown('</div>', unsafe_allow_html=True)
 
+# Best lineups over the whole pool and the salary vs score frontier under the cap
+with st.expander('Top lineups and salary frontier'):
+    n_lineups = st.slider('Lineups to show', 10, 100, 100, step=10)
+    if st.button('Find Top Lineups'):
+        from lineup_solver import best_lineups, lineup_frontier
+        with stage('top lineups'):
+            st.session_state.top_lineups = best_lineups(forward_df, defense_df, loadings_dict, n_lineups)
+            st.session_state.lineup_frontier = lineup_frontier(forward_df, defense_df, loadings_dict)
+    if st.session_state.get('top_lineups') is not None:
+        st.write(f'Best {len(st.session_state.top_lineups)} lineups under the cap:')
+        st.dataframe(st.session_state.top_lineups, hide_index=True)
+        st.write('Best score at each total salary:')
+        st.line_chart(st.session_state.lineup_frontier, x='salary', y='score')
+        st.dataframe(st.session_state.lineup_frontier, hide_index=True)
+
 # Simulate the game
+monte_carlo_mode = st.checkbox('Also simulate 100,000 games drawn from real game logs')
 if st.button('Simulate Game'):
-    user_team_basic = pd.DataFrame(st.session_state.selected_players)
-    ai_team_basic = pd.DataFrame(st.session_state.ai_generated_team)
-
-    # Merge the basic info with full data (all_players_data) to capture all performance metrics.
-    # This assumes that 'name' is unique in all_players_data.
-    user_team_df = all_players_data[all_players_data['name'].isin(user_team_basic['name'])].copy()
-    ai_team_df = all_players_data[all_players_data['name'].isin(ai_team_basic['name'])].copy()
-
-    user_team_df = user_team_df.drop(columns=['Unnamed: 0'])
-    ai_team_df = ai_team_df.drop(columns=['Unnamed: 0'])
-
-    user_team_filepath = '/Users/blairjdaniel/lighthouse/lighthouse/NHL/NHL_points_projection/files/team_data/user_team.csv'
-    ai_team_filepath = '/Users/blairjdaniel/lighthouse/lighthouse/NHL/NHL_points_projection/files/team_data/ai_team.csv'
-
-    user_team_df.to_csv(user_team_filepath, index=False)
-    ai_team_df.to_csv(ai_team_filepath, index=False)
+    # Full rows (all performance metrics) straight from the lineups' registry rows
+    user_team_df = st.session_state.selected_players.frame()
+    ai_team_df = st.session_state.ai_generated_team.frame()
 
-    final_user_score, final_ai_score, user_player_scores, ai_player_scores, user_contributions, ai_contributions = simulate_game(
-        user_team_filepath, ai_team_filepath, loadings_filepath
+    # Score the teams in memory; nothing is written to files/team_data
+    final_user_score, final_ai_score, user_player_scores, ai_player_scores, user_contributions, ai_contributions = simulate_game_frames(
+        user_team_df, ai_team_df, loadings_dict
     )
 
     st.write(f"Team User: {final_user_score}")
@@ -348,4 +398,17 @@ if st.button('Simulate Game'):
         st.success("Team AI wins!")
 
     results_table = create_results_table(user_player_scores, ai_player_scores, user_contributions, ai_contributions)
-    st.write(results_table)
\ No newline at end of file
+    with stage('render'):
+        st.write(results_table)
+
+    if monte_carlo_mode:
+        from monte_carlo import simulate_game_monte_carlo
+        monte_carlo_results = simulate_game_monte_carlo(user_team_df, ai_team_df, loadings_dict, n_games=100000)
+        st.write(f"Team User win probability: {monte_carlo_results['user_win_probability']:.1%}")
+        st.write(f"Team AI win probability: {monte_carlo_results['ai_win_probability']:.1%}")
+        st.write(monte_carlo_results['summary'])
+
+# Close out this rerun's timings and show them when instrumentation is on
+instrumentation.render_panel(st, instrumentation.end_run())
+# Logs time-to-first-render once per worker process (python startup.py summarizes it)
+startup.report_first_render()
@@ -0,0 +1,172 @@
+import os
+import re
+import json
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+master_copies_folder = os.path.join(project_root, 'files', 'master_copies')
+
+# Integer columns shared by every player table; anything else numeric is a rate and
+# becomes float32 unless the schema says its whole-number columns are counts
+id_columns = {'playerId': 'int32', 'player_id': 'int32', 'salary': 'int32', 'season': 'int16'}
+count_columns = {'games_played': 'int16', 'position_encoded': 'int16'}
+category_columns = ['team', 'position', 'situation']
+
+schemas = {
+    # Per-game tables: forwards_rec / defense_rec / forward_final / player_team_2025 ...
+    'skaters': {
+        'required': ['name', 'games_played', 'goals', 'assists', 'icetime'],
+        'integers': dict(id_columns, **count_columns),
+        'infer_counts': False,
+    },
+    'goalies': {
+        'required': ['name', 'icetime', 'goals', 'x_goals'],
+        'integers': dict(id_columns, **count_columns),
+        'infer_counts': False,
+    },
+    # Season totals such as other/mp_all_skater.csv, where every event column is a count
+    'skater_totals': {
+        'required': ['name', 'games_played', 'goals', 'icetime'],
+        'integers': dict(id_columns, **count_columns),
+        'infer_counts': True,
+    },
+}
+
+# Bump when apply_schema changes how it types a table, so cached snapshots are rebuilt
+schema_version = 1
+
+# Function to fingerprint a schema's definition
+def schema_hash(schema):
+    '''
+    This function hashes everything apply_schema does to a table under one schema, so a
+    snapshot cached under an older definition is not served after the schema is edited.
+
+    Inputs:
+        schema: key of schemas, e.g. 'skaters'
+    Outputs:
+        digest: short sha1 hex digest
+    '''
+    definition = {'version': schema_version, 'spec': schemas[schema], 'categories': category_columns}
+    return hashlib.sha1(json.dumps(definition, sort_keys=True).encode()).hexdigest()[:12]
+
+# Master csv -> schema, for the report below
+master_tables = {
+    os.path.join(master_copies_folder, 'forwards_rec.csv'): 'skaters',
+    os.path.join(master_copies_folder, 'defense_rec.csv'): 'skaters',
+    os.path.join(master_copies_folder, 'forwards_rec_two.csv'): 'skaters',
+    os.path.join(master_copies_folder, 'defense_rec_two.csv'): 'skaters',
+    os.path.join(master_copies_folder, 'goalies_rec.csv'): 'goalies',
+    os.path.join(master_copies_folder, 'goalies_rec_two.csv'): 'goalies',
+    os.path.join(project_root, 'files', 'other', 'mp_all_skater.csv'): 'skater_totals',
+}
+
+def junk_columns(columns):
+    '''
+    This function finds the columns left behind by round trips through to_csv/read_csv:
+    saved indexes ("Unnamed: 0", "Unnamed: 0.1") and repeats that pandas renamed "shifts.1".
+
+    Inputs:
+        columns: list of column names
+    Outputs:
+        junk: list of the columns to drop, the first copy of a repeated column is kept
+    '''
+    names = set(columns)
+    junk = []
+    for column in columns:
+        column = str(column)
+        repeat = re.match(r'^(.+)\.\d+$', column)
+        if column.startswith('Unnamed:') or (repeat and repeat.group(1) in names):
+            junk.append(column)
+    return junk
+
+def _integer_dtype(values, dtype, column):
+    # Whole numbers that fit the dtype; a nullable dtype when the column has gaps
+    present = values.dropna()
+    if not np.array_equal(present, np.round(present)):
+        raise ValueError(f"Column {column} should hold whole numbers")
+    info = np.iinfo(dtype)
+    if len(present) and (present.min() < info.min or present.max() > info.max):
+        raise ValueError(f"Column {column} does not fit in {dtype}")
+    return dtype.capitalize() if len(present) < len(values) else dtype
+
+def apply_schema(df, schema):
+    '''
+    This function checks a player table against its schema and shrinks it: junk columns
+    are dropped, ids and counts become small integers, team/position/situation become
+    categoricals and the remaining numbers become float32.
+
+    Inputs:
+        df: table as read from csv
+        schema: key of schemas, e.g. 'skaters'
+    Outputs:
+        typed: the checked, downcast table
+        report: dict with the dropped columns and the memory in bytes before and after
+    '''
+    spec = schemas[schema]
+    missing = [column for column in spec['required'] if column not in df.columns]
+    if missing:
+        raise ValueError(f"Table is missing {missing} for the {schema} schema")
+
+    before = int(df.memory_usage(deep=True).sum())
+    dropped = junk_columns(list(df.columns))
+    typed = df.drop(columns=dropped)
+
+    converted = {}
+    for column in typed.columns:
+        values = typed[column]
+        if column in spec['integers']:
+            converted[column] = values.astype(_integer_dtype(values, spec['integers'][column], column))
+        elif column in category_columns:
+            converted[column] = values.astype('category')
+        elif pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            whole = spec['infer_counts'] and values.notna().all() and np.array_equal(values, np.round(values))
+            if whole and values.min() >= np.iinfo('int16').min and values.max() <= np.iinfo('int16').max:
+                converted[column] = values.astype('int16')
+            else:
+                converted[column] = values.astype('float32')
+    typed = typed.assign(**converted)
+
+    after = int(typed.memory_usage(deep=True).sum())
+    return typed, {'schema': schema, 'dropped': dropped, 'memory_before': before, 'memory_after': after}
+
+def memory_report(reports):
+    '''
+    This function lays schema reports out as a table.
+
+    Inputs:
+        reports: dict of table name -> report from apply_schema
+    Outputs:
+        table: dataframe with before/after MB, the saving and the dropped columns, plus a total row
+    '''
+    table = pd.DataFrame({
+        'table': list(reports),
+        'before_mb': [report['memory_before'] / 1e6 for report in reports.values()],
+        'after_mb': [report['memory_after'] / 1e6 for report in reports.values()],
+        'dropped': [', '.join(report['dropped']) for report in reports.values()],
+    })
+    total = pd.DataFrame({'table': ['total'], 'before_mb': [table['before_mb'].sum()],
+                          'after_mb': [table['after_mb'].sum()], 'dropped': ['']})
+    table = pd.concat([table, total], ignore_index=True)
+    table.insert(3, 'saved', 1 - table['after_mb'] / table['before_mb'])
+    return table
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Check the master tables against their schemas and report memory')
+    parser.add_argument('tables', nargs='*', help='csv files to check, as path=schema; all known master tables when empty')
+    args = parser.parse_args()
+
+    tables = dict(table.split('=', 1) for table in args.tables) if args.tables else master_tables
+    reports = {}
+    for filepath, schema in tables.items():
+        if os.path.exists(filepath):
+            _, reports[os.path.basename(filepath)] = apply_schema(pd.read_csv(filepath), schema)
+
+    table = memory_report(reports)
+    print(table.to_string(index=False, formatters={'before_mb': '{:.2f}'.format, 'after_mb': '{:.2f}'.format,
+                                                   'saved': '{:.0%}'.format}))
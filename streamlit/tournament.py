@@ -0,0 +1,271 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from game_simulator import loadings_vector, team_matrix, score_matrix
+from monte_carlo import load_player_ids, team_draw_layout, draw_team_totals
+from game_logs import game_log_folders
+from instrumentation import timed
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Standings points per result, as in the NHL table
+win_points = 2
+tie_points = 1
+
+def team_totals(teams, loadings):
+    '''
+    This function scores every team with one matrix product over all their players.
+
+    Inputs:
+        teams: dict of entry name -> dataframe of that team's players with the metric columns
+        loadings: dict from load_feature_loadings or a weights array from loadings_vector
+    Outputs:
+        entries: list of entry names
+        totals: array of shape (n_teams,) with each team's summed loadings score
+    '''
+    weights = loadings_vector(loadings) if isinstance(loadings, dict) else np.asarray(loadings, dtype=float)
+    entries = list(teams)
+    sizes = np.array([len(teams[entry]) for entry in entries])
+    scores, _ = score_matrix(team_matrix(pd.concat([teams[entry] for entry in entries], ignore_index=True)), weights)
+    # Empty teams score 0; reduceat cannot take a zero-length segment
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    totals = np.zeros(len(entries))
+    filled = sizes > 0
+    totals[filled] = np.add.reduceat(scores, starts[filled])
+    return entries, totals
+
+def _pair_results(totals, scaling_factor):
+    # Every team against every other for one set of team totals; the leading axes are kept.
+    # Scores are rounded as in simulate_game_frames, with a rounded tie going to the higher raw total.
+    goals = np.round(totals / scaling_factor)
+    mine, theirs = totals[..., :, None], totals[..., None, :]
+    wins = mine > theirs
+    ties = mine == theirs
+    goals_for = goals[..., :, None] + ((goals[..., :, None] == goals[..., None, :]) & wins)
+    return wins, ties, goals_for
+
+def matchup_matrix(totals, scaling_factor=1000):
+    '''
+    This function plays every team against every other team in one broadcast.
+
+    Inputs:
+        totals: array of shape (n_teams,) from team_totals
+        scaling_factor: divisor applied to team totals, as in simulate_game
+    Outputs:
+        matrices: dict of (n_teams, n_teams) arrays; wins[i, j] and ties[i, j] are 1 when
+                  team i beat / drew team j, goals_for[i, j] is team i's score in that game.
+                  The diagonal is 0.
+    '''
+    wins, ties, goals_for = _pair_results(np.asarray(totals, dtype=float), scaling_factor)
+    matrices = {'wins': wins.astype(float), 'ties': ties.astype(float), 'goals_for': goals_for}
+    for matrix in matrices.values():
+        np.fill_diagonal(matrix, 0)
+    return matrices
+
+def _tournament_chunk(args):
+    layout, n_games, scaling_factor, seed = args
+    rng = np.random.default_rng(seed)
+    n_teams = len(layout[0])
+    wins = np.zeros((n_teams, n_teams))
+    ties = np.zeros((n_teams, n_teams))
+    goals_for = np.zeros((n_teams, n_teams))
+    # A few games at a time keeps the (games, teams, teams) comparisons small
+    batch = max(1, 4000000 // max(n_teams * n_teams, 1))
+    for start in range(0, n_games, batch):
+        totals = draw_team_totals(layout, rng, min(batch, n_games - start))
+        game_wins, game_ties, game_goals = _pair_results(totals, scaling_factor)
+        wins += game_wins.sum(axis=0)
+        ties += game_ties.sum(axis=0)
+        goals_for += game_goals.sum(axis=0)
+    return wins, ties, goals_for
+
+@timed('tournament monte carlo')
+def monte_carlo_matrix(teams, loadings, n_games=1000, seed=None, n_workers=1, scaling_factor=1000,
+                       player_ids=None, folders=game_log_folders):
+    '''
+    This function plays every pairing n_games times, drawing each logged player's stats
+    from one of their real games, the same way simulate_game_monte_carlo does for one pair.
+    In each simulated round every player gets one draw, used by every team that has them,
+    and every team meets every other team with that round's totals.
+
+    Inputs:
+        teams: dict of entry name -> dataframe of that team's players with the metric columns
+        loadings: dict from load_feature_loadings
+        n_games: number of simulated rounds
+        seed: seed for reproducible draws
+        n_workers: processes to split the rounds across; 1 runs in-process
+        scaling_factor: divisor applied to team totals, as in simulate_game
+        player_ids: dict of name -> playerId, loaded from name_playerId.csv when None
+        folders: game-log folders
+    Outputs:
+        matrices: dict of (n_teams, n_teams) arrays like matchup_matrix, but wins and ties
+                  are probabilities and goals_for is the expected score
+    '''
+    if player_ids is None:
+        player_ids = load_player_ids()
+    entries = list(teams)
+    players = pd.concat([teams[entry] for entry in entries], ignore_index=True)
+    team_of = np.repeat(np.arange(len(entries)), [len(teams[entry]) for entry in entries])
+    layout = team_draw_layout(players, team_of, len(entries), loadings, player_ids, folders)
+
+    # Split the rounds into independent streams so workers never share draws
+    n_chunks = max(1, min(n_workers, n_games))
+    sizes = np.full(n_chunks, n_games // n_chunks)
+    sizes[:n_games % n_chunks] += 1
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    tasks = [(layout, int(size), scaling_factor, child) for size, child in zip(sizes, seeds)]
+
+    if n_chunks == 1:
+        chunks = [_tournament_chunk(tasks[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=n_chunks) as executor:
+            chunks = list(executor.map(_tournament_chunk, tasks))
+
+    matrices = {name: sum(chunk[i] for chunk in chunks) / n_games
+                for i, name in enumerate(['wins', 'ties', 'goals_for'])}
+    for matrix in matrices.values():
+        np.fill_diagonal(matrix, 0)
+    return matrices
+
+def standings(entries, matrices):
+    '''
+    This function turns the matchup matrices into a ranked table.
+
+    Ties in the table are broken by points, then wins, then points in the games between
+    the tied teams only, then goal differential, then goals for, then entry name.
+
+    Inputs:
+        entries: list of entry names, in matrix order
+        matrices: dict from matchup_matrix or monte_carlo_matrix
+    Outputs:
+        table: dataframe with rank, entry, GP, W, L, T, PTS, GF, GA, DIFF, best first
+                (W, L, T and goals are expected values for the Monte Carlo matrices)
+    '''
+    wins, ties, goals_for = matrices['wins'], matrices['ties'], matrices['goals_for']
+    n_teams = len(entries)
+    played = n_teams - 1
+    table = pd.DataFrame({
+        'entry': entries,
+        'GP': played,
+        'W': wins.sum(axis=1),
+        'L': wins.sum(axis=0),
+        'T': ties.sum(axis=1),
+    })
+    table['PTS'] = win_points * table['W'] + tie_points * table['T']
+    table['GF'] = goals_for.sum(axis=1)
+    table['GA'] = goals_for.sum(axis=0)
+    table['DIFF'] = table['GF'] - table['GA']
+
+    # Head-to-head points only matter inside groups level on points and wins
+    head_to_head_points = np.zeros(n_teams)
+    _, group = np.unique(table[['PTS', 'W']].to_numpy(), axis=0, return_inverse=True)
+    group = group.ravel()
+    for level in np.flatnonzero(np.bincount(group) > 1):
+        members = np.flatnonzero(group == level)
+        block = np.ix_(members, members)
+        head_to_head_points[members] = (win_points * wins[block] + tie_points * ties[block]).sum(axis=1)
+    table['H2H'] = head_to_head_points
+
+    table = table.sort_values(['PTS', 'W', 'H2H', 'DIFF', 'GF', 'entry'],
+                              ascending=[False, False, False, False, False, True])
+    table.insert(0, 'rank', np.arange(1, n_teams + 1))
+    return table.drop(columns='H2H').reset_index(drop=True)
+
+def head_to_head(entries, matrices, entry):
+    '''
+    This function lists one entry's results against every opponent.
+
+    Inputs:
+        entries: list of entry names, in matrix order
+        matrices: dict from matchup_matrix or monte_carlo_matrix
+        entry: the entry to report on
+    Outputs:
+        results: dataframe with opponent, W, L, T, GF and GA, one row per opponent
+    '''
+    i = entries.index(entry)
+    others = np.arange(len(entries)) != i
+    return pd.DataFrame({
+        'opponent': np.asarray(entries, dtype=object)[others],
+        'W': matrices['wins'][i, others],
+        'L': matrices['wins'][others, i],
+        'T': matrices['ties'][i, others],
+        'GF': matrices['goals_for'][i, others],
+        'GA': matrices['goals_for'][others, i],
+    })
+
+def matrix_frame(entries, matrices, name='wins'):
+    # One matrix as an entries x entries dataframe, for display
+    return pd.DataFrame(matrices[name], index=entries, columns=entries)
+
+def teams_from_entries(entries_df, registry):
+    '''
+    This function builds the teams dict from a submissions table.
+
+    Inputs:
+        entries_df: dataframe with one row per submitted player: entry and name
+        registry: PlayerRegistry over the player table holding the metric columns
+    Outputs:
+        teams: dict of entry name -> dataframe of that team's players; unknown names are skipped
+    '''
+    return {entry: registry.frame(names) for entry, names in entries_df.groupby('entry', sort=False)['name']}
+
+@timed('tournament')
+def run_tournament(teams, loadings, monte_carlo=False, n_games=1000, seed=None, n_workers=1,
+                   scaling_factor=1000, player_ids=None):
+    '''
+    This function runs a full round robin: every team plays every other team once.
+
+    Inputs:
+        teams: dict of entry name -> dataframe of that team's players with the metric columns
+        loadings: dict from load_feature_loadings
+        monte_carlo: play each pairing n_games times from the game logs instead of once
+                     from the season averages
+        n_games, seed, n_workers, player_ids: passed to monte_carlo_matrix
+        scaling_factor: divisor applied to team totals, as in simulate_game
+    Outputs:
+        results: dict with entries (list), totals (array of team scores), the wins, ties
+                 and goals_for matrices and the standings dataframe
+    '''
+    entries, totals = team_totals(teams, loadings)
+    if monte_carlo:
+        matrices = monte_carlo_matrix(teams, loadings, n_games, seed, n_workers, scaling_factor, player_ids)
+    else:
+        matrices = matchup_matrix(totals, scaling_factor)
+    return {'entries': entries, 'totals': totals, **matrices, 'standings': standings(entries, matrices)}
+
+
+if __name__ == "__main__":
+    import time
+    import argparse
+    from game_simulator import load_feature_loadings
+    from player_registry import PlayerRegistry
+
+    master_copies_folder = os.path.join(project_root, 'files', 'master_copies')
+
+    parser = argparse.ArgumentParser(description='Round robin between submitted teams')
+    parser.add_argument('--entries', required=True, help='csv with entry and name columns, one row per player')
+    parser.add_argument('--players', nargs='+', default=[os.path.join(master_copies_folder, 'forwards_rec_two.csv'),
+                                                         os.path.join(master_copies_folder, 'defense_rec_two.csv')])
+    parser.add_argument('--loadings', default=os.path.join(master_copies_folder, 'feature_loadings.csv'))
+    parser.add_argument('--monte-carlo', action='store_true')
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--output', default=None, help='csv for the standings')
+    args = parser.parse_args()
+
+    registry = PlayerRegistry(pd.concat([pd.read_csv(filepath) for filepath in args.players], ignore_index=True))
+    teams = teams_from_entries(pd.read_csv(args.entries), registry)
+
+    start = time.perf_counter()
+    results = run_tournament(teams, load_feature_loadings(args.loadings), args.monte_carlo, args.games,
+                             args.seed, args.workers)
+    elapsed = time.perf_counter() - start
+
+    print(results['standings'].to_string(index=False))
+    print(f"{len(teams):,} teams, {len(teams) * (len(teams) - 1) // 2:,} pairings in {elapsed:.2f}s")
+    if args.output:
+        results['standings'].to_csv(args.output, index=False)
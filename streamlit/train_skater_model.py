@@ -0,0 +1,88 @@
+import os
+
+import pandas as pd
+import joblib
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import mean_absolute_error, r2_score
+
+from season_pipeline import season_files
+from player_predictions import default_model_filepath, feature_columns, position_codes, get_model
+
+# Same settings as the gradient boosting model in testing/skater.ipynb
+model_params = {
+    'n_estimators': 200,
+    'max_depth': 4,
+    'learning_rate': 0.05,
+    'subsample': 0.6,
+    'min_samples_split': 10,
+    'min_samples_leaf': 1,
+    'random_state': 42,
+}
+
+# Function to build the notebook's training table from the season files
+def career_features(situation='all'):
+    '''
+    This function sums every player's season totals over their career, as the notebook
+    did, and returns the model features with career goals as the target.
+
+    Inputs:
+        situation: situation rows to keep
+    Outputs:
+        X: dataframe of feature_columns, one row per player
+        y: series of career goals
+    '''
+    raw_columns = [column[:-len('_all')] for column in feature_columns[:-1]]
+    usecols = ['playerId', 'position', 'situation', 'I_F_goals'] + raw_columns
+    frames = []
+    for filepath in season_files('skaters').values():
+        df = pd.read_csv(filepath, usecols=usecols)
+        frames.append(df[df['situation'] == situation])
+    seasons = pd.concat(frames, ignore_index=True)
+
+    careers = seasons.groupby('playerId').agg(
+        {**{column: 'sum' for column in raw_columns + ['I_F_goals']}, 'position': 'last'})
+    X = careers[raw_columns].set_axis(feature_columns[:-1], axis=1).astype(float)
+    X['PositionEn_encoded'] = careers['position'].map(position_codes).fillna(-1).astype(int)
+    return X.reset_index(drop=True), careers['I_F_goals'].reset_index(drop=True)
+
+# Function to fit the skater model and save it where the app looks for it
+def train_skater_model(model_file=default_model_filepath, situation='all'):
+    '''
+    This function fits the notebook's gradient boosting model on the season files and
+    saves it, so player_predictions has a model to load.
+
+    Inputs:
+        model_file: where the fitted model is saved
+        situation: situation rows to train on
+    Outputs:
+        model: the fitted model
+        metrics: dict with the held-out r2 and mae
+    '''
+    X, y = career_features(situation)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    model = GradientBoostingRegressor(**model_params).fit(X_train, y_train)
+    y_pred = model.predict(X_test)
+    metrics = {'r2': r2_score(y_test, y_pred), 'mae': mean_absolute_error(y_test, y_pred)}
+
+    os.makedirs(os.path.dirname(model_file), exist_ok=True)
+    joblib.dump(model, model_file)
+    return model, metrics
+
+
+if __name__ == "__main__":
+    import time
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Fit the skater goals model and save it for player_predictions')
+    parser.add_argument('--model', default=default_model_filepath, help='where to save the model')
+    parser.add_argument('--situation', default='all')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    model, metrics = train_skater_model(args.model, args.situation)
+    elapsed = time.perf_counter() - start
+    # Load it back the way the app does, which also checks its feature names
+    get_model(args.model)
+
+    print(f"Saved {args.model} in {elapsed:.2f}s: held-out R² {metrics['r2']:.3f}, MAE {metrics['mae']:.2f} goals")
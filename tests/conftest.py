@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The app's modules import each other as siblings, as in the benchmarks
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'streamlit'))
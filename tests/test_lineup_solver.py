@@ -0,0 +1,86 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from lineup_solver import solve_lineup, top_lineups, salary_frontier, _salary_units
+
+composition = {'F': 3, 'D': 2}
+
+
+def brute_force(salaries, scores, positions, cap):
+    # Every lineup that fits, best first
+    forwards = np.flatnonzero(positions == 'F')
+    defense = np.flatnonzero(positions == 'D')
+    lineups = []
+    for f in itertools.combinations(forwards, composition['F']):
+        for d in itertools.combinations(defense, composition['D']):
+            chosen = list(f + d)
+            if salaries[chosen].sum() <= cap:
+                lineups.append(scores[chosen].sum())
+    return sorted(lineups, reverse=True)
+
+
+def random_pool(seed, round_salaries):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(5, 11))
+    positions = np.array(['F'] * int(rng.integers(3, n - 1)))
+    positions = np.append(positions, ['D'] * (n - len(positions)))
+    if round_salaries:
+        salaries = rng.choice([950000, 2000000, 4000000, 6000000, 8000000], n)
+    else:
+        salaries = rng.integers(750000, 9000000, n)
+    scores = rng.normal(0, 1, n)
+    cap = int(rng.integers(4000000, 30000000))
+    return salaries.astype(np.int64), scores, positions, cap
+
+
+@pytest.mark.parametrize('round_salaries', [True, False])
+@pytest.mark.parametrize('seed', range(40))
+def test_solve_lineup_matches_brute_force(seed, round_salaries):
+    salaries, scores, positions, cap = random_pool(seed, round_salaries)
+    expected = brute_force(salaries, scores, positions, cap)
+    # Few buckets force rounding on the uneven salaries
+    chosen, exact = solve_lineup(salaries, scores, positions, composition, cap, max_buckets=50)
+    assert exact == _salary_units(salaries, cap, 50)[2]
+    if not expected:
+        assert chosen is None
+        return
+    assert salaries[chosen].sum() <= cap
+    assert sorted(positions[chosen]) == ['D', 'D', 'F', 'F', 'F']
+    assert scores[chosen].sum() == pytest.approx(expected[0])
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_top_lineups_match_brute_force(seed):
+    salaries, scores, positions, cap = random_pool(seed, round_salaries=False)
+    expected = brute_force(salaries, scores, positions, cap)[:5]
+    lineups, exact = top_lineups(salaries, scores, positions, 5, composition, cap, max_buckets=50)
+    assert not exact
+    assert [score for score, _ in lineups] == pytest.approx(expected)
+    for score, chosen in lineups:
+        assert salaries[chosen].sum() <= cap
+        assert scores[chosen].sum() == pytest.approx(score)
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_salary_frontier_fits_and_ends_at_best(seed):
+    salaries, scores, positions, cap = random_pool(seed, round_salaries=False)
+    expected = brute_force(salaries, scores, positions, cap)
+    frontier, _ = salary_frontier(salaries, scores, positions, composition, cap, max_buckets=50)
+    if not expected:
+        assert frontier == []
+        return
+    for salary, score, chosen in frontier:
+        assert salary == salaries[chosen].sum() <= cap
+    assert frontier[-1][1] == pytest.approx(expected[0])
+
+
+def test_rounded_up_buckets_do_not_rule_out_the_fit():
+    # Five players at exactly a fifth of the cap: rounding their costs up would overflow it
+    salaries = np.array([6000001, 6000001, 6000001, 5999999, 5999995], dtype=np.int64)
+    scores = np.array([1.0, 1.0, 1.0, 1.0, 1.0])
+    positions = np.array(['F', 'F', 'F', 'D', 'D'])
+    chosen, exact = solve_lineup(salaries, scores, positions, composition, 30000000, max_buckets=7)
+    assert not exact
+    assert sorted(chosen.tolist()) == [0, 1, 2, 3, 4]
@@ -0,0 +1,37 @@
+import pandas as pd
+import pytest
+
+from name_resolver import NameResolver, normalize_names
+
+
+@pytest.fixture(scope='module')
+def resolver():
+    return NameResolver.build()
+
+
+def test_nothing_matches(resolver):
+    resolved = resolver.resolve(pd.Series(['Zzzz Qqqq', 'Xxxx Yyyy']))
+    assert list(resolved.columns) == ['input_name', 'playerId', 'name', 'method', 'score']
+    assert len(resolved) == 2
+    assert resolved['playerId'].isna().all()
+    assert resolved['method'].isna().all()
+
+
+def test_accents_and_last_first(resolver):
+    resolved = resolver.resolve(pd.Series(['Tim Stützle', 'Stützle, Tim', 'Tim Stutzle']))
+    assert resolved['playerId'].nunique() == 1
+    assert resolved['playerId'].notna().all()
+    assert resolved['method'].iloc[1] == 'exact (accents dropped)'
+
+
+def test_normalize_names():
+    names = pd.Series(['J.T. Miller', 'JT Miller', 'J. T. Miller', 'Stützle'])
+    assert normalize_names(names).tolist() == ['jt miller', 'jt miller', 'jt miller', 'stutzle']
+    assert normalize_names(names, drop_accented=True).iloc[3] == 'sttzle'
+
+
+def test_goalies_match_without_positions(resolver):
+    # Misspelled goalies fall to the fuzzy pass, which must not be blocked to forwards
+    resolved = resolver.resolve(pd.Series(['Andrei Vasilevsky', 'Igor Shestyorkin']))
+    assert resolved['name'].tolist() == ['Andrei Vasilevskiy', 'Igor Shesterkin']
+    assert (resolved['method'] == 'fuzzy').all()
@@ -0,0 +1,91 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from game_simulator import load_feature_loadings, simulate_game_frames, performance_metrics
+from player_registry import PlayerRegistry
+from lineup import ScoredLineup
+
+master_copies_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'files', 'master_copies')
+
+
+@pytest.fixture(scope='module')
+def registry():
+    forwards = pd.read_csv(os.path.join(master_copies_folder, 'forwards_rec_two.csv'))
+    defense = pd.read_csv(os.path.join(master_copies_folder, 'defense_rec_two.csv'))
+    return PlayerRegistry(pd.concat([forwards, defense], ignore_index=True))
+
+
+@pytest.fixture(scope='module')
+def loadings():
+    return load_feature_loadings(os.path.join(master_copies_folder, 'feature_loadings.csv'))
+
+
+def assert_matches_simulator(lineup, loadings):
+    # The running totals against a full rescore of the lineup's frame
+    team = lineup.registry.players.iloc[lineup.rows]
+    _, _, player_scores, _, contributions, _ = simulate_game_frames(team, team, loadings)
+    assert lineup.score == pytest.approx(sum(player_scores.values()), rel=1e-9)
+    expected = [sum(contributions[metric].values()) for metric in performance_metrics]
+    np.testing.assert_allclose(lineup.metric_totals().to_numpy(), expected, rtol=1e-9, atol=1e-9)
+
+
+def test_running_totals_follow_add_remove_swap(registry, loadings):
+    names = registry.names
+    lineup = ScoredLineup(registry, loadings)
+    assert lineup.score == 0
+    for name in names[:5]:
+        lineup.add(name)
+        assert_matches_simulator(lineup, loadings)
+    lineup.remove(names[1])
+    assert_matches_simulator(lineup, loadings)
+    lineup.swap(names[3], names[10])
+    assert_matches_simulator(lineup, loadings)
+    assert names[10] in lineup and names[3] not in lineup
+
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        out_name = names[rng.choice(lineup.rows)]
+        in_name = names[rng.integers(len(names))]
+        if in_name not in lineup:
+            lineup.swap(out_name, in_name)
+    assert_matches_simulator(lineup, loadings)
+
+    lineup.clear()
+    assert lineup.score == 0 and len(lineup) == 0
+
+
+def test_swap_errors(registry, loadings):
+    names = registry.names
+    lineup = ScoredLineup.from_names(registry, loadings, names[:2])
+    with pytest.raises(ValueError):
+        lineup.swap(names[5], names[6])
+    with pytest.raises(ValueError):
+        lineup.swap(names[0], names[1])
+
+
+def test_best_swap_is_the_best_legal_swap(registry, loadings):
+    lineup = ScoredLineup.from_names(registry, loadings, registry.names[:5])
+    remaining = 2000000
+    swap = lineup.best_swap(remaining)
+    scores = registry.matrix(performance_metrics) @ lineup.weights
+    salaries = registry.players['salary'].to_numpy(dtype=float)
+    positions = registry.column('position')
+    best = 0
+    for out_row in lineup.rows:
+        for in_row in range(len(registry)):
+            if (in_row not in lineup.rows and positions[in_row] == positions[out_row]
+                    and salaries[in_row] - salaries[out_row] <= remaining):
+                best = max(best, scores[in_row] - scores[out_row])
+    assert swap is not None
+    assert swap['gain'] == pytest.approx(best)
+    before = lineup.score
+    lineup.swap(swap['out'], swap['in'])
+    assert lineup.score == pytest.approx(before + best)
+
+
+def test_no_candidates_no_swap(registry, loadings):
+    lineup = ScoredLineup.from_names(registry, loadings, registry.names[:5])
+    assert lineup.best_swap(candidates=np.zeros(len(registry), dtype=bool)) is None
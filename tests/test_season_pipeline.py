@@ -0,0 +1,40 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from season_pipeline import run_pipeline, master_copies_folder, skater_master_columns
+
+# Columns that are not per-game stats
+label_columns = ['name', 'position', 'position_encoded']
+
+
+@pytest.fixture(scope='module')
+def tables():
+    tables, _ = run_pipeline('skaters', output_folder=None)
+    return tables
+
+
+@pytest.mark.parametrize('table_name', ['forwards_rec', 'defense_rec'])
+def test_rebuild_matches_master_copy(tables, table_name):
+    rebuilt = tables[table_name]
+    master = pd.read_csv(os.path.join(master_copies_folder, f'{table_name}.csv'))
+    assert [column for column in skater_master_columns if column not in rebuilt.columns] == []
+
+    # Namesakes can not be lined up by name alone
+    merged = master.drop_duplicates('name', keep=False).merge(
+        rebuilt.drop_duplicates('name', keep=False), on='name', suffixes=('_master', '_rebuilt'))
+    assert len(merged) >= 0.95 * len(master)
+    stats = [column for column in skater_master_columns if column not in label_columns]
+    same = np.all([np.isclose(merged[f'{column}_master'], merged[f'{column}_rebuilt'], rtol=1e-4, atol=1e-6)
+                   for column in stats], axis=0)
+    # The rest played seasons newer than the master copies, or share a name with a retired player
+    assert same.mean() >= 0.97
+
+
+def test_positions(tables):
+    assert (tables['forwards_rec']['position'] == 'F').all()
+    assert (tables['defense_rec']['position'] == 'D').all()
+    for table in tables.values():
+        assert (table['position_encoded'].map({0: 'D', 1: 'F'}) == table['position']).all()